@@ -0,0 +1,198 @@
+""" Benchmarks for projection, conversion and serialization, written in the
+style of airspeed velocity (asv): time_* methods are timed, peakmem_*
+methods report peak memory and track_* methods report a value. Run them
+with asv or with benchmarks/run.py. """
+
+import json
+import os
+import shutil
+import tempfile
+from worldly import data, layerfile, projection, svg
+from worldly.mapsheet import MapSheet, _convert_geojson_tuple
+from .generators import GEOMETRY_TYPES, synthetic_layer, synthetic_geojson
+
+PROJECTIONS = {"WebMercator": projection.WebMercator,
+               "NorthPolarStereographic": projection.NorthPolarStereographic,
+               "SouthPolarStereographic": projection.SouthPolarStereographic}
+
+# map extent for bbox= mode, given by its lower left and upper right corners,
+# and region of the synthetic features for each projection
+BBOXES = {"WebMercator": (-180, 0, 180, 80),
+          "NorthPolarStereographic": (-135, 10, 45, 10),
+          "SouthPolarStereographic": (-45, -10, 135, -10)}
+EXTENTS = {"WebMercator": (-160, 10, 160, 70),
+           "NorthPolarStereographic": (-160, 10, 160, 70),
+           "SouthPolarStereographic": (-160, -70, 160, -10)}
+
+SIZES = [10000, 100000, 1000000]
+
+
+class Projection(object):
+    params = (list(PROJECTIONS), SIZES)
+    param_names = ["projection", "nvertices"]
+
+    def setup(self, proj, nvertices):
+        self.layer = synthetic_layer("LineString", nvertices, EXTENTS[proj])
+        self.projection = PROJECTIONS[proj]
+
+    def time_project_layer(self, proj, nvertices):
+        self.layer.projected(self.projection)
+
+
+class Conversion(object):
+    """ Conversion of features to SVGPath nodes, without encoding """
+    params = (GEOMETRY_TYPES, SIZES)
+    param_names = ["geometry", "nvertices"]
+
+    def setup(self, geomtype, nvertices):
+        self.layer = synthetic_layer(geomtype, nvertices)
+
+    def time_convert(self, geomtype, nvertices):
+        for _ in _convert_geojson_tuple(self.layer, lambda xy: xy * 1e-4,
+                                        projection.WebMercator, 1):
+            pass
+
+
+class Serialize(object):
+    """ Complete documents, in each mode of determining the map extent """
+    params = (["bbox", "scale"], list(PROJECTIONS), SIZES)
+    param_names = ["mode", "projection", "nvertices"]
+
+    def setup(self, mode, proj, nvertices):
+        self.layer = synthetic_layer("Polygon", nvertices, EXTENTS[proj])
+        self.projection = PROJECTIONS[proj]
+        self.bbox = BBOXES[proj]
+        self.mode = mode
+
+    def _sheet(self):
+        if self.mode == "bbox":
+            sheet = MapSheet(None, projection=self.projection, bbox=self.bbox)
+        else:
+            sheet = MapSheet(None, projection=self.projection, scale=1e-5)
+        sheet.entities.append((self.layer, {"class_name": "land"}))
+        return sheet
+
+    def time_serialize(self, mode, proj, nvertices):
+        self._sheet().serialize()
+
+    def peakmem_serialize(self, mode, proj, nvertices):
+        self._sheet().serialize()
+
+    def track_output_bytes(self, mode, proj, nvertices):
+        return len(self._sheet().serialize().encode("utf-8"))
+    track_output_bytes.unit = "bytes"
+
+
+class LevelOfDetail(object):
+    """ Zoomed-out, simplified documents, with and without level-of-detail
+    pyramids """
+    params = ([False, True], SIZES)
+    param_names = ["lod", "nvertices"]
+
+    def setup(self, lod, nvertices):
+        layer = synthetic_layer("Polygon", nvertices)
+        self.sheet = MapSheet(None, width=200, height=100,
+                              bbox=(-180, -80, 180, 80),
+                              simplify="douglas-peucker", lod=lod)
+        self.sheet.entities.append((layer, {}))
+        if lod:
+            layer.lod_pyramid(self.sheet.projection, self.sheet.simplify)
+
+    def time_serialize(self, lod, nvertices):
+        self.sheet.serialize()
+
+
+class PointSymbols(object):
+    """ Point layers drawn as zero-length paths, circles and <use> copies of
+    a symbol """
+    params = (["path", "circle", "use"], [10000, 100000])
+    param_names = ["symbol", "nvertices"]
+
+    def setup(self, symbol, nvertices):
+        if symbol == "path":
+            params = {"static_params": {"stroke-width": 2}}
+        elif symbol == "circle":
+            params = {"symbol": "circle"}
+        else:
+            params = {"symbol": svg.SVGCircle((0, 0), 1, id_name="p")}
+        self.sheet = MapSheet(None, bbox=(-180, -80, 180, 80))
+        self.sheet.entities.append((synthetic_layer("Point", nvertices),
+                                    params))
+
+    def time_serialize(self, symbol, nvertices):
+        self.sheet.serialize()
+
+    def track_output_bytes(self, symbol, nvertices):
+        return len(self.sheet.serialize().encode("utf-8"))
+    track_output_bytes.unit = "bytes"
+
+
+class Choropleth(object):
+    """ Restyling of a polygon layer from a joined column of values """
+    params = ([1000, 10000],)
+    param_names = ["nfeatures"]
+
+    def setup(self, nfeatures):
+        self.layer = synthetic_layer("Polygon", 20 * nfeatures)
+        self.table = data.Table({"id": range(len(self.layer)),
+                                 "value": [(i * 7919) % 1000
+                                           for i in range(len(self.layer))]})
+        self.sheet = MapSheet(None, bbox=(-180, -80, 180, 80))
+
+    def time_restyle(self, nfeatures):
+        rows = data.join(self.layer, "id", self.table)
+        values = self.table.take("value", rows)
+        fills = data.choropleth(values, data.quantile_breaks(values, 7),
+                                "blues")
+        self.sheet.entities[:] = [(self.layer,
+                                   {"feature_params": {"fill": fills}})]
+        self.sheet.serialize()
+
+
+class PathEncoding(object):
+    """ Encoding of path data by SVGPath """
+    params = ([1000, 100000], [False, True])
+    param_names = ["nvertices", "compact"]
+
+    def setup(self, nvertices, compact):
+        layer = synthetic_layer("LineString", nvertices)
+        self.vertices = [layer.coords * 100]
+        self.path = svg.SVGPath(self.vertices, compact=compact, precision=1)
+
+    def time_svg(self, nvertices, compact):
+        # assigning the vertices discards the path data kept by the node
+        self.path.vertices = self.vertices
+        self.path.svg()
+
+
+class Ingestion(object):
+    """ Parsing of GeoJSON text into Layers """
+    params = (GEOMETRY_TYPES, [10000, 100000])
+    param_names = ["geometry", "nvertices"]
+
+    def setup(self, geomtype, nvertices):
+        self.text = json.dumps(synthetic_geojson(geomtype, nvertices))
+
+    def time_add_geojson(self, geomtype, nvertices):
+        MapSheet(None).add_geojson(self.text)
+
+    def peakmem_add_geojson(self, geomtype, nvertices):
+        MapSheet(None).add_geojson(self.text)
+
+
+class LayerFileLoading(object):
+    """ Loading of Layers from layer files """
+    params = ([False, True], SIZES)
+    param_names = ["mmap", "nvertices"]
+
+    def setup(self, mmap, nvertices):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, "polygons.layer")
+        layerfile.save_layer(synthetic_layer("Polygon", nvertices),
+                             self.filename)
+
+    def teardown(self, mmap, nvertices):
+        shutil.rmtree(self.tmpdir)
+
+    def time_add_layer_file(self, mmap, nvertices):
+        MapSheet(None).add_layer_file(self.filename, mmap=mmap)
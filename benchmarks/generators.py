@@ -0,0 +1,98 @@
+""" Deterministic synthetic geometries for benchmarks
+
+Every generator takes the total number of vertices to produce and returns
+the same geometries for the same arguments. Features are scattered over
+*extent* (lon_min, lat_min, lon_max, lat_max).
+"""
+
+import numpy as np
+from worldly.layer import Layer, GEOMETRY_TYPES as TYPE_CODES
+
+GEOMETRY_TYPES = ["Point", "LineString", "Polygon",
+                  "MultiPoint", "MultiLineString", "MultiPolygon"]
+
+# vertices per ring and rings per feature
+RING_SIZE = {"Point": 1, "LineString": 1000, "Polygon": 1000,
+             "MultiPoint": 1, "MultiLineString": 250, "MultiPolygon": 250}
+PARTS = {"Point": 1, "LineString": 1, "Polygon": 1,
+         "MultiPoint": 100, "MultiLineString": 4, "MultiPolygon": 4}
+
+DEFAULT_EXTENT = (-160.0, 10.0, 160.0, 70.0)
+
+
+def synthetic_rings(geomtype, nvertices, extent=DEFAULT_EXTENT, seed=0):
+    """ Return an (n, 2) array of vertices and the number of vertices in each
+    ring. Lines are random walks and polygon rings are closed, star-shaped
+    rings, each within a few degrees of a random center. """
+    rng = np.random.RandomState(seed)
+    size = RING_SIZE[geomtype]
+    nrings = max(1, nvertices // size)
+    centers = np.column_stack([rng.uniform(extent[0], extent[2], nrings),
+                               rng.uniform(extent[1], extent[3], nrings)])
+    if size == 1:
+        return centers, np.ones(nrings, dtype=np.int64)
+
+    if geomtype in ("Polygon", "MultiPolygon"):
+        theta = np.linspace(0, 2*np.pi, size)
+        radius = rng.uniform(0.2, 1.0, (nrings, 1)) * \
+            (1 + 0.3 * rng.uniform(-1, 1, (nrings, size)))
+        radius[:,-1] = radius[:,0]          # close the ring
+        x = centers[:,:1] + radius * np.cos(theta)
+        y = centers[:,1:] + 0.5 * radius * np.sin(theta)
+    else:
+        steps = rng.normal(0, 0.01, (nrings, size, 2)).cumsum(axis=1)
+        x = centers[:,:1] + steps[:,:,0]
+        y = centers[:,1:] + steps[:,:,1]
+    coords = np.column_stack([x.ravel(), y.ravel()])
+    return coords, np.full(nrings, size, dtype=np.int64)
+
+
+def synthetic_layer(geomtype, nvertices, extent=DEFAULT_EXTENT, seed=0):
+    """ Return a Layer of *geomtype* features with about *nvertices*
+    vertices, built directly from arrays """
+    coords, counts = synthetic_rings(geomtype, nvertices, extent, seed)
+    nparts = PARTS[geomtype]
+    nrings = len(counts)
+    nfeatures = max(1, nrings // nparts)
+
+    ring_offsets = np.zeros(nrings+1, dtype=np.int64)
+    np.cumsum(counts, out=ring_offsets[1:])
+    part_offsets = np.arange(nrings+1, dtype=np.int64)
+
+    # the last feature takes any remaining parts
+    geom_offsets = np.minimum(np.arange(nfeatures+1, dtype=np.int64) * nparts,
+                              nrings)
+    geom_offsets[-1] = nrings
+    geom_types = np.full(nfeatures, TYPE_CODES[geomtype], dtype=np.uint8)
+    feature_offsets = np.arange(nfeatures+1, dtype=np.int64)
+    properties = [{"id": i, "value": i % 7} for i in range(nfeatures)]
+    return Layer(coords, ring_offsets, part_offsets, geom_offsets, geom_types,
+                 feature_offsets, properties)
+
+
+def synthetic_geojson(geomtype, nvertices, extent=DEFAULT_EXTENT, seed=0):
+    """ Return a GeoJSON FeatureCollection dictionary of the features that
+    synthetic_layer generates """
+    layer = synthetic_layer(geomtype, nvertices, extent, seed)
+    features = []
+    for i in range(len(layer)):
+        parts = [[layer.coords[a:b].tolist() for a, b in part]
+                 for g in layer.feature_geometries(i)
+                 for part in layer.geometry_parts(g)]
+        if geomtype == "Point":
+            coordinates = parts[0][0][0]
+        elif geomtype == "MultiPoint":
+            coordinates = [part[0][0] for part in parts]
+        elif geomtype == "LineString":
+            coordinates = parts[0][0]
+        elif geomtype == "Polygon":
+            coordinates = parts[0]
+        elif geomtype == "MultiLineString":
+            coordinates = [part[0] for part in parts]
+        else:
+            coordinates = parts
+        features.append({"type": "Feature",
+                         "geometry": {"type": geomtype,
+                                      "coordinates": coordinates},
+                         "properties": layer.properties[i]})
+    return {"type": "FeatureCollection", "features": features}
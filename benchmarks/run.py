@@ -0,0 +1,147 @@
+""" Run the benchmarks without asv, and compare results with a baseline.
+
+    python -m benchmarks.run [--quick] [--filter TEXT] [--save FILE]
+                             [--compare FILE] [--threshold RATIO]
+
+Each benchmark is run for every combination of its parameters. Times are the
+best of several repeats, in seconds. Peak memory is the peak of memory traced
+by tracemalloc during one call, in bytes, which includes numpy arrays but
+excludes memory held before the call. With --compare, the exit status is 1
+if any time or memory result exceeds the baseline by more than the threshold
+ratio, or if any tracked value differs from the baseline.
+
+Baselines depend on the machine and on the versions of Python and numpy, so
+time and memory comparisons are only meaningful against a baseline recorded
+in the same environment. Tracked values such as output size are portable.
+"""
+
+import argparse
+import gc
+import itertools
+import json
+import sys
+import time
+import tracemalloc
+from . import benchmarks
+
+QUICK_MAX_SIZE = 100000
+
+
+def iter_cases(quick=False, pattern=None):
+    """ Generate (name, class, method name, parameters) for every benchmark
+    case, in a stable order """
+    for clsname in sorted(dir(benchmarks)):
+        cls = getattr(benchmarks, clsname)
+        if not isinstance(cls, type) or not hasattr(cls, "params"):
+            continue
+        methods = sorted(m for m in dir(cls)
+                         if m.startswith(("time_", "peakmem_", "track_")))
+        for params in itertools.product(*cls.params):
+            if quick and any(type(p) is int and p > QUICK_MAX_SIZE
+                             for p in params):
+                continue
+            for method in methods:
+                name = "{}.{}({})".format(clsname, method,
+                                          ", ".join(repr(p) for p in params))
+                if pattern is None or pattern in name:
+                    yield name, cls, method, params
+
+
+def measure(obj, method, params, repeat=3, min_time=0.2):
+    func = getattr(obj, method)
+    if method.startswith("track_"):
+        return func(*params)
+
+    if method.startswith("peakmem_"):
+        gc.collect()
+        tracemalloc.start()
+        try:
+            func(*params)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    # time the function, calling it enough times per repeat to take at least
+    # min_time, as timeit does
+    t0 = time.perf_counter()
+    func(*params)
+    elapsed = time.perf_counter() - t0
+    number = max(1, int(min_time / elapsed)) if elapsed > 0 else 1000
+    best = elapsed if number == 1 else float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            func(*params)
+        best = min(best, (time.perf_counter() - t0) / number)
+    return best
+
+
+def run(quick=False, pattern=None, log=sys.stderr):
+    results = {}
+    setups = {}
+    for name, cls, method, params in iter_cases(quick, pattern):
+        # cases of the same class and parameters share one setup
+        key = (cls, params)
+        if key not in setups:
+            for (_, previous), obj in setups.items():
+                if hasattr(obj, "teardown"):
+                    obj.teardown(*previous)
+            setups.clear()
+            obj = cls()
+            if hasattr(obj, "setup"):
+                obj.setup(*params)
+            setups[key] = obj
+        results[name] = measure(setups[key], method, params)
+        log.write("{:<80} {:.6g}\n".format(name, results[name]))
+    for (_, previous), obj in setups.items():
+        if hasattr(obj, "teardown"):
+            obj.teardown(*previous)
+    return results
+
+
+def compare(results, baseline, threshold, log=sys.stderr):
+    """ Report results that are worse than the baseline, returning the number
+    of regressions """
+    regressions = 0
+    for name, value in sorted(results.items()):
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        method = name.split(".")[1]
+        if method.startswith("track_"):
+            worse = value != base
+        else:
+            worse = base > 0 and value / base > threshold
+        if worse:
+            regressions += 1
+            log.write("REGRESSION {}: {:.6g} (baseline {:.6g})\n"
+                      .format(name, value, base))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run worldly benchmarks")
+    parser.add_argument("--quick", action="store_true",
+                        help="skip cases larger than {} vertices"
+                             .format(QUICK_MAX_SIZE))
+    parser.add_argument("--filter", help="run cases whose name contains FILTER")
+    parser.add_argument("--save", help="write results to a JSON file")
+    parser.add_argument("--compare", help="baseline JSON file")
+    parser.add_argument("--threshold", type=float, default=2.0,
+                        help="ratio to the baseline treated as a regression")
+    args = parser.parse_args(argv)
+
+    results = run(quick=args.quick, pattern=args.filter)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold) != 0:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,7 +5,7 @@ with worldly.MapSheet("earthquakes.svg", bbox=(-135, 51.5, -130, 54.5)) as mapsh
 
     mapsheet.style = """
     .land { fill: #333333; }
-    .earthquake { stroke: chocolate;
+    .earthquake { fill: chocolate;
                   opacity: 0.9; }
     """
 
@@ -21,7 +21,8 @@ with worldly.MapSheet("earthquakes.svg", bbox=(-135, 51.5, -130, 54.5)) as mapsh
 
     if r.status_code == 200:
         mapsheet.add_geojson(r.text,
-                             dynamic_params={"stroke-width": "mag"},
-                             scales={"stroke-width": lambda a: 0.02*a*a},
+                             symbol="circle",
+                             dynamic_params={"r": "mag"},
+                             scales={"r": lambda a: 0.01*a*a},
                              class_name="earthquake")
 
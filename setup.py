@@ -7,8 +7,11 @@ setup(
     author_email = "natw@fortyninemaps.com",
     description = "GeoJSON to SVG converter",
     license = "MIT",
-    packages = find_packages(),
-    install_requires = ["picogeojson"],
+    packages = find_packages(exclude=["benchmarks", "benchmarks.*"]),
+    python_requires = ">=3.7",
+    install_requires = ["picogeojson", "numpy"],
+    extras_require = {"yaml": ["pyyaml"]},
+    entry_points = {"console_scripts": ["worldly = worldly.cli:main"]},
     classifiers = [
         "Development Status :: 3 - Alpha",
         "Topic :: Utilities",
@@ -0,0 +1,82 @@
+import unittest
+from picogeojson import Point, LineString
+from worldly.cache import ProjectionCache
+from worldly.layer import Layer
+from worldly.mapsheet import MapSheet
+from worldly.projection import WebMercator, NorthPolarStereographic
+
+class CountingProjection(object):
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, x, y):
+        self.calls += 1
+        return (x, y)
+
+class ProjectionCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.layer = Layer.from_geojson(LineString([(0, 0), (1, 1), (2, 0)]))
+
+    def test_hits_and_misses(self):
+        cache = ProjectionCache()
+        a = cache.projected(self.layer, WebMercator)
+        b = cache.projected(self.layer, WebMercator)
+        self.assertTrue(a is b)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertFalse(a.flags.writeable)
+
+        cache.projected(self.layer, NorthPolarStereographic)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.nbytes, 2 * a.nbytes)
+
+    def test_eviction(self):
+        nbytes = self.layer.coords.nbytes
+        cache = ProjectionCache(max_bytes=2*nbytes)
+        layers = [Layer.from_geojson(LineString([(i, 0), (i, 1), (i, 2)]))
+                  for i in range(3)]
+        for layer in layers:
+            cache.projected(layer, WebMercator)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(cache.nbytes, 2*nbytes)
+
+        # least recently used entry was evicted
+        cache.projected(layers[0], WebMercator)
+        self.assertEqual(cache.misses, 4)
+
+    def test_add(self):
+        cache = ProjectionCache()
+        coords = self.layer.projected(WebMercator)
+        coords.setflags(write=False)
+        cache.add(self.layer, WebMercator, coords)
+        self.assertTrue(cache.projected(self.layer, WebMercator) is coords)
+        self.assertEqual((cache.hits, cache.misses), (1, 0))
+
+    def test_oversized_not_stored(self):
+        cache = ProjectionCache(max_bytes=1)
+        cache.projected(self.layer, WebMercator)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.evictions, 0)
+
+    def test_single_projection_per_serialize(self):
+        proj = CountingProjection()
+        sheet = MapSheet(None, scale=1.0, projection=proj)
+        sheet.add_geojson('{"type": "LineString", "coordinates": [[0, 0], [1, 1], [2, 0]]}')
+        sheet.serialize()
+        self.assertEqual(proj.calls, 3)
+
+    def test_shared_between_sheets(self):
+        proj = CountingProjection()
+        cache = ProjectionCache()
+        layer = Layer.from_geojson(Point((1, 2)))
+        for bbox in ((-5, -5, 5, 5), (0, 0, 3, 3)):
+            sheet = MapSheet(None, bbox=bbox, projection=proj, cache=cache)
+            sheet.entities.append((layer, {}))
+            sheet.serialize()
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+if __name__ == "__main__":
+    unittest.main()
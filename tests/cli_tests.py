@@ -0,0 +1,185 @@
+import unittest
+import io
+import json
+import os
+import shutil
+import tempfile
+from contextlib import redirect_stderr, redirect_stdout
+from worldly import cli
+from worldly.layerfile import save_layer
+from worldly.mapsheet import MapSheet
+
+ISLAND = os.path.abspath("tests/vancouver_island.geojson")
+
+class ManifestTests(unittest.TestCase):
+
+    def test_defaults_and_paths(self):
+        jobs = cli.parse_manifest(
+            {"defaults": {"width": 300, "projection": "NorthPolarStereographic",
+                          "layers": [{"file": "land.geojson",
+                                      "class_name": "land"}]},
+             "sheets": [{"output": "a.svg", "bbox": [-130, 48, -122, 52]},
+                        {"output": "b.svgz", "width": 200, "name": "b",
+                         "layers": [{"file": "x.topojson",
+                                     "objects": ["coast"]}]}]},
+            "/maps")
+        self.assertEqual(len(jobs), 2)
+        self.assertEqual(jobs[0]["output"], "/maps/a.svg")
+        self.assertEqual(jobs[0]["name"], "a.svg")
+        self.assertEqual(jobs[0]["sheet"]["width"], 300)
+        self.assertEqual(jobs[0]["sheet"]["bbox"], (-130, 48, -122, 52))
+        self.assertEqual(jobs[0]["layers"][0]["source"],
+                         ("/maps/land.geojson", "geojson", None, False))
+        self.assertEqual(jobs[0]["layers"][0]["params"],
+                         {"class_name": "land"})
+        self.assertEqual(jobs[1]["name"], "b")
+        self.assertEqual(jobs[1]["sheet"]["width"], 200)
+        self.assertEqual(jobs[1]["layers"][0]["source"],
+                         ("/maps/x.topojson", "topojson", ("coast",), False))
+
+    def test_invalid_sheets(self):
+        for manifest in ({"sheet": []},
+                         {"sheets": [{"layers": []}]},
+                         {"sheets": [{"output": "a.svg", "zoom": 3}]},
+                         {"sheets": [{"output": "a.svg",
+                                      "projection": "Mollweide"}]},
+                         {"sheets": [{"output": "a.svg",
+                                      "layers": [{"file": "a.shp"}]}]},
+                         {"sheets": [{"output": "a.svg",
+                                      "layers": [{"file": "a.geojson",
+                                                  "scales": {}}]}]}):
+            with self.assertRaises(cli.ManifestError):
+                cli.parse_manifest(manifest)
+
+    def test_load_yaml(self):
+        try:
+            import yaml
+        except ImportError:
+            self.skipTest("PyYAML is not installed")
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, "maps.yaml")
+            with open(path, "w") as f:
+                f.write("sheets:\n"
+                        "  - output: out/a.svg\n"
+                        "    scale: 0.001\n"
+                        "    layers:\n"
+                        "      - file: island.geojson\n")
+            jobs = cli.load_manifest(path)
+            self.assertEqual(jobs[0]["output"],
+                             os.path.join(tmpdir, "out", "a.svg"))
+            self.assertEqual(jobs[0]["sheet"], {"scale": 0.001})
+        finally:
+            shutil.rmtree(tmpdir)
+
+class RenderTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        save_layer(self._layer(), os.path.join(self.tmpdir, "island.layer"))
+        with open(os.path.join(self.tmpdir, "land.css"), "w") as f:
+            f.write(".land { fill: black; }")
+        self.manifest = {
+            "defaults": {"width": 256, "height": 256,
+                         "style_file": "land.css",
+                         "layers": [{"file": ISLAND, "class_name": "land"}]},
+            "sheets": [{"output": "out/{}.svg".format(i),
+                        "bbox": [-129 + i, 48, -127 + i, 50]}
+                       for i in range(4)]}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _layer(self):
+        sheet = MapSheet(None)
+        sheet.add_geojson_file(ISLAND)
+        return sheet.entities[0][0]
+
+    def _write_manifest(self):
+        path = os.path.join(self.tmpdir, "maps.json")
+        with open(path, "w") as f:
+            json.dump(self.manifest, f)
+        return path
+
+    def _expected(self, bbox):
+        sheet = MapSheet(None, width=256, height=256, bbox=bbox,
+                         style=".land { fill: black; }")
+        sheet.add_geojson_file(ISLAND, class_name="land")
+        return sheet.serialize()
+
+    def test_layers_kept_between_jobs(self):
+        jobs = cli.load_manifest(self._write_manifest())
+        store = cli.LayerStore()
+        results = [cli.render_job(job, store) for job in jobs]
+        self.assertTrue(all(r.ok for r in results))
+        self.assertEqual((store.misses, store.hits), (1, 3))
+        self.assertTrue(results[0].load_seconds > 0)
+        self.assertEqual([r.load_seconds for r in results[1:]], [0, 0, 0])
+        for i, r in enumerate(results):
+            with open(os.path.join(self.tmpdir, "out", "{}.svg".format(i))) as f:
+                self.assertEqual(f.read(),
+                                 self._expected((-129 + i, 48, -127 + i, 50)))
+            self.assertEqual(r.output_bytes, os.path.getsize(r.output))
+            self.assertTrue(r.stages["total"] > 0)
+
+    def test_layer_file_source(self):
+        self.manifest["defaults"]["layers"] = [{"file": "island.layer",
+                                                "class_name": "land"}]
+        jobs = cli.load_manifest(self._write_manifest())
+        result = cli.render_job(jobs[1], cli.LayerStore())
+        self.assertTrue(result.ok)
+        with open(result.output) as f:
+            self.assertEqual(f.read(), self._expected((-128, 48, -126, 50)))
+
+    def test_failures_are_reported(self):
+        self.manifest["sheets"][2]["layers"] = [{"file": "missing.geojson"}]
+        jobs = cli.load_manifest(self._write_manifest())
+        results = sorted(cli.render_jobs(jobs, processes=2),
+                         key=lambda r: r.index)
+        self.assertEqual([r.ok for r in results], [True, True, False, True])
+        self.assertTrue("missing.geojson" in results[2].error)
+        self.assertFalse(os.path.exists(results[2].output))
+        self.assertEqual(sorted(os.listdir(os.path.join(self.tmpdir, "out"))),
+                         ["0.svg", "1.svg", "3.svg"])
+
+    def test_processes_match_serial(self):
+        jobs = cli.load_manifest(self._write_manifest())
+        serial = {}
+        for r in cli.render_jobs(jobs, processes=1):
+            with open(r.output) as f:
+                serial[r.output] = f.read()
+        shutil.rmtree(os.path.join(self.tmpdir, "out"))
+        results = list(cli.render_jobs(jobs, processes=2))
+        self.assertEqual(sorted(r.index for r in results), [0, 1, 2, 3])
+        for r in results:
+            with open(r.output) as f:
+                self.assertEqual(f.read(), serial[r.output])
+
+    def test_main(self):
+        self.manifest["sheets"].append({"output": "bad.svg",
+                                        "layers": [{"file": "none.geojson"}]})
+        path = self._write_manifest()
+        report = os.path.join(self.tmpdir, "report.json")
+        out, err = io.StringIO(), io.StringIO()
+        with redirect_stdout(out), redirect_stderr(err):
+            status = cli.main([path, "-j", "1", "--report", report])
+        self.assertEqual(status, 1)
+        self.assertTrue("5 sheets, 1 failed" in out.getvalue())
+        self.assertTrue("FAIL" in err.getvalue())
+        with open(report) as f:
+            data = json.load(f)
+        self.assertEqual(data["summary"]["failed"], 1)
+        self.assertEqual([job["ok"] for job in data["jobs"]],
+                         [True, True, True, True, False])
+
+    def test_main_invalid_manifest(self):
+        path = os.path.join(self.tmpdir, "maps.json")
+        with open(path, "w") as f:
+            f.write("{\"sheets\": [")
+        err = io.StringIO()
+        with redirect_stderr(err):
+            self.assertEqual(cli.main([path]), 2)
+        self.assertTrue(err.getvalue().startswith("worldly:"))
+
+if __name__ == "__main__":
+    unittest.main()
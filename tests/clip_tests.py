@@ -0,0 +1,64 @@
+import unittest
+import numpy as np
+from worldly import clip
+
+BBOX = (0, 0, 10, 10)
+
+class ClipTests(unittest.TestCase):
+
+    def test_bbox_intersects(self):
+        bboxes = np.array([[1, 1, 2, 2], [11, 1, 12, 2], [-5, -5, 15, 15],
+                           [np.nan, np.nan, np.nan, np.nan]])
+        self.assertEqual(clip.bbox_intersects(bboxes, BBOX).tolist(),
+                         [True, False, True, False])
+
+    def test_clip_points(self):
+        xy = np.array([[1., 1.], [-1., 1.], [5., 11.], [10., 10.]])
+        self.assertEqual(clip.clip_points(xy, BBOX).tolist(),
+                         [[1, 1], [10, 10]])
+
+    def test_clip_line_inside(self):
+        xy = np.array([[1., 1.], [2., 3.], [4., 4.]])
+        pieces = clip.clip_line(xy, BBOX)
+        self.assertEqual(len(pieces), 1)
+        self.assertEqual(pieces[0].tolist(), xy.tolist())
+
+    def test_clip_line_outside(self):
+        xy = np.array([[-1., -1.], [-2., 5.], [-3., 20.]])
+        self.assertEqual(clip.clip_line(xy, BBOX), [])
+
+    def test_clip_line_reentrant(self):
+        xy = np.array([[-5., 5.], [5., 5.], [15., 5.], [15., 8.],
+                       [5., 8.], [5., 9.]])
+        pieces = clip.clip_line(xy, BBOX)
+        self.assertEqual([p.tolist() for p in pieces],
+                         [[[0, 5], [5, 5], [10, 5]],
+                          [[10, 8], [5, 8], [5, 9]]])
+
+    def test_clip_line_crossing_segment(self):
+        xy = np.array([[-5., -5.], [15., 15.]])
+        pieces = clip.clip_line(xy, BBOX)
+        self.assertEqual([p.tolist() for p in pieces], [[[0, 0], [10, 10]]])
+
+    def test_clip_polygon_inside(self):
+        xy = np.array([[1., 1.], [2., 1.], [2., 2.], [1., 1.]])
+        self.assertEqual(clip.clip_polygon(xy, BBOX).tolist(), xy.tolist())
+
+    def test_clip_polygon_corner(self):
+        xy = np.array([[-5., -5.], [5., -5.], [5., 5.], [-5., 5.], [-5., -5.]])
+        self.assertEqual(clip.clip_polygon(xy, BBOX).tolist(),
+                         [[0, 0], [5, 0], [5, 5], [0, 5], [0, 0]])
+
+    def test_clip_polygon_covering(self):
+        xy = np.array([[-5., -5.], [15., -5.], [15., 15.], [-5., 15.], [-5., -5.]])
+        clipped = clip.clip_polygon(xy, BBOX)
+        self.assertEqual(sorted(map(tuple, clipped[:-1].tolist())),
+                         [(0, 0), (0, 10), (10, 0), (10, 10)])
+        self.assertEqual(clipped[0].tolist(), clipped[-1].tolist())
+
+    def test_clip_polygon_outside(self):
+        xy = np.array([[20., 20.], [25., 20.], [25., 25.], [20., 20.]])
+        self.assertEqual(len(clip.clip_polygon(xy, BBOX)), 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+import unittest
+import io
+import numpy as np
+import picogeojson
+from worldly import data
+from worldly.layer import Layer
+from worldly.mapsheet import MapSheet
+
+CSV = """fips,name,rate
+01001,Autauga,5.1
+01003,Baldwin,
+01005,Barbour,9.8
+"""
+
+def county_layer():
+    features = ",".join('''{"type": "Feature",
+        "geometry": {"type": "Polygon", "coordinates":
+            [[[%d, 0], [%d, 0], [%d, 1], [%d, 0]]]},
+        "properties": {"GEOID": "%s"}}''' % (i, i+1, i+1, i, fips)
+        for i, fips in enumerate(["01005", "01001", "01003", "99999"]))
+    return Layer.from_geojson(picogeojson.fromstring(
+        '{"type": "FeatureCollection", "features": [%s]}' % features))
+
+class TableTests(unittest.TestCase):
+
+    def test_from_csv(self):
+        table = data.Table.from_csv(io.StringIO(CSV), text_columns=["fips"])
+        self.assertEqual(len(table), 3)
+        self.assertEqual(table["fips"].tolist(), ["01001", "01003", "01005"])
+        self.assertEqual(table["rate"].dtype, np.float64)
+        self.assertTrue(np.isnan(table["rate"][1]))
+
+    def test_numeric_keys(self):
+        table = data.Table.from_csv(io.StringIO(CSV))
+        self.assertEqual(table["fips"].tolist(), [1001.0, 1003.0, 1005.0])
+
+    def test_unequal_columns(self):
+        with self.assertRaises(ValueError):
+            data.Table({"a": [1, 2], "b": [1]})
+
+    def test_join(self):
+        table = data.Table.from_csv(io.StringIO(CSV), text_columns=["fips"])
+        layer = county_layer()
+        rows = data.join(layer, "GEOID", table, "fips")
+        self.assertEqual(rows.tolist(), [2, 0, 1, -1])
+        rates = table.take("rate", rows)
+        self.assertEqual(rates[:2].tolist(), [9.8, 5.1])
+        self.assertTrue(np.isnan(rates[2:]).all())
+        self.assertEqual(table.take("name", rows).tolist(),
+                         ["Barbour", "Autauga", "Baldwin", None])
+
+    def test_join_first_match(self):
+        table = data.Table({"GEOID": ["01001", "01001"], "v": [1, 2]})
+        rows = data.join(county_layer(), "GEOID", table)
+        self.assertEqual(rows.tolist(), [-1, 0, -1, -1])
+
+class ClassificationTests(unittest.TestCase):
+
+    def test_equal_interval(self):
+        breaks = data.equal_interval_breaks([0, 1, np.nan, 10], 5)
+        self.assertEqual(breaks.tolist(), [0, 2, 4, 6, 8, 10])
+
+    def test_quantile(self):
+        breaks = data.quantile_breaks(np.arange(101), 4)
+        self.assertEqual(breaks.tolist(), [0, 25, 50, 75, 100])
+
+    def test_jenks(self):
+        values = [1, 2, 3, 10, 11, 12, 30, 31, 32, np.nan]
+        self.assertEqual(data.jenks_breaks(values, 3).tolist(),
+                         [1, 3, 12, 32])
+
+    def test_jenks_matches_exhaustive(self):
+        rng = np.random.RandomState(1)
+        x = np.sort(rng.gamma(2.0, 3.0, 40))
+
+        def ssd(c):
+            return ((c - c.mean())**2).sum()
+
+        best = min((ssd(x[:i]) + ssd(x[i:j]) + ssd(x[j:]), (i, j))
+                   for i in range(1, 39) for j in range(i+1, 40))
+        i, j = best[1]
+        self.assertEqual(data.jenks_breaks(x, 3).tolist(),
+                         [x[0], x[i-1], x[j-1], x[-1]])
+
+    def test_jenks_few_values(self):
+        self.assertEqual(data.jenks_breaks([3, 1], 4).tolist(),
+                         [1, 3, 3, 3, 3])
+
+    def test_classify(self):
+        classes = data.classify([0, 2, 2.5, 10, 11, -1, np.nan],
+                                [0, 2, 4, 10])
+        self.assertEqual(classes.tolist(), [0, 0, 1, 2, 2, 0, -1])
+
+    def test_linear_scale(self):
+        self.assertEqual(data.linear_scale([0, 5, 20], (0, 10), (1, 3)).tolist(),
+                         [1, 2, 3])
+        self.assertEqual(data.linear_scale([20], (0, 10), (1, 3),
+                                           clamp=False).tolist(), [5])
+
+    def test_color_ramp(self):
+        self.assertEqual(data.color_ramp(["#000000", "#ffffff"], 3),
+                         ["#000000", "#808080", "#ffffff"])
+        self.assertEqual(len(data.color_ramp("viridis", 7)), 7)
+
+    def test_choropleth(self):
+        colors = data.choropleth([1, 5, np.nan], [0, 2, 10],
+                                 ["#aaaaaa", "#bbbbbb"], missing="none")
+        self.assertEqual(colors, ["#aaaaaa", "#bbbbbb", "none"])
+        self.assertEqual(len(data.choropleth([1, 5], [0, 2, 4, 10], "blues")),
+                         2)
+
+class FeatureParamsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.table = data.Table.from_csv(io.StringIO(CSV),
+                                         text_columns=["fips"])
+        self.layer = county_layer()
+        self.rows = data.join(self.layer, "GEOID", self.table, "fips")
+
+    def test_choropleth_map(self):
+        rates = self.table.take("rate", self.rows)
+        fill = data.choropleth(rates, [0, 6, 10], ["#fee", "#c00"])
+        sheet = MapSheet(None, bbox=(-1, -1, 5, 2))
+        sheet.add_layer(self.layer, class_name="county",
+                        feature_params={"fill": fill,
+                                        "data-rate": rates})
+        s = sheet.serialize()
+        self.assertEqual(s.count("<path"), 4)
+        self.assertEqual(s.count('fill="#c00"'), 1)
+        self.assertEqual(s.count('fill="#fee"'), 1)
+        self.assertEqual(s.count("fill="), 2)
+        self.assertEqual(s.count('data-rate="9.8"'), 1)
+        self.assertEqual(s.count("data-rate="), 2)
+
+    def test_length_mismatch(self):
+        sheet = MapSheet(None, bbox=(-1, -1, 5, 2))
+        sheet.add_layer(self.layer, feature_params={"fill": ["red"]})
+        with self.assertRaises(ValueError):
+            sheet.serialize()
+
+    def test_incremental_restyle(self):
+        sheet = MapSheet(None, bbox=(-1, -1, 5, 2), incremental=True)
+        rates = self.table.take("rate", self.rows)
+        sheet.add_layer(self.layer,
+                        feature_params={"data-rate": rates})
+        first = sheet.serialize()
+        self.assertEqual(sheet.serialize(), first)
+        self.assertEqual(len(sheet._fragments), 1)
+
+        sheet.entities[0][1]["feature_params"] = {"data-rate": rates * 2}
+        self.assertTrue('data-rate="19.6"' in sheet.serialize())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,261 @@
+import unittest
+import asyncio
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from worldly.fetch import ConnectionPool, Fetcher, FetchError
+from worldly.mapsheet import MapSheet
+
+def point_feature(n):
+    return json.dumps({"type": "Feature",
+                       "geometry": {"type": "Point", "coordinates": [n, n]},
+                       "properties": {"n": n}}).encode("utf-8")
+
+class StubHandler(BaseHTTPRequestHandler):
+    """ Serves /point?n=N&delay=SECONDS as a GeoJSON Point Feature """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            server.requests += 1
+        try:
+            parts = urlsplit(self.path)
+            query = parse_qs(parts.query)
+            time.sleep(float(query.get("delay", ["0"])[0]))
+            if parts.path == "/redirect":
+                # redirects *hops* times, then to /point
+                hops = int(query["hops"][0])
+                body = b""
+                self.send_response(302)
+                if hops > 1:
+                    self.send_header("Location", "/redirect?n={}&hops={}"
+                                     .format(query["n"][0], hops - 1))
+                else:
+                    self.send_header("Location",
+                                     "point?n={}".format(query["n"][0]))
+            elif parts.path == "/unchanged":
+                body = b""
+                self.send_response(304)
+            elif parts.path != "/point":
+                body = b"not found"
+                self.send_response(404)
+            else:
+                body = point_feature(int(query["n"][0]))
+                self.send_response(200)
+                if "gzip" in query:
+                    body = gzip.compress(body)
+                    self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # the client gave up, as in the timeout test
+            pass
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, *args):
+        pass
+
+class FetchTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        cls.server.daemon_threads = True
+        cls.server.lock = threading.Lock()
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+        cls.base = "http://127.0.0.1:{}".format(cls.server.server_address[1])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.in_flight = 0
+        self.server.max_in_flight = 0
+        self.server.requests = 0
+
+    def url(self, n, delay=0.0):
+        return "{}/point?n={}&delay={}".format(self.base, n, delay)
+
+    def test_order_is_deterministic(self):
+        async def build():
+            sheet = MapSheet(None)
+            fetcher = Fetcher(max_concurrency=3, timeout=5)
+            # the earliest layers take longest to arrive
+            tasks = [sheet.add_geojson_url(self.url(n, 0.05*(6-n)),
+                                           fetcher=fetcher)
+                     for n in range(6)]
+            sheet.add_geojson(point_feature(99).decode("utf-8"))
+            try:
+                await asyncio.gather(*tasks)
+            finally:
+                fetcher.close()
+            return sheet
+
+        sheet = asyncio.run(build())
+        self.assertEqual([layer.properties[0]["n"] for layer, _ in sheet.entities],
+                         [0, 1, 2, 3, 4, 5, 99])
+
+    def test_bounded_concurrency_and_pooling(self):
+        fetcher = Fetcher(max_concurrency=2, timeout=5)
+
+        async def build():
+            sheet = MapSheet(None)
+            for n in range(8):
+                sheet.add_geojson_url(self.url(n, 0.05), fetcher=fetcher)
+            await sheet.loaded()
+            return sheet
+
+        t0 = time.time()
+        try:
+            sheet = asyncio.run(build())
+        finally:
+            fetcher.close()
+        elapsed = time.time() - t0
+        self.assertEqual(len(sheet.entities), 8)
+        self.assertEqual(self.server.requests, 8)
+        self.assertTrue(self.server.max_in_flight <= 2)
+        self.assertTrue(elapsed >= 0.2)
+        self.assertTrue(fetcher.pool.connections_opened <= 2)
+
+    def test_gzip_response(self):
+        async def fetch():
+            fetcher = Fetcher()
+            try:
+                return await fetcher.fetch(self.base + "/point",
+                                           params={"n": 3, "gzip": 1})
+            finally:
+                fetcher.close()
+        self.assertEqual(asyncio.run(fetch()), point_feature(3))
+
+    def test_timeout(self):
+        async def build():
+            sheet = MapSheet(None)
+            fetcher = Fetcher(timeout=0.1)
+            try:
+                await sheet.add_geojson_url(self.url(1, 1.0), fetcher=fetcher)
+            finally:
+                fetcher.close()
+                self.assertEqual(sheet.entities, [])
+
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(build())
+
+    def test_error_status(self):
+        async def build():
+            sheet = MapSheet(None)
+            try:
+                await sheet.add_geojson_url(self.base + "/missing")
+            finally:
+                sheet.close()
+                self.assertTrue(sheet.fetcher is None)
+
+        with self.assertRaises(FetchError) as cm:
+            asyncio.run(build())
+        self.assertEqual(cm.exception.status, 404)
+
+    def test_redirects_followed(self):
+        async def fetch(hops):
+            fetcher = Fetcher()
+            try:
+                return await fetcher.fetch(self.base + "/redirect",
+                                           params={"n": 2, "hops": hops})
+            finally:
+                fetcher.close()
+
+        self.assertEqual(asyncio.run(fetch(5)), point_feature(2))
+        self.assertEqual(self.server.requests, 6)
+        with self.assertRaises(FetchError) as cm:
+            asyncio.run(fetch(6))
+        self.assertEqual(cm.exception.status, 302)
+
+    def test_non_success_status(self):
+        async def fetch():
+            fetcher = Fetcher()
+            try:
+                return await fetcher.fetch(self.base + "/unchanged")
+            finally:
+                fetcher.close()
+
+        with self.assertRaises(FetchError) as cm:
+            asyncio.run(fetch())
+        self.assertEqual(cm.exception.status, 304)
+
+    def test_serialize_while_loading(self):
+        async def build():
+            sheet = MapSheet(None)
+            task = sheet.add_geojson_url(self.url(1, 0.05))
+            try:
+                with self.assertRaises(RuntimeError):
+                    sheet.serialize()
+                await task
+            finally:
+                sheet.close()
+            return sheet.serialize()
+
+        self.assertTrue("<path" in asyncio.run(build()))
+
+    def test_async_context_manager_error(self):
+        tasks = []
+
+        async def build():
+            try:
+                async with MapSheet(None) as sheet:
+                    tasks.append(sheet.add_geojson_url(self.url(1, 1.0)))
+                    raise KeyError("stop")
+            finally:
+                # cancelled downloads have finished when the block exits
+                self.assertTrue(tasks[0].cancelled())
+
+        with self.assertRaises(KeyError):
+            asyncio.run(build())
+
+    def test_stale_connections_closed(self):
+        class Connection(object):
+            closed = False
+            def close(self):
+                self.closed = True
+
+        pool = ConnectionPool()
+        stale = [Connection(), Connection()]
+        pool._idle[("http", "example.com")] = list(stale)
+        conn, reused = pool._acquire_new("http", "example.com")
+        self.assertFalse(reused)
+        self.assertTrue(all(c.closed for c in stale))
+        conn.close()
+
+    def test_async_context_manager(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            dest = os.path.join(tmpdir, "map.svg")
+
+            async def build():
+                async with MapSheet(dest, bbox=(-1, -1, 5, 5)) as sheet:
+                    for n in range(4):
+                        sheet.add_geojson_url(self.url(n, 0.02))
+                return sheet
+
+            sheet = asyncio.run(build())
+            self.assertTrue(sheet.fetcher is None)
+            with open(dest) as f:
+                self.assertEqual(f.read().count("<path"), 4)
+        finally:
+            shutil.rmtree(tmpdir)
+
+if __name__ == "__main__":
+    unittest.main()
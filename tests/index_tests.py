@@ -0,0 +1,60 @@
+import unittest
+import numpy as np
+from picogeojson import Point, Feature, FeatureCollection
+from worldly.clip import bbox_intersects
+from worldly.index import STRtree
+from worldly.layer import Layer
+from worldly.projection import WebMercator
+
+class STRtreeTests(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(42)
+        corner = rng.uniform(0, 100, (5000, 2))
+        size = rng.uniform(0, 3, (5000, 2))
+        self.bboxes = np.hstack([corner, corner + size])
+
+    def test_query_matches_scan(self):
+        tree = STRtree(self.bboxes)
+        self.assertTrue(len(tree.levels) > 1)
+        for bbox in [(10, 10, 20, 20), (0, 0, 100, 100), (50, 50, 50.1, 50.1),
+                     (-10, -10, -5, -5), (99, -10, 200, 200)]:
+            expected = np.flatnonzero(bbox_intersects(self.bboxes, bbox))
+            self.assertEqual(tree.query(bbox).tolist(), expected.tolist())
+
+    def test_bbox(self):
+        tree = STRtree(self.bboxes)
+        self.assertEqual(tree.bbox,
+                         tuple(self.bboxes[:,:2].min(axis=0).tolist() +
+                               self.bboxes[:,2:].max(axis=0).tolist()))
+
+    def test_nan_items_skipped(self):
+        bboxes = np.array([[0, 0, 1, 1], [np.nan]*4, [2, 2, 3, 3]])
+        tree = STRtree(bboxes)
+        self.assertEqual(len(tree), 3)
+        self.assertEqual(tree.query((-10, -10, 10, 10)).tolist(), [0, 2])
+
+    def test_infinite_items_rejected(self):
+        bboxes = np.array([[0, 0, 1, 1], [0, -np.inf, 1, 1]])
+        with self.assertRaises(ValueError):
+            STRtree(bboxes)
+
+    def test_empty(self):
+        tree = STRtree(np.zeros((0, 4)))
+        self.assertEqual(tree.query((0, 0, 1, 1)).tolist(), [])
+        self.assertEqual(tree.bbox, None)
+
+class LayerSpatialIndexTests(unittest.TestCase):
+
+    def test_index_memoized_per_projection(self):
+        layer = Layer.from_geojson(FeatureCollection(
+                    [Feature(Point((i, i)), {}) for i in range(100)]))
+        tree = layer.spatial_index(WebMercator)
+        self.assertTrue(layer.spatial_index(WebMercator) is tree)
+        x, y = WebMercator.project(10.5, 10.5)
+        x1, y1 = WebMercator.project(20.5, 20.5)
+        self.assertEqual(tree.query((x, y1, x1, y)).tolist(),
+                         list(range(11, 21)))
+
+if __name__ == "__main__":
+    unittest.main()
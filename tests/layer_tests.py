@@ -0,0 +1,68 @@
+import unittest
+import numpy as np
+from picogeojson import (Point, LineString, Polygon, MultiPoint,
+                         MultiPolygon, GeometryCollection,
+                         Feature, FeatureCollection)
+from worldly.layer import Layer, POINT, LINESTRING, POLYGON, MULTIPOINT
+
+class LayerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.fc = FeatureCollection([
+            Feature(Point((1, 2)), {"a": 1}),
+            Feature(LineString([(0, 0), (1, 1), (2, 0)]), {"a": 2}),
+            Feature(Polygon([[(0, 0), (4, 0), (4, 4), (0, 0)],
+                             [(1, 1), (2, 1), (2, 2), (1, 1)]]), {"a": 3})])
+
+    def test_offsets(self):
+        layer = Layer.from_geojson(self.fc)
+        self.assertEqual(len(layer), 3)
+        self.assertEqual(layer.nvertices, 12)
+        self.assertEqual(layer.ring_offsets.tolist(), [0, 1, 4, 8, 12])
+        self.assertEqual(layer.part_offsets.tolist(), [0, 1, 2, 4])
+        self.assertEqual(layer.geom_offsets.tolist(), [0, 1, 2, 3])
+        self.assertEqual(layer.geom_types.tolist(), [POINT, LINESTRING, POLYGON])
+        self.assertEqual(layer.feature_offsets.tolist(), [0, 1, 2, 3])
+        self.assertEqual([p["a"] for p in layer.properties], [1, 2, 3])
+
+    def test_geometry_rings(self):
+        layer = Layer.from_geojson(self.fc)
+        self.assertEqual(layer.geometry_rings(2), [(4, 8), (8, 12)])
+
+    def test_multipart(self):
+        layer = Layer.from_geojson(
+                MultiPoint([(0, 0), (1, 1)]),
+                MultiPolygon([[[(0, 0), (1, 0), (1, 1), (0, 0)]],
+                              [[(5, 5), (6, 5), (6, 6), (5, 5)]]]))
+        self.assertEqual(layer.geom_types.tolist()[0], MULTIPOINT)
+        self.assertEqual(layer.properties, [None, None])
+        self.assertEqual(layer.geom_offsets.tolist(), [0, 2, 4])
+        self.assertEqual(layer.geometry_rings(1), [(2, 6), (6, 10)])
+
+    def test_geometry_collection_flattened(self):
+        gc = GeometryCollection([Point((0, 0)),
+                                 GeometryCollection([Point((1, 1))]),
+                                 LineString([(2, 2), (3, 3)])])
+        layer = Layer.from_geojson(Feature(gc, {}))
+        self.assertEqual(len(layer), 1)
+        self.assertEqual(list(layer.feature_geometries(0)), [0, 1, 2])
+
+    def test_bbox(self):
+        layer = Layer.from_geojson(self.fc)
+        self.assertEqual(layer.bbox(), (0, 0, 4, 4))
+
+    def test_feature_bboxes(self):
+        layer = Layer.from_geojson(self.fc)
+        self.assertEqual(layer.feature_bboxes().tolist(),
+                         [[1, 2, 1, 2], [0, 0, 2, 1], [0, 0, 4, 4]])
+
+    def test_projected(self):
+        def p(x, y):
+            return (-x, 2*y)
+        layer = Layer.from_geojson(self.fc)
+        xy = layer.projected(p)
+        self.assertTrue(np.array_equal(xy[:,0], -layer.coords[:,0]))
+        self.assertTrue(np.array_equal(xy[:,1], 2*layer.coords[:,1]))
+
+if __name__ == "__main__":
+    unittest.main()
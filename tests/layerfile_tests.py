@@ -0,0 +1,87 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+import picogeojson
+from worldly.layer import Layer
+from worldly.layerfile import save_layer, load_layer, MappedLayer
+from worldly.mapsheet import MapSheet
+from worldly.topojson import Topology
+from topojson_tests import TOPOLOGY
+
+class LayerFileTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, "island.layer")
+        with open("tests/vancouver_island.geojson") as f:
+            self.geojson = f.read()
+        self.layer = Layer.from_geojson(picogeojson.fromstring(self.geojson))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def assertLayersEqual(self, loaded, layer):
+        for name in ("coords", "ring_offsets", "part_offsets",
+                     "geom_offsets", "geom_types", "feature_offsets"):
+            self.assertTrue(np.array_equal(getattr(loaded, name),
+                                           getattr(layer, name)))
+        self.assertEqual(list(loaded.properties), list(layer.properties))
+
+    def test_round_trip(self):
+        save_layer(self.layer, self.filename)
+        for mmap in (True, False):
+            loaded = load_layer(self.filename, mmap=mmap)
+            self.assertTrue(isinstance(loaded, MappedLayer))
+            self.assertLayersEqual(loaded, self.layer)
+            self.assertFalse(loaded.coords.flags.writeable)
+            self.assertTrue(np.array_equal(loaded.feature_bboxes(),
+                                           self.layer.feature_bboxes()))
+
+    def test_properties(self):
+        layer = Layer.from_geojson(picogeojson.fromstring('''
+            {"type": "FeatureCollection", "features": [
+             {"type": "Feature", "geometry": {"type": "Point",
+              "coordinates": [1, 2]}, "properties": {"name": "café",
+              "n": [1, 2.5, null]}},
+             {"type": "Feature", "geometry": {"type": "Point",
+              "coordinates": [3, 4]}, "properties": null}]}'''))
+        save_layer(layer, self.filename)
+        loaded = load_layer(self.filename)
+        self.assertEqual(len(loaded), 2)
+        self.assertEqual(loaded.properties[0],
+                         {"name": "café", "n": [1, 2.5, None]})
+        self.assertEqual(loaded.properties[-1], None)
+        self.assertEqual(loaded.properties[:1], [loaded.properties[0]])
+        with self.assertRaises(IndexError):
+            loaded.properties[2]
+
+    def test_empty_layer(self):
+        save_layer(Layer.from_geojson(), self.filename)
+        loaded = load_layer(self.filename)
+        self.assertEqual(len(loaded), 0)
+        self.assertEqual(loaded.coords.shape, (0, 2))
+
+    def test_topology_layer(self):
+        layer = Topology(TOPOLOGY).layer("squares")
+        save_layer(layer, self.filename)
+        self.assertLayersEqual(load_layer(self.filename), layer)
+
+    def test_not_a_layer_file(self):
+        with open(self.filename, "w") as f:
+            f.write(self.geojson)
+        with self.assertRaises(ValueError):
+            load_layer(self.filename)
+
+    def test_render_from_file(self):
+        save_layer(self.layer, self.filename)
+        expected = MapSheet(None, bbox=(-126, 48, -123, 51))
+        expected.add_geojson(self.geojson, dynamic_params={"class": "featurecla"})
+        sheet = MapSheet(None, bbox=(-126, 48, -123, 51))
+        sheet.add_layer_file(self.filename, dynamic_params={"class": "featurecla"})
+        self.assertEqual(sheet.serialize(), expected.serialize())
+        self.assertEqual(sheet.serialize(workers=2), expected.serialize())
+
+if __name__ == "__main__":
+    unittest.main()
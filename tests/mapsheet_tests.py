@@ -1,8 +1,19 @@
 import unittest
+import gzip
 import io
+import os
+import pathlib
+import re
+import shutil
+import tempfile
+import xml.etree.ElementTree as ET
 from picogeojson import (Point, LineString, Polygon,
                          GeometryCollection, Feature, FeatureCollection)
 from worldly import svg, mapsheet
+from worldly.cache import ProjectionCache
+from worldly.projection import WebMercator
+from worldly.stats import RenderStats
+from util import decode_path, CountingMercator
 
 class MapSheetTests(unittest.TestCase):
 
@@ -69,6 +80,350 @@ class MapSheetTests(unittest.TestCase):
         buf.seek(0)
         self.assertTrue('fill="#FF0000"' in buf.read())
 
+    def test_linestring_precision(self):
+        s = '''{"type": "Feature",
+                "geometry": {"type": "LineString",
+                             "coordinates": [[-123.3, 48.4], [-123.1, 49.3]]},
+                "properties": {}}'''
+        sheet = mapsheet.MapSheet(None, bbox=(-124, 48, -123, 50))
+        sheet.add_geojson(s)
+        for precision in (0, 4):
+            node = next(mapsheet._convert_geojson_tuple(
+                sheet.entities[0][0], lambda xy: xy / 7.0, WebMercator,
+                precision))
+            d = node.svg().attrib["d"]
+            self.assertEqual(max(len(n.split(".")[1]) if "." in n else 0
+                                 for n in re.split("[ML ,]+", d) if n != ""),
+                             precision)
+
+    def test_write_streams_features(self):
+        s = '''{"type": "FeatureCollection", "features": [
+                {"type": "Feature",
+                 "geometry": {"type": "Point", "coordinates": [1.0, 3.0]},
+                 "properties": {}},
+                {"type": "Feature",
+                 "geometry": {"type": "Point", "coordinates": [2.0, 4.0]},
+                 "properties": {}}]}'''
+
+        class Recorder(object):
+            def __init__(self):
+                self.chunks = []
+            def write(self, chunk):
+                self.chunks.append(chunk)
+
+        rec = Recorder()
+        with mapsheet.MapSheet(rec) as sheet:
+            sheet.style = ".a { fill: red; }"
+            sheet.add_geojson(s)
+
+        paths = [c for c in rec.chunks if c.startswith("<path")]
+        self.assertEqual(len(paths), 2)
+        self.assertTrue(rec.chunks[0].startswith("<svg "))
+        self.assertEqual(rec.chunks[1], "<style>.a { fill: red; }</style>")
+        self.assertEqual(rec.chunks[-1], "</svg>")
+        self.assertEqual("".join(rec.chunks), sheet.serialize())
+
+    def test_features_outside_bbox_culled(self):
+        s = '''{"type": "FeatureCollection", "features": [
+                {"type": "Feature",
+                 "geometry": {"type": "Point", "coordinates": [1.0, 3.0]},
+                 "properties": {"name": "inside"}},
+                {"type": "Feature",
+                 "geometry": {"type": "Point", "coordinates": [100.0, 3.0]},
+                 "properties": {"name": "outside"}}]}'''
+        sheet = mapsheet.MapSheet(None, bbox=(-10, -10, 10, 10))
+        sheet.add_geojson(s, dynamic_params={"id": "name"})
+        out = sheet.serialize()
+        self.assertTrue('id="inside"' in out)
+        self.assertFalse('id="outside"' in out)
+
+        sheet.clip = False
+        self.assertTrue('id="outside"' in sheet.serialize())
+
+    def test_polygon_clipped_to_bbox(self):
+        with open("tests/vancouver_island.geojson") as f:
+            s = f.read()
+        full = mapsheet.MapSheet(None, bbox=(-126, 48.5, -124, 50), clip=False)
+        full.add_geojson(s)
+        clipped = mapsheet.MapSheet(None, bbox=(-126, 48.5, -124, 50))
+        clipped.add_geojson(s)
+        self.assertTrue(len(clipped.serialize()) < len(full.serialize()))
+
+    def test_simplified_output(self):
+        with open("tests/vancouver_island.geojson") as f:
+            s = f.read()
+        full = mapsheet.MapSheet(None, width=100, height=100,
+                                 bbox=(-129, 48, -123, 51))
+        full.add_geojson(s)
+        for method in ("douglas-peucker", "visvalingam"):
+            simple = mapsheet.MapSheet(None, width=100, height=100,
+                                       bbox=(-129, 48, -123, 51),
+                                       simplify=method, tolerance=1.0)
+            simple.add_geojson(s)
+            self.assertTrue(len(simple.serialize()) < len(full.serialize()))
+            self.assertTrue("<path" in simple.serialize())
+
+    def test_lod_output(self):
+        with open("tests/vancouver_island.geojson") as f:
+            s = f.read()
+        for width in (100, 400, 2000):
+            sheets = [mapsheet.MapSheet(None, width=width, height=width,
+                                        bbox=(-129, 48, -123, 51), clip=False,
+                                        simplify="douglas-peucker", lod=lod)
+                      for lod in (False, True)]
+            for sheet in sheets:
+                sheet.add_geojson(s)
+            self.assertEqual(sheets[1].serialize(), sheets[0].serialize())
+
+        sheet = mapsheet.MapSheet(None, bbox=(-126, 48.5, -124, 50),
+                                  simplify="douglas-peucker", lod=True)
+        sheet.add_geojson(s)
+        layer = sheet.entities[0][0]
+        self.assertEqual(len(layer._pyramids), 1)
+        self.assertTrue("<path" in sheet.serialize())
+
+    def point_sheet(self, **kw):
+        points = '''{"type": "FeatureCollection", "features": [
+            {"type": "Feature", "geometry": {"type": "Point",
+             "coordinates": [1.0, 2.0]}, "properties": {"mag": 2}},
+            {"type": "Feature", "geometry": {"type": "MultiPoint",
+             "coordinates": [[3.0, 4.0], [5.0, 6.0], [50.0, 50.0]]},
+             "properties": {"mag": 4}}]}'''
+        sheet = mapsheet.MapSheet(None, bbox=(-10, -10, 10, 10))
+        sheet.add_geojson(points, **kw)
+        return sheet
+
+    def test_circle_symbols(self):
+        s = self.point_sheet(symbol="circle", symbol_size=1.5,
+                             class_name="quake").serialize()
+        circles = re.findall("<circle [^>]*>", s)
+        self.assertEqual(len(circles), 3)      # one is clipped
+        self.assertTrue(all(' r="1.5"' in c and 'class="quake"' in c
+                            for c in circles))
+        self.assertFalse("<path" in s)
+
+        s = self.point_sheet(symbol="circle", dynamic_params={"r": "mag"},
+                             scales={"r": lambda m: m/2}).serialize()
+        self.assertEqual(re.findall(' r="([^"]*)"', s), ["1.0", "2.0", "2.0"])
+
+    def test_use_symbols(self):
+        marker = svg.SVGCircle((0, 0), 2, fill="red")
+        sheet = self.point_sheet(symbol=marker)
+        sheet.add_geojson('{"type": "Point", "coordinates": [0, 0]}',
+                          symbol=marker)
+        s = sheet.serialize()
+        defs = re.findall("<defs>(.*)</defs>", s)
+        self.assertEqual(len(defs), 1)
+        self.assertEqual(defs[0].count("<circle"), 1)
+        symbol_id = re.findall(' id="([^"]*)"', defs[0])[0]
+        self.assertEqual(s.count('<use href="#{}"'.format(symbol_id)), 4)
+        self.assertTrue(s.index("<defs>") < s.index("<g "))
+        self.assertEqual(marker.attrs.get("id"), None)
+
+        marker = svg.SVGCircle((0, 0), 2, id_name="m")
+        s = self.point_sheet(symbol=marker).serialize()
+        defs = re.findall("<defs>(.*)</defs>", s)
+        self.assertEqual(len(defs), 1)
+        self.assertTrue(re.match('<g transform="scale\([^)]*\)" id="m">'
+                                 '<circle cx="0" cy="0" r="2" /></g>$',
+                                 defs[0]))
+        self.assertEqual(s.count('<use href="#m"'), 3)
+
+    def test_compact_circle_symbols(self):
+        points = '{"type": "MultiPoint", "coordinates": [[1, 2], [3, 4]]}'
+        for compact in (False, True):
+            sheet = mapsheet.MapSheet(None, bbox=(-10, -10, 10, 10),
+                                      compact=compact)
+            sheet.add_geojson(points, symbol="circle", symbol_size=2.4)
+            s = sheet.serialize()
+            self.assertEqual(re.findall(' r="([^"]*)"', s), ["2.4", "2.4"])
+            self.assertFalse("scale(0.1)" in s)
+
+    def test_use_symbols_cancel_map_transform(self):
+        marker = svg.SVGPath([[(0, 0), (0, -5)]], id_name="flag")
+        sheet = mapsheet.MapSheet(None, width=600, height=200,
+                                  bbox=(-10, -10, 10, 10))
+        sheet.add_geojson('{"type": "Point", "coordinates": [1, 2]}',
+                          symbol=marker)
+        s = sheet.serialize()
+        self.assertTrue('xmlns:xlink="{}"'.format(svg.XLINK) in s)
+        ET.fromstring(s)    # parses, with the xlink prefix bound
+        sx, sy = [float(v) for v in re.findall(
+            'scale\(([^,]*),([^)]*)\) translate', s)[0]]
+        self.assertNotAlmostEqual(abs(sx), abs(sy))
+
+        uses = re.findall("<use [^>]*>", s)
+        self.assertEqual(len(uses), 1)
+        self.assertTrue('href="#flag"' in uses[0])
+        self.assertTrue('xlink:href="#flag"' in uses[0])
+        ux, uy = [float(v) for v in re.findall(
+            '<g transform="scale\(([^,]*),([^)]*)\)" id="flag">', s)[0]]
+        # the symbol is drawn upright at its own size in pixels
+        self.assertAlmostEqual(sx * ux, 1.0, places=4)
+        self.assertAlmostEqual(sy * uy, 1.0, places=4)
+
+    def test_symbol_serializations_agree(self):
+        sheet = self.point_sheet(symbol="circle", batch=True)
+        serial = sheet.serialize()
+        self.assertEqual(sheet.serialize(workers=2), serial)
+        self.assertEqual(sheet.serialize(stats=RenderStats()), serial)
+
+    def test_unknown_symbol(self):
+        with self.assertRaises(ValueError):
+            self.point_sheet(symbol="square").serialize()
+
+    def test_small_rings_dropped(self):
+        s = '''{"type": "MultiPolygon", "coordinates": [
+                [[[0.0, 0.0], [10.0, 0.0], [10.0, 10.0], [0.0, 0.0]]],
+                [[[20.0, 20.0], [20.001, 20.0], [20.0, 20.001], [20.0, 20.0]]]]}'''
+        sheet = mapsheet.MapSheet(None, bbox=(-40, -40, 40, 40), min_area=4.0)
+        sheet.add_geojson(s)
+        self.assertEqual(sheet.serialize().count("Z"), 1)
+
+    def test_parallel_serialize_matches_serial(self):
+        with open("tests/vancouver_island.geojson") as f:
+            s = f.read()
+        points = '''{"type": "FeatureCollection", "features": [%s]}''' % \
+                ",".join('''{"type": "Feature",
+                             "geometry": {"type": "Point",
+                                          "coordinates": [%f, 49.5]},
+                             "properties": {"n": %d}}''' % (-128 + 0.05*i, i)
+                         for i in range(100))
+        sheet = mapsheet.MapSheet(None, bbox=(-129, 48, -123, 51))
+        sheet.add_geojson(s, class_name="land")
+        sheet.add_svg(svg.SVGCircle((10, 10), 5))
+        sheet.add_geojson(points, dynamic_params={"id": "n"})
+        serial = sheet.serialize()
+        self.assertEqual(sheet.serialize(workers=3), serial)
+        self.assertEqual(serial.count(' id="'), 100)
+
+    def test_parallel_serialize_projects_once(self):
+        projection = CountingMercator()
+        # the cache is too small to keep the layer
+        sheet = mapsheet.MapSheet(None, projection=projection,
+                                  bbox=(-129, 48, -123, 51),
+                                  cache=ProjectionCache(max_bytes=1000))
+        sheet.add_geojson_file("tests/vancouver_island.geojson")
+        serial = sheet.serialize()
+        count = projection.count
+        self.assertEqual(sheet.serialize(workers=2), serial)
+        self.assertEqual(projection.count, count + 1)
+
+    def test_compact_output(self):
+        outputs = {}
+        for compact in (False, True):
+            sheet = mapsheet.MapSheet(None, bbox=(-129, 48, -123, 51),
+                                      compact=compact)
+            sheet.add_geojson_file("tests/vancouver_island.geojson")
+            outputs[compact] = sheet.serialize()
+        self.assertTrue(len(outputs[True]) < 0.7 * len(outputs[False]))
+
+        paths = [re.findall(' d="([^"]*)"', outputs[compact])
+                 for compact in (False, True)]
+        self.assertEqual(len(paths[0]), len(paths[1]))
+        for absolute, compact in zip(*paths):
+            expected = decode_path(absolute)
+            decoded = decode_path(compact)
+            self.assertEqual(len(decoded), len(expected))
+            for sp1, sp2 in zip(decoded, expected):
+                # compact paths drop repeated vertices and merge collinear
+                # axis-aligned segments, so their vertices are a subsequence
+                self.assertEqual(sp1[0], sp2[0])
+                remaining = iter(sp2)
+                for x1, y1 in sp1:
+                    self.assertTrue(any(abs(x1 - x2) < 1e-6 and
+                                        abs(y1 - y2) < 1e-6
+                                        for x2, y2 in remaining))
+
+    def test_compact_stroke_widths_unchanged(self):
+        outputs = {}
+        for compact in (False, True):
+            sheet = mapsheet.MapSheet(None, bbox=(-129, 48, -123, 51),
+                                      style=".land { stroke-width: 0.8; }",
+                                      compact=compact)
+            sheet.add_geojson_file("tests/vancouver_island.geojson",
+                                   class_name="land",
+                                   static_params={"stroke-width": 2})
+            outputs[compact] = sheet.serialize()
+        # stroke widths are in the same user space either way
+        transforms = [re.findall('<g transform="([^"]*)"', outputs[compact])
+                      for compact in (False, True)]
+        self.assertEqual(len(transforms[0]), 1)
+        self.assertEqual(transforms[0], transforms[1])
+        for compact in (False, True):
+            self.assertTrue(".land { stroke-width: 0.8; }" in outputs[compact])
+            self.assertEqual(len(re.findall('stroke-width="2"',
+                                            outputs[compact])),
+                             outputs[compact].count("<path"))
+
+    def test_batched_paths(self):
+        outputs = []
+        for kw in ({}, {"batch": True},
+                   {"batch": True, "max_batch_vertices": 500}):
+            sheet = mapsheet.MapSheet(None, bbox=(-129, 48, -123, 51))
+            sheet.add_geojson_file("tests/vancouver_island.geojson",
+                                   class_name="land", **kw)
+            outputs.append(sheet.serialize())
+        self.assertEqual(outputs[1].count("<path"), 1)
+        self.assertTrue(outputs[2].count("<path") in (3, 4))
+
+        subpaths = [sorted(sp for d in re.findall(' d="([^"]*)"', s)
+                           for sp in decode_path(d)) for s in outputs]
+        self.assertEqual(subpaths[0], subpaths[1])
+        self.assertEqual(subpaths[0], subpaths[2])
+
+    def test_parallel_batched_matches_serial(self):
+        features = ",".join('{{"type": "Feature", "properties": {{"n": {}}}, '
+                            '"geometry": {{"type": "Point", '
+                            '"coordinates": [{}, {}]}}}}'.format(i % 3, i % 50, i % 70)
+                            for i in range(300))
+        collection = '{{"type": "FeatureCollection", "features": [{}]}}'.format(features)
+        outputs = []
+        for workers in (None, 3):
+            sheet = mapsheet.MapSheet(None)
+            sheet.add_geojson(collection, batch=True, max_batch_vertices=40,
+                              dynamic_params={"class": "n"})
+            outputs.append(sheet.serialize(workers=workers))
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(outputs[0].count("<path"), 9)
+
+    def test_svgz_output(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            expected = None
+            for dest in (os.path.join(tmpdir, "map.svgz"),
+                         pathlib.Path(tmpdir) / "path.svgz"):
+                with mapsheet.MapSheet(dest, bbox=(-129, 48, -123, 51)) as sheet:
+                    sheet.add_geojson_file("tests/vancouver_island.geojson")
+                expected = sheet.serialize()
+                with gzip.open(str(dest), "rt", encoding="utf-8") as f:
+                    self.assertEqual(f.read(), expected)
+
+            dest = pathlib.Path(tmpdir) / "plain.svg"
+            sheet.save(dest)
+            with open(str(dest)) as f:
+                self.assertEqual(f.read(), expected)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_binary_file_output(self):
+        sheet = mapsheet.MapSheet(None, bbox=(-129, 48, -123, 51))
+        sheet.add_geojson_file("tests/vancouver_island.geojson")
+        expected = sheet.serialize()
+
+        buf = io.BytesIO()
+        sheet.write(buf, compress=True)
+        self.assertEqual(gzip.decompress(buf.getvalue()).decode("utf-8"),
+                         expected)
+        self.assertTrue(len(buf.getvalue()) < len(expected) / 2)
+
+        buf = io.BytesIO()
+        sheet.write(buf)
+        self.assertEqual(buf.getvalue().decode("utf-8"), expected)
+
+        with self.assertRaises(ValueError):
+            sheet.write(io.StringIO(), compress=True)
+
 
 class ProjectedBboxTests(unittest.TestCase):
 
@@ -0,0 +1,92 @@
+import unittest
+from worldly import svg
+from worldly.mapsheet import MapSheet
+from worldly.prepared import PreparedLayer
+from worldly.projection import NorthPolarStereographic
+from worldly.stats import RenderStats
+
+BBOX = (-126, 48, -123, 51)
+
+def read_island():
+    with open("tests/vancouver_island.geojson") as f:
+        return f.read()
+
+def point(x, y):
+    return ('{{"type": "Feature", "geometry": {{"type": "Point", '
+            '"coordinates": [{}, {}]}}, "properties": {{}}}}'.format(x, y))
+
+class PreparedLayerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.base = MapSheet(None, bbox=BBOX, simplify="douglas-peucker")
+        self.prepared = self.base.prepare(read_island(), class_name="land")
+
+    def overlay_sheet(self, prepared, x, **kw):
+        sheet = MapSheet(None, **dict(dict(bbox=BBOX,
+                                           simplify="douglas-peucker"), **kw))
+        if prepared:
+            sheet.add_prepared(self.prepared)
+        else:
+            sheet.add_geojson(read_island(), class_name="land")
+        sheet.add_geojson(point(x, 49.5), class_name="site")
+        return sheet
+
+    def test_prepare(self):
+        self.assertTrue(isinstance(self.prepared, PreparedLayer))
+        self.assertEqual(len(self.prepared), 22)
+        self.assertEqual(self.prepared.paths,
+                         self.prepared.fragment.count("<path"))
+        self.assertEqual(self.base.entities, [])
+
+    def test_spliced_output_matches(self):
+        for x in (-125.5, -124.0):
+            self.assertEqual(self.overlay_sheet(True, x).serialize(),
+                             self.overlay_sheet(False, x).serialize())
+
+    def test_spliced_without_conversion(self):
+        sheet = self.overlay_sheet(True, -124.0)
+        stats = RenderStats()
+        sheet.serialize(stats=stats)
+        base, overlay = stats.layers
+        self.assertTrue(base.cached)
+        self.assertEqual(base.name, "land")
+        self.assertEqual(base.stages["conversion"], 0.0)
+        self.assertFalse(overlay.cached)
+
+    def test_different_settings_convert_again(self):
+        for kw in (dict(bbox=(-127, 47, -122, 52)),
+                   dict(compact=True),
+                   dict(simplify=None),
+                   dict(projection=NorthPolarStereographic)):
+            sheet = self.overlay_sheet(True, -124.0, **kw)
+            stats = RenderStats()
+            s = sheet.serialize(stats=stats)
+            self.assertFalse(stats.layers[0].cached)
+            self.assertEqual(s, self.overlay_sheet(False, -124.0,
+                                                   **kw).serialize())
+
+    def test_parallel_and_incremental(self):
+        expected = self.overlay_sheet(False, -124.0).serialize()
+        sheet = self.overlay_sheet(True, -124.0)
+        self.assertEqual(sheet.serialize(workers=2), expected)
+        sheet.incremental = True
+        self.assertEqual(sheet.serialize(), expected)
+        self.assertEqual(sheet.serialize(), expected)
+
+    def test_scale_mode(self):
+        base = MapSheet(None, scale=1e-3)
+        prepared = base.prepare(read_island())
+        sheet = MapSheet(None, scale=1e-3)
+        sheet.add_prepared(prepared)
+        reference = MapSheet(None, scale=1e-3)
+        reference.add_geojson(read_island())
+        stats = RenderStats()
+        self.assertEqual(sheet.serialize(stats=stats), reference.serialize())
+        self.assertTrue(stats.layers[0].cached)
+
+    def test_add_prepared_type(self):
+        with self.assertRaises(ValueError):
+            MapSheet(None).add_prepared(svg.SVGCircle((0, 0), 1))
+
+if __name__ == "__main__":
+    unittest.main()
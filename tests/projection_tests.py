@@ -0,0 +1,80 @@
+import unittest
+import numpy as np
+from worldly import projection
+from worldly.projection import (Projection, WebMercator,
+                                NorthPolarStereographic,
+                                SouthPolarStereographic)
+
+class ProjectArrayTests(unittest.TestCase):
+
+    def setUp(self):
+        self.lons = np.array([-179.0, -132.5, 0.0, 45.0, 120.25])
+        self.lats = np.array([-60.0, 53.2, 0.0, 10.0, 75.5])
+
+    def _assert_matches_scalar(self, proj, lons, lats):
+        x, y = proj.project_array(lons, lats)
+        for i in range(len(lons)):
+            xs, ys = proj.project(lons[i], lats[i])
+            self.assertAlmostEqual(x[i], xs, places=4)
+            self.assertAlmostEqual(y[i], ys, places=4)
+
+    def test_mercator_matches_scalar(self):
+        self._assert_matches_scalar(WebMercator, self.lons, self.lats)
+
+    def test_stereographic_matches_scalar(self):
+        self._assert_matches_scalar(NorthPolarStereographic,
+                                    self.lons, np.abs(self.lats))
+        self._assert_matches_scalar(SouthPolarStereographic,
+                                    self.lons, -np.abs(self.lats))
+
+    def test_mercator_clamps_poles(self):
+        lons = np.array([0.0, 0.0, 10.0])
+        lats = np.array([-90.0, 90.0, -85.0511287798])
+        self._assert_matches_scalar(WebMercator, lons, lats)
+        x, y = WebMercator.project_array(lons, lats)
+        self.assertTrue(np.isfinite(y).all())
+        self.assertAlmostEqual(y[0], 2*WebMercator.R, places=3)
+        self.assertAlmostEqual(y[1], 0.0, places=3)
+        self.assertEqual(y[0], y[2])
+
+    def test_mercator_inverse_array(self):
+        x, y = WebMercator.project_array(self.lons, self.lats)
+        lons, lats = WebMercator.inverse_array(x, y)
+        self.assertTrue(np.allclose(lons, self.lons))
+        self.assertTrue(np.allclose(lats, self.lats))
+
+    def test_stereographic_inverse_array(self):
+        lats = -np.abs(self.lats)
+        x, y = SouthPolarStereographic.project_array(self.lons, lats)
+        lons, lats_ = SouthPolarStereographic.inverse_array(x, y)
+        self.assertTrue(np.allclose(lons, self.lons))
+        self.assertTrue(np.allclose(lats_, lats))
+
+    def test_stereographic_inverse_origin(self):
+        lons, lats = NorthPolarStereographic.inverse_array([0.0], [0.0])
+        self.assertEqual((lons[0], lats[0]), (0.0, 90.0))
+        self.assertEqual(NorthPolarStereographic.inverse(0.0, 0.0), (0.0, 90.0))
+
+    def test_scalar_inverse(self):
+        x, y = WebMercator.project(-132.5, 53.2)
+        lon, lat = WebMercator.inverse(x, y)
+        self.assertAlmostEqual(lon, -132.5)
+        self.assertAlmostEqual(lat, 53.2)
+
+    def test_subclass_fallback(self):
+        class Swap(Projection):
+            def project(self, lon, lat):
+                return lat, lon
+        x, y = Swap().project_array(self.lons, self.lats)
+        self.assertTrue(np.array_equal(x, self.lats))
+        self.assertTrue(np.array_equal(y, self.lons))
+
+    def test_callable_fallback(self):
+        def p(x, y):
+            return (-x, -y)
+        x, y = projection.project_array(p, self.lons, self.lats)
+        self.assertTrue(np.array_equal(x, -self.lons))
+        self.assertTrue(np.array_equal(y, -self.lats))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,21 @@
 import unittest
+from cache_tests import *
+from cli_tests import *
+from clip_tests import *
+from data_tests import *
+from fetch_tests import *
+from index_tests import *
+from layerfile_tests import *
+from layer_tests import *
 from mapsheet_tests import *
+from prepared_tests import *
+from projection_tests import *
+from simplify_tests import *
+from stats_tests import *
+from stream_tests import *
 from svg_tests import *
+from tiles_tests import *
+from topojson_tests import *
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+import numpy as np
+from worldly import simplify
+
+def _recursive_dp(xy, tol, i0, i1, keep):
+    if i1 - i0 < 2:
+        return
+    a, b = xy[i0], xy[i1]
+    seg = b - a
+    rel = xy[i0+1:i1] - a
+    dist = np.abs(seg[0]*rel[:,1] - seg[1]*rel[:,0]) / np.hypot(*seg)
+    k = int(np.argmax(dist))
+    if dist[k] > tol:
+        keep.add(i0+1+k)
+        _recursive_dp(xy, tol, i0, i0+1+k, keep)
+        _recursive_dp(xy, tol, i0+1+k, i1, keep)
+
+class SimplifyTests(unittest.TestCase):
+
+    def setUp(self):
+        t = np.linspace(0, 4*np.pi, 200)
+        self.line = np.c_[t, np.sin(t) + 0.05*np.cos(17*t)]
+
+    def test_douglas_peucker_straight_line(self):
+        xy = np.array([[0., 0.], [1., 0.01], [2., -0.01], [3., 0.]])
+        self.assertEqual(simplify.simplify(xy, 0.1).tolist(), [0, 3])
+        self.assertEqual(simplify.simplify(xy, 0.001).tolist(), [0, 1, 2, 3])
+
+    def test_douglas_peucker_matches_recursive(self):
+        for tol in (0.01, 0.1, 0.5):
+            keep = {0, len(self.line)-1}
+            _recursive_dp(self.line, tol, 0, len(self.line)-1, keep)
+            self.assertEqual(simplify.simplify(self.line, tol).tolist(),
+                             sorted(keep))
+
+    def test_importance_nested(self):
+        imp = simplify.douglas_peucker_importance(self.line)
+        coarse = set(np.flatnonzero(imp > 0.5))
+        fine = set(np.flatnonzero(imp > 0.05))
+        self.assertTrue(coarse < fine)
+
+    def test_visvalingam(self):
+        xy = np.array([[0., 0.], [1., 0.01], [2., 1.], [3., 0.]])
+        self.assertEqual(simplify.simplify(xy, 1.0, simplify.VISVALINGAM).tolist(),
+                         [0, 2, 3])
+        n = len(simplify.simplify(self.line, 0.1, simplify.VISVALINGAM))
+        self.assertTrue(2 < n < len(self.line))
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            simplify.simplify(self.line, 0.1, "bogus")
+
+    def test_drop_duplicates(self):
+        xy = np.array([[0., 0.], [0., 0.], [1., 1.], [0., 0.], [0., 0.]])
+        self.assertEqual(simplify.drop_duplicates(xy).tolist(),
+                         [[0, 0], [1, 1], [0, 0]])
+
+    def test_ring_area(self):
+        ring = np.array([[1., 1.], [3., 1.], [3., 4.], [1., 4.], [1., 1.]])
+        self.assertEqual(simplify.ring_area(ring), 6.0)
+        self.assertEqual(simplify.ring_area(ring[::-1]), 6.0)
+
+class LODPyramidTests(unittest.TestCase):
+
+    def setUp(self):
+        t = np.linspace(0, 4*np.pi, 200)
+        line = np.c_[t, np.sin(t) + 0.05*np.cos(17*t)]
+        theta = np.linspace(0, 2*np.pi, 50)
+        ring = np.c_[np.cos(theta), np.sin(theta) * (1 + 0.1*np.cos(9*theta))]
+        ring[-1] = ring[0]
+        self.xy = np.vstack([line, [[5., 5.]], ring, [[0., 0.], [1., 1.]]])
+        self.offsets = np.array([0, 200, 201, 251, 253])
+
+    def test_matches_simplify(self):
+        for method in (simplify.DOUGLAS_PEUCKER, simplify.VISVALINGAM):
+            pyramid = simplify.LODPyramid(self.xy, self.offsets, method=method)
+            for tol in (0.0, 0.003, 0.01, 0.1, 0.5, 10.0):
+                level = pyramid.level(tol)
+                for r in (0, 2):
+                    a, b = self.offsets[r], self.offsets[r+1]
+                    self.assertEqual(pyramid.ring(r, level, tol).tolist(),
+                                     (simplify.simplify(self.xy[a:b], tol,
+                                                        method) + a).tolist())
+
+    def test_levels(self):
+        pyramid = simplify.LODPyramid(self.xy, self.offsets)
+        sizes = [len(idx) for idx, _ in pyramid.levels]
+        self.assertTrue(len(sizes) > 3)
+        self.assertEqual(sizes, sorted(sizes, reverse=True))
+        self.assertEqual(pyramid.level(0.0), -1)
+        self.assertEqual(pyramid.level(pyramid.base_tolerance), 0)
+        self.assertEqual(pyramid.level(2.5*pyramid.base_tolerance), 1)
+        self.assertEqual(pyramid.level(1e9), len(sizes) - 1)
+
+    def test_short_rings_kept(self):
+        pyramid = simplify.LODPyramid(self.xy, self.offsets)
+        self.assertEqual(pyramid.ring(1, pyramid.level(10.0), 10.0).tolist(),
+                         [200])
+        self.assertEqual(pyramid.ring(3, pyramid.level(10.0), 10.0).tolist(),
+                         [251, 252])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import unittest
+import json
+from worldly import svg
+from worldly.mapsheet import MapSheet
+from worldly.stats import RenderStats
+
+class RenderStatsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.sheet = MapSheet(None, bbox=(-126, 48, -123, 51),
+                              simplify="douglas-peucker", tolerance=1.0)
+        self.sheet.add_geojson_file("tests/vancouver_island.geojson",
+                                    class_name="land")
+        self.sheet.add_svg(svg.SVGCircle((10, 10), 5))
+
+    def test_output_unchanged(self):
+        stats = RenderStats()
+        self.assertEqual(self.sheet.serialize(stats=stats),
+                         self.sheet.serialize())
+
+    def test_collected_stats(self):
+        stats = RenderStats()
+        s = self.sheet.serialize(stats=stats)
+        self.assertEqual(stats.output_bytes, len(s.encode("utf-8")))
+        self.assertEqual([layer.name for layer in stats.layers],
+                         ["land", "SVGCircle"])
+
+        land = stats.layers[0]
+        self.assertEqual(land.features, 22)
+        self.assertTrue(0 < land.features_selected < 22)
+        self.assertEqual(land.paths, s.count("<path"))
+        self.assertTrue(0 < land.vertices_out < land.vertices_in <= 1414)
+        self.assertEqual(stats.vertices_in, land.vertices_in)
+
+        self.assertTrue(stats.stages["parse"] > 0)
+        self.assertTrue(stats.stages["total"] >= stats.stages["conversion"])
+        self.assertAlmostEqual(sum(layer.stages["encoding"]
+                                   for layer in stats.layers),
+                               stats.stages["encoding"])
+        json.dumps(stats.as_dict())
+
+    def test_callback(self):
+        received = []
+        self.sheet.stats_callback = received.append
+        self.sheet.serialize()
+        self.sheet.serialize(workers=2)
+        self.assertEqual(len(received), 2)
+        self.assertEqual(len(received[0].layers), 2)
+        # per-layer statistics are not collected from worker processes
+        self.assertEqual(received[1].layers, [])
+        self.assertEqual(received[0].output_bytes, received[1].output_bytes)
+
+    def test_streamed_layer(self):
+        sheet = MapSheet(None, bbox=(-126, 48, -123, 51))
+        sheet.add_geojson_file("tests/vancouver_island.geojson", stream=True)
+        stats = RenderStats()
+        self.assertEqual(sheet.serialize(stats=stats), sheet.serialize())
+        self.assertEqual(stats.layers[0].name, "GeoJSONStream")
+        self.assertEqual(stats.layers[0].features, 22)
+        self.assertTrue(stats.layers[0].vertices_out > 0)
+        self.assertEqual(stats.layers[0].paths, stats.layers[0].features_selected)
+
+    def test_streamed_layer_lod_unchanged(self):
+        sheet = MapSheet(None, bbox=(-126, 48, -123, 51), lod=True,
+                         simplify="douglas-peucker", tolerance=1.0)
+        sheet.add_geojson_file("tests/vancouver_island.geojson", stream=True)
+        self.assertEqual(sheet.serialize(stats=RenderStats()),
+                         sheet.serialize())
+
+class IncrementalTests(unittest.TestCase):
+
+    def setUp(self):
+        self.sheet = MapSheet(None, bbox=(-129, 48, -123, 51), incremental=True)
+        self.sheet.add_geojson_file("tests/vancouver_island.geojson",
+                                    class_name="land")
+        self.point = ('{"type": "Feature", "properties": {"mag": 4}, '
+                      '"geometry": {"type": "Point", "coordinates": [-126, 50]}}')
+
+    def render(self, **kw):
+        stats = RenderStats()
+        s = self.sheet.serialize(stats=stats, **kw)
+        return s, [layer.cached for layer in stats.layers]
+
+    def reference(self):
+        sheet = MapSheet(None, bbox=self.sheet.bbox, style=self.sheet.style)
+        sheet.entities = list(self.sheet.entities)
+        return sheet.serialize()
+
+    def test_style_change_reuses_fragments(self):
+        self.assertEqual(self.render()[1], [False])
+        self.sheet.style = ".land { fill: green; }"
+        s, cached = self.render()
+        self.assertEqual(cached, [True])
+        self.assertEqual(s, self.reference())
+
+    def test_added_layer_converted_alone(self):
+        self.render()
+        self.sheet.add_geojson(self.point, class_name="quake",
+                               dynamic_params={"stroke-width": "mag"})
+        s, cached = self.render()
+        self.assertEqual(cached, [True, False])
+        self.assertEqual(s, self.reference())
+
+    def test_changed_params_invalidate(self):
+        self.sheet.add_geojson(self.point, class_name="quake",
+                               dynamic_params={"stroke-width": "mag"})
+        self.render()
+        self.sheet.entities[1][1]["dynamic_params"]["stroke"] = "mag"
+        s, cached = self.render()
+        self.assertEqual(cached, [True, False])
+        self.assertTrue('stroke="4"' in s)
+        self.assertEqual(s, self.reference())
+
+    def test_extent_change_invalidates(self):
+        self.render()
+        self.sheet.bbox = (-128, 48, -124, 51)
+        s, cached = self.render()
+        self.assertEqual(cached, [False])
+        self.assertEqual(s, self.reference())
+
+    def test_removed_layer_forgotten(self):
+        self.render()
+        self.sheet.entities.pop()
+        self.assertEqual(self.render()[1], [])
+        self.assertEqual(self.sheet._fragments, {})
+
+    def test_parallel_incremental(self):
+        self.sheet.add_geojson(self.point, class_name="quake")
+        first = self.sheet.serialize(workers=2)
+        self.assertEqual(first, self.reference())
+        self.assertEqual(self.render(workers=2)[1], [True, True])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+import io
+import json
+import os
+import tempfile
+from worldly import stream
+from worldly.mapsheet import MapSheet
+
+def point_feature(i):
+    return {"type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [i*1.25, -i*0.5]},
+            "properties": {"n": i}}
+
+class IterFeaturesTests(unittest.TestCase):
+
+    def test_feature_collection_small_chunks(self):
+        collection = {"type": "FeatureCollection",
+                      "features": [point_feature(i) for i in range(20)]}
+        f = io.StringIO(json.dumps(collection, indent=2))
+        features = list(stream.iter_features(f, chunk_size=7))
+        self.assertEqual(features, collection["features"])
+
+    def test_geojson_seq(self):
+        text = "".join("\x1e" + json.dumps(point_feature(i)) + "\n"
+                       for i in range(5))
+        text += "\n".join(json.dumps(point_feature(i)) for i in range(5, 10))
+        features = list(stream.iter_features(io.StringIO(text), chunk_size=5))
+        self.assertEqual(features, [point_feature(i) for i in range(10)])
+
+    def test_single_feature(self):
+        feature = point_feature(3)
+        f = io.StringIO(json.dumps(feature))
+        self.assertEqual(list(stream.iter_features(f)), [feature])
+
+    def test_truncated_input(self):
+        f = io.StringIO('{"type": "FeatureCollection", "features": [{"type"')
+        with self.assertRaises(ValueError):
+            list(stream.iter_features(f, chunk_size=8))
+
+    def test_iter_layers_batches(self):
+        collection = {"type": "FeatureCollection",
+                      "features": [point_feature(i) for i in range(10)]}
+        f = io.StringIO(json.dumps(collection))
+        layers = list(stream.iter_layers(f, max_vertices=4, chunk_size=16))
+        self.assertEqual([len(layer) for layer in layers], [4, 4, 2])
+        self.assertEqual(layers[-1].properties[-1], {"n": 9})
+
+class StreamedMapTests(unittest.TestCase):
+
+    def test_streamed_map_matches_loaded(self):
+        outputs = []
+        for streamed in (False, True):
+            sheet = MapSheet(None, style=".land { fill: black; }")
+            sheet.add_geojson_file("tests/vancouver_island.geojson",
+                                   stream=streamed, class_name="land")
+            outputs.append(sheet.serialize())
+        self.assertEqual(outputs[0], outputs[1])
+
+    def test_streamed_geojson_seq(self):
+        fd, path = tempfile.mkstemp(suffix=".geojsonl")
+        try:
+            with os.fdopen(fd, "w") as f:
+                for i in range(10):
+                    f.write(json.dumps(point_feature(i)) + "\n")
+            sheet = MapSheet(None, bbox=(-5, -10, 20, 5))
+            sheet.add_geojson_file(path, stream=True)
+            self.assertEqual(sheet.serialize().count("<path"), 10)
+        finally:
+            os.remove(path)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,7 @@
 import unittest
+import numpy as np
 from worldly import svg
-from util import xml_equal
+from util import xml_equal, decode_path
 
 class SVGOutputTests(unittest.TestCase):
 
@@ -8,6 +9,22 @@ class SVGOutputTests(unittest.TestCase):
         svg_circle = svg.SVGCircle((1, 3), 5)
         self.assertTrue(xml_equal('<circle cx="1" cy="3" r="5" />', str(svg_circle)))
 
+    def test_circle_integer_precision(self):
+        svg_circle = svg.SVGCircle((1.4, 2.6), 5.0, precision=0)
+        self.assertTrue(xml_equal('<circle cx="1" cy="3" r="5" />', str(svg_circle)))
+
+    def test_circle_trailing_zeros(self):
+        svg_circle = svg.SVGCircle((1.5, -0.001), 3.10, precision=2)
+        self.assertEqual(svg_circle.svg().attrib,
+                         {"cx": "1.5", "cy": "0", "r": "3.1"})
+
+    def test_use(self):
+        svg_use = svg.SVGUse("#marker", (1.25, -3.0), precision=1,
+                             class_name="quake")
+        self.assertEqual(svg_use.svg().attrib,
+                         {"href": "#marker", "xlink:href": "#marker",
+                          "x": "1.2", "y": "-3", "class": "quake"})
+
     def test_polygon(self):
         svg_poly = svg.SVGPolygon([(0, 0), (1, 0), (1, 1), (0, 1)])
         self.assertTrue(xml_equal('<polygon points="0,0 1,0 1,1 0,1" />', str(svg_poly)))
@@ -30,5 +47,126 @@ class SVGOutputTests(unittest.TestCase):
         svg_path = svg.SVGPath([[(0, 0), (1, 0), (1, 1), (0, 1)]], closed=True)
         self.assertTrue(xml_equal('<path d="M0,0 L1,0 L1,1 L0,1 Z" />', str(svg_path)))
 
+    def test_path_precision(self):
+        vertices = [[(0.123456, -1.5), (2.0, 3.96), (-0.0004, 10)]]
+        for precision, d in ((0, "M0,-2 L2,4 L0,10"),
+                             (1, "M0.1,-1.5 L2,4 L0,10"),
+                             (3, "M0.123,-1.5 L2,3.96 L0,10")):
+            svg_path = svg.SVGPath(vertices, precision=precision)
+            self.assertEqual(svg_path.svg().attrib["d"], d)
+
+    def test_format_coordinates_array(self):
+        xy = np.array([[1.25, -3.0], [1e6 + 0.5, 2.375]])
+        self.assertEqual(svg.format_coordinates(xy, 2),
+                         "1.25,-3 1000000.5,2.38")
+
+    def test_path_data_cached(self):
+        svg_path = svg.SVGPath([[(0, 0), (1, 0)]])
+        self.assertEqual(svg_path.svg().attrib["d"], "M0,0 L1,0")
+        with self.assertRaises(AttributeError):
+            svg_path.vertices[0].append((1, 1))
+        svg_path.vertices = [[(0, 0), (1, 0), (1, 1)]]
+        self.assertEqual(svg_path.svg().attrib["d"], "M0,0 L1,0 L1,1")
+        svg_path.closed = True
+        self.assertEqual(svg_path.svg().attrib["d"], "M0,0 L1,0 L1,1 Z")
+
+    def test_path_vertices_read_only(self):
+        ring = np.array([[0.0, 0.0], [1.0, 0.0]])
+        svg_path = svg.SVGPath([ring])
+        self.assertEqual(svg_path.svg().attrib["d"], "M0,0 L1,0")
+        with self.assertRaises(ValueError):
+            svg_path.vertices[0][1] = (2.0, 0.0)
+        ring[1] = (2.0, 0.0)    # the caller's array is still writeable
+        svg_path.vertices = [ring]
+        self.assertEqual(svg_path.svg().attrib["d"], "M0,0 L2,0")
+
+    def test_open_close_tags(self):
+        node = svg.SVGNode("g", transform="scale(2,2)")
+        self.assertEqual(node.open_tag(), '<g transform="scale(2,2)">')
+        self.assertEqual(node.close_tag(), '</g>')
+
+    def test_compact_path(self):
+        svg_path = svg.SVGPath([[(0, 0), (10, 0), (10, 10), (4.6, 13.2)],
+                                [(20, 20), (20, 25)]], compact=True,
+                               precision=0)
+        self.assertEqual(svg_path.svg().attrib["d"], "M0 0h10v10l-5 3m15 7v5")
+
+    def test_compact_closed_path(self):
+        svg_path = svg.SVGPath([[(5, 5), (8, 5), (8, 8), (5, 5)],
+                                [(6, 6), (7, 6), (7, 7), (6, 6)]],
+                               closed=True, compact=True, precision=0)
+        self.assertEqual(svg_path.svg().attrib["d"],
+                         "M5 5h3v3l-3-3zm1 1h1v1l-1-1z")
+
+    def test_compact_path_round_trip(self):
+        vertices = [[(0, -1), (1, -1), (1, 0), (0, 0), (-12, 7), (-12, 7)],
+                    [(0, 0), (1, 0), (1, 1), (0, 1)],
+                    [(-30, 40)],
+                    [(100, -100), (-100, 100)]]
+        for closed in (False, True):
+            absolute = svg.SVGPath(vertices, closed=closed).svg().attrib["d"]
+            compact = svg.SVGPath(vertices, closed=closed,
+                                  compact=True).svg().attrib["d"]
+            expected = decode_path(absolute)
+            # the repeated last vertex of the first linestring is dropped
+            del expected[0][5]
+            self.assertEqual(decode_path(compact), expected)
+
+    def test_compact_path_precision(self):
+        svg_path = svg.SVGPath([[(0.5, 0.25), (1.04, 0.25), (2.5, 0.26),
+                                 (2.5, 1.75), (1.25, 1.751)]],
+                               compact=True, precision=1)
+        self.assertEqual(svg_path.svg().attrib["d"], "M.5.2h.5l1.5.1v1.5h-1.3")
+        decoded = decode_path(svg_path.svg().attrib["d"])
+        expected = [(0.5, 0.2), (1.0, 0.2), (2.5, 0.3), (2.5, 1.8), (1.2, 1.8)]
+        self.assertEqual(len(decoded[0]), len(expected))
+        for (x1, y1), (x2, y2) in zip(decoded[0], expected):
+            self.assertAlmostEqual(x1, x2)
+            self.assertAlmostEqual(y1, y2)
+
+    def test_compact_path_merges_segments(self):
+        svg_path = svg.SVGPath([[(0, 0), (1, 0), (1, 0), (3, 0), (2, 0),
+                                 (2, 1), (2, 4)]], compact=True, precision=0)
+        self.assertEqual(svg_path.svg().attrib["d"], "M0 0h3-1v4")
+
+    def test_compact_path_merged_separators(self):
+        self.assertEqual(svg.compact_path_data(
+            [[(0, 0), (-1.5, 0), (-1, 0), (-0.5, 0)]], precision=1),
+            "M0 0h-1.5 1")
+        self.assertEqual(svg.compact_path_data(
+            [[(0, 0), (0, -1.5), (0, -1), (0, -0.5), (0, 0.5)]], precision=1),
+            "M0 0v-1.5 2")
+
+    def test_compact_path_random_walks(self):
+        rng = np.random.RandomState(12)
+        for _ in range(500):
+            precision = rng.randint(0, 3)
+            steps = rng.choice([-1.5, -0.5, 0.0, 0.5, 1.5], (20, 2))
+            # most steps follow an axis
+            steps[rng.rand(20) < 0.4, 0] = 0.0
+            steps[rng.rand(20) < 0.4, 1] = 0.0
+            walk = np.cumsum(steps * rng.uniform(0.1, 3.0), axis=0)
+            d = svg.compact_path_data([walk], precision=precision)
+            decoded = [(round(x, precision), round(y, precision))
+                       for x, y in decode_path(d)[0]]
+            self.assertEqual(decoded, _compact_vertices(walk, precision))
+
+def _compact_vertices(xy, precision):
+    """ The vertices that compact path data keeps: those rounded to
+    *precision* that neither repeat nor continue an axis-aligned segment in
+    the same direction """
+    points = []
+    for x, y in np.round(xy, precision).tolist():
+        if len(points) != 0 and (x, y) == points[-1]:
+            continue
+        if len(points) >= 2:
+            (x0, y0), (x1, y1) = points[-2:]
+            if (y0 == y1 == y and (x1 - x0) * (x - x1) > 0) or \
+                    (x0 == x1 == x and (y1 - y0) * (y - y1) > 0):
+                points[-1] = (x, y)
+                continue
+        points.append((x, y))
+    return [(round(x, precision), round(y, precision)) for x, y in points]
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+import os
+import shutil
+import tempfile
+from worldly import tiles
+from worldly.cache import ProjectionCache
+from worldly.mapsheet import MapSheet
+from worldly.projection import WebMercator
+from util import CountingMercator
+
+class TileGeometryTests(unittest.TestCase):
+
+    def test_world_tile(self):
+        x0, y0, x1, y1 = tiles.tile_bounds(0, 0, 0)
+        self.assertEqual((x0, y0), (0, 0))
+        self.assertAlmostEqual(x1, 2*WebMercator.R)
+        self.assertAlmostEqual(y1, 2*WebMercator.R)
+        lon_w, lat_s, lon_e, lat_n = tiles.tile_bbox(0, 0, 0)
+        self.assertAlmostEqual(lon_w, -180)
+        self.assertAlmostEqual(lon_e, 180)
+        self.assertAlmostEqual(lat_n, 85.0511287798)
+        self.assertAlmostEqual(lat_s, -85.0511287798)
+
+    def test_tile_bbox_quadrant(self):
+        lon_w, lat_s, lon_e, lat_n = tiles.tile_bbox(1, 0, 0)
+        self.assertAlmostEqual(lon_w, -180)
+        self.assertAlmostEqual(lon_e, 0)
+        self.assertAlmostEqual(lat_s, 0)
+
+    def test_tile_range(self):
+        bounds = tiles.tile_bounds(3, 2, 5)
+        xs, ys = tiles.tile_range(3, bounds)
+        self.assertEqual(list(xs), [2, 3])
+        self.assertEqual(list(ys), [5, 6])
+
+class RenderTilesTests(unittest.TestCase):
+
+    def setUp(self):
+        self.out_dir = tempfile.mkdtemp()
+        self.sheet = MapSheet(None, style=".land { fill: black; }")
+        self.sheet.add_geojson_file("tests/vancouver_island.geojson",
+                                    class_name="land")
+
+    def tearDown(self):
+        shutil.rmtree(self.out_dir)
+
+    def _written(self):
+        paths = []
+        for dirpath, _, filenames in os.walk(self.out_dir):
+            for fnm in filenames:
+                paths.append(os.path.relpath(os.path.join(dirpath, fnm),
+                                             self.out_dir))
+        return sorted(paths)
+
+    def test_render_tiles(self):
+        written = self.sheet.render_tiles((0, 6), self.out_dir)
+        self.assertTrue((0, 0, 0) in written)
+        self.assertTrue((6, 9, 21) in written)
+        self.assertTrue(len([t for t in written if t[0] == 6]) <= 4)
+        self.assertEqual(self._written(),
+                         sorted(os.path.join(str(z), str(x), "{}.svg".format(y))
+                                for z, x, y in written))
+        with open(os.path.join(self.out_dir, "6", "9", "21.svg")) as f:
+            s = f.read()
+        self.assertTrue(s.startswith('<svg height="256" width="256"') or
+                        s.startswith('<svg width="256" height="256"'))
+        self.assertTrue('class="land"' in s)
+
+    def test_render_tiles_reaching_pole(self):
+        sheet = MapSheet(None)
+        sheet.add_geojson('{"type": "Polygon", "coordinates": [[[-180, -90], '
+                          '[180, -90], [180, -70], [-180, -70], [-180, -90]]]}',
+                          class_name="antarctica")
+        written = sheet.render_tiles((0, 1), self.out_dir)
+        self.assertEqual(written, [(0, 0, 0), (1, 0, 1), (1, 1, 1)])
+        with open(os.path.join(self.out_dir, "1", "0", "1.svg")) as f:
+            self.assertTrue('class="antarctica"' in f.read())
+
+    def test_render_tiles_projects_once(self):
+        projection = CountingMercator()
+        # the cache is too small to keep the layer
+        self.sheet.cache = ProjectionCache(max_bytes=100)
+        written = self.sheet.render_tiles((4, 6), self.out_dir,
+                                          projection=projection, processes=2)
+        self.assertTrue(len(written) > 1)
+        self.assertEqual(projection.count, 1)
+
+    def test_render_tiles_in_processes(self):
+        serial = self.sheet.render_tiles((4, 6), self.out_dir)
+        contents = {}
+        for path in self._written():
+            with open(os.path.join(self.out_dir, path)) as f:
+                contents[path] = f.read()
+        shutil.rmtree(self.out_dir)
+        parallel = self.sheet.render_tiles((4, 6), self.out_dir, processes=2)
+        self.assertEqual(serial, parallel)
+        for path in self._written():
+            with open(os.path.join(self.out_dir, path)) as f:
+                self.assertEqual(f.read(), contents[path])
+
+if __name__ == "__main__":
+    unittest.main()
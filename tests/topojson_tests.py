@@ -0,0 +1,106 @@
+import unittest
+import json
+import numpy as np
+from worldly.topojson import Topology
+from worldly.layer import POLYGON, MULTILINESTRING, POINT
+from worldly.mapsheet import MapSheet
+
+# two unit squares sharing the edge x=1, quantized with a scale of 0.5
+TOPOLOGY = {
+    "type": "Topology",
+    "transform": {"scale": [0.5, 0.5], "translate": [-10, 40]},
+    "arcs": [[[2, 0], [0, 2]],
+             [[2, 2], [-2, 0], [0, -2], [2, 0]],
+             [[2, 0], [2, 0], [0, 2], [-2, 0]]],
+    "objects": {
+        "squares": {"type": "GeometryCollection",
+                    "geometries": [
+                        {"type": "Polygon", "arcs": [[0, 1]], "id": "a",
+                         "properties": {"name": "A"}},
+                        {"type": "Polygon", "arcs": [[~0, 2]],
+                         "properties": {"name": "B"}}]},
+        "marker": {"type": "Point", "coordinates": [4, 4]}}}
+
+def lonlat(qx, qy):
+    return (qx*0.5 - 10, qy*0.5 + 40)
+
+class TopologyTests(unittest.TestCase):
+
+    def setUp(self):
+        self.topology = Topology(TOPOLOGY)
+
+    def test_decode_arcs(self):
+        self.assertEqual(len(self.topology), 3)
+        self.assertEqual(self.topology.arc_offsets.tolist(), [0, 2, 6, 10])
+        expected = [lonlat(*xy) for xy in [(2, 0), (2, 2),
+                                           (2, 2), (0, 2), (0, 0), (2, 0),
+                                           (2, 0), (4, 0), (4, 2), (2, 2)]]
+        self.assertTrue(np.allclose(self.topology.coords, expected))
+
+    def test_polygon_layer(self):
+        layer = self.topology.layer("squares")
+        self.assertEqual(len(layer), 2)
+        self.assertEqual(layer.geom_types.tolist(), [POLYGON, POLYGON])
+        self.assertEqual(layer.properties, [{"id": "a", "name": "A"},
+                                            {"name": "B"}])
+        rings = layer.geometry_rings(1)
+        self.assertEqual(len(rings), 1)
+        ring = layer.coords[rings[0][0]:rings[0][1]]
+        expected = [lonlat(*xy) for xy in [(2, 2), (2, 0), (4, 0), (4, 2),
+                                           (2, 2)]]
+        self.assertTrue(np.allclose(ring, expected))
+
+    def test_point_layer(self):
+        layer = self.topology.layer("marker")
+        self.assertEqual(layer.geom_types.tolist(), [POINT])
+        self.assertTrue(np.allclose(layer.coords, [lonlat(4, 4)]))
+
+    def test_arcs_projected_once(self):
+        calls = []
+        def projection(lon, lat):
+            calls.append((lon, lat))
+            return lon, lat
+
+        polygons = self.topology.layer("squares")
+        mesh = self.topology.layer("squares", mesh=True)
+        self.assertTrue(np.allclose(polygons.projected(projection),
+                                    polygons.coords))
+        self.assertTrue(np.allclose(mesh.projected(projection), mesh.coords))
+        self.assertEqual(len(calls), 10)
+
+    def test_mesh(self):
+        mesh = self.topology.layer("squares", mesh=True)
+        self.assertEqual(len(mesh), 1)
+        self.assertEqual(mesh.geom_types.tolist(), [MULTILINESTRING])
+        self.assertEqual(len(mesh.geometry_parts(0)), 3)
+        self.assertEqual(mesh.nvertices, 10)
+
+        interior = self.topology.layer("squares", mesh="interior")
+        self.assertTrue(np.allclose(interior.coords,
+                                    [lonlat(2, 0), lonlat(2, 2)]))
+        exterior = self.topology.layer("squares", mesh="exterior")
+        self.assertEqual(len(exterior.geometry_parts(0)), 2)
+
+    def test_unquantized(self):
+        topology = Topology({"type": "Topology",
+                             "arcs": [[[0.5, 1.5], [2.5, 3.5]]],
+                             "objects": {"line": {"type": "LineString",
+                                                  "arcs": [~0]}}})
+        layer = topology.layer("line")
+        self.assertTrue(np.allclose(layer.coords, [[2.5, 3.5], [0.5, 1.5]]))
+
+class TopoJSONMapTests(unittest.TestCase):
+
+    def test_add_topojson(self):
+        sheet = MapSheet(None, bbox=(-10, 39.5, -7.5, 42.5))
+        sheet.add_topojson(json.dumps(TOPOLOGY), objects=["squares"],
+                           class_name="county", dynamic_params={"id": "name"})
+        sheet.add_topojson(json.dumps(TOPOLOGY), objects=["squares"],
+                           mesh="interior", class_name="border")
+        s = sheet.serialize()
+        self.assertEqual(s.count('class="county"'), 2)
+        self.assertEqual(s.count('class="border"'), 1)
+        self.assertTrue('id="B"' in s)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,7 @@
+import multiprocessing
+import re
 import xml.etree.ElementTree as ET
+from worldly.projection import SphericalMercator, WebMercator
 
 def _xml_element_equal(el1, el2):
     if el1.tag != el2.tag:
@@ -20,3 +23,59 @@ def xml_equal(str1, str2):
     return _xml_element_equal(et1, et2)
 
 
+
+_PATH_TOKEN = re.compile(r"[MmLlHhVvZz]|-?[0-9]*\.?[0-9]+(?:e-?[0-9]+)?")
+
+def decode_path(d):
+    """ Decode path data written with M, L, H, V, Z and their relative forms
+    into a list of subpaths of absolute (x, y) vertices """
+    subpaths = []
+    x = y = x0 = y0 = 0.0
+    command = None
+    tokens = _PATH_TOKEN.findall(d)
+    i = 0
+    while i < len(tokens):
+        if tokens[i] in "MmLlHhVvZz":
+            command = tokens[i]
+            i += 1
+            if command in "Zz":
+                x, y = x0, y0
+                continue
+        nargs = 1 if command in "HhVv" else 2
+        args = [float(t) for t in tokens[i:i+nargs]]
+        i += nargs
+        relative = command.islower()
+        if command in "Mm":
+            x = args[0] + (x if relative else 0)
+            y = args[1] + (y if relative else 0)
+            x0, y0 = x, y
+            subpaths.append([(x, y)])
+            # further pairs after a move are lines
+            command = "l" if relative else "L"
+            continue
+        elif command in "Ll":
+            x = args[0] + (x if relative else 0)
+            y = args[1] + (y if relative else 0)
+        elif command in "Hh":
+            x = args[0] + (x if relative else 0)
+        else:
+            y = args[0] + (y if relative else 0)
+        subpaths[-1].append((x, y))
+    return subpaths
+
+class CountingMercator(SphericalMercator):
+    """ Web Mercator that counts the arrays it projects, including those
+    projected by forked worker processes """
+
+    def __init__(self):
+        super(CountingMercator, self).__init__(WebMercator.R)
+        self._count = multiprocessing.get_context("fork").Value("i", 0)
+
+    @property
+    def count(self):
+        return self._count.value
+
+    def project_array(self, lons, lats):
+        with self._count.get_lock():
+            self._count.value += 1
+        return super(CountingMercator, self).project_array(lons, lats)
@@ -3,6 +3,18 @@
 from . import svg
 from . import mapsheet
 from . import projection
+from . import layer
+from . import clip
+from . import simplify
+from . import cache
+from . import index
+from . import tiles
+from . import stream
+from . import topojson
+from . import stats
+from . import prepared
+from . import layerfile
 
 from .mapsheet import MapSheet
+from .cache import ProjectionCache
 
@@ -0,0 +1,76 @@
+""" Caching of projected layer coordinates """
+
+from collections import OrderedDict
+import threading
+
+
+class ProjectionCache(object):
+    """ A bounded least-recently-used cache of projected Layer coordinates.
+
+    Entries are keyed by the identity of the Layer and of the projection, so a
+    cache may be shared by any number of MapSheets drawing the same layers in
+    the same projection. The cache holds references to the layers and
+    projections that it stores.
+
+    max_bytes : int or None
+        upper limit on the size of the cached coordinate arrays. Arrays larger
+        than the limit are never stored. If None, the cache is unbounded.
+    """
+
+    def __init__(self, max_bytes=256*1024*1024):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return ("<ProjectionCache entries={} nbytes={} hits={} misses={} "
+                "evictions={}>".format(len(self), self.nbytes, self.hits,
+                                       self.misses, self.evictions))
+
+    def projected(self, layer, projection):
+        """ Return the read-only (n, 2) array of *layer* coordinates projected
+        by *projection*, computing it if necessary """
+        key = (id(layer), id(projection))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        coords = layer.projected(projection)
+        coords.setflags(write=False)
+        self.add(layer, projection, coords)
+        return coords
+
+    def add(self, layer, projection, coords):
+        """ Store *coords*, the read-only coordinates of *layer* projected by
+        *projection*, unless they are already cached or exceed *max_bytes*
+        """
+        key = (id(layer), id(projection))
+        with self._lock:
+            if key not in self._entries and (self.max_bytes is None or
+                                             coords.nbytes <= self.max_bytes):
+                self._entries[key] = (layer, projection, coords)
+                self.nbytes += coords.nbytes
+                self._evict()
+
+    def clear(self):
+        """ Remove all entries """
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def _evict(self):
+        while self.max_bytes is not None and self.nbytes > self.max_bytes:
+            _, (_, _, coords) = self._entries.popitem(last=False)
+            self.nbytes -= coords.nbytes
+            self.evictions += 1
@@ -0,0 +1,476 @@
+""" Batch rendering of map sheets described by a manifest
+
+A manifest is a JSON or YAML document listing the map sheets to draw:
+
+    {"defaults": {"width": 700, "height": 700,
+                  "projection": "SouthPolarStereographic",
+                  "style_file": "antarctica.css"},
+     "sheets": [{"output": "out/antarctica.svg",
+                 "bbox": [-135, -50, 45, -50],
+                 "layers": [{"file": "antarctica.geojson",
+                             "class_name": "ice"},
+                            {"file": "ice_shelves.geojson",
+                             "class_name": "shelf"}]}]}
+
+Each sheet takes the keys of *defaults* that it does not set itself. Sheet
+keys are the MapSheet arguments in SHEET_KEYS, plus *output* (required),
+*name*, *style_file* and *layers*. The projection is the name of a
+projection in worldly.projection. Each layer has a *file*, which is a
+GeoJSON file, a TopoJSON file (with optional *objects* and *mesh*) or a
+layer file written by worldly.layerfile, chosen by its extension or by
+*format*. The remaining layer keys are the layer parameters in LAYER_KEYS.
+Relative paths are taken from the directory of the manifest.
+
+Sheets are rendered by a pool of worker processes that persists for the
+whole run. Layers are loaded once per worker and kept, along with their
+projected coordinates and spatial indexes, for every later sheet that uses
+them. Where processes are forked, the layers are loaded and projected in the
+parent before the pool starts, so workers share them from the start.
+
+Run it as "worldly manifest.json" or "python -m worldly manifest.json".
+"""
+
+import argparse
+from collections import OrderedDict
+import json
+import multiprocessing
+import os
+import sys
+import traceback
+import picogeojson
+from . import projection as _projection
+from .cache import ProjectionCache
+from .layer import Layer
+from .layerfile import load_layer
+from .mapsheet import MapSheet
+from .stats import clock
+from .topojson import Topology
+from .workers import fork_context
+
+SHEET_KEYS = ("width", "height", "style", "projection", "bbox", "scale",
+              "center", "clip", "clip_margin", "simplify", "tolerance",
+              "min_area", "compact", "compress", "lod")
+
+LAYER_KEYS = ("class_name", "id_name", "static_params", "dynamic_params",
+              "symbol", "symbol_size", "batch", "max_batch_vertices")
+
+FORMATS = {".geojson": "geojson", ".json": "geojson",
+           ".topojson": "topojson", ".layer": "layerfile"}
+
+
+class ManifestError(ValueError):
+    """ Raised for manifests that cannot be read or that describe invalid
+    sheets """
+    pass
+
+
+class JobResult(object):
+    """ The outcome of rendering one sheet.
+
+    index : int
+        position of the sheet in the manifest
+
+    name : str
+        the sheet *name*, or its output path
+
+    output : str
+        path of the document
+
+    seconds : float
+        wall time spent on the sheet by the worker
+
+    load_seconds : float
+        part of *seconds* spent loading layers that the worker did not
+        already hold
+
+    output_bytes : int
+        size of the document written
+
+    stages : dict
+        seconds spent in each stage of serialization (see
+        worldly.stats.RenderStats)
+
+    error : str or None
+        traceback of the exception raised while rendering, if it failed
+    """
+
+    def __init__(self, index, name, output, seconds=0.0, load_seconds=0.0,
+                 output_bytes=0, stages=None, error=None):
+        self.index = index
+        self.name = name
+        self.output = output
+        self.seconds = seconds
+        self.load_seconds = load_seconds
+        self.output_bytes = output_bytes
+        if stages is None:
+            stages = {}
+        self.stages = stages
+        self.error = error
+
+    def __repr__(self):
+        return "<JobResult {} {} {:.6f}s>".format(
+            self.name, "ok" if self.ok else "failed", self.seconds)
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def as_dict(self):
+        """ Return the result as a dictionary of built-in types, suitable for
+        JSON encoding """
+        return {"index": self.index,
+                "name": self.name,
+                "output": self.output,
+                "ok": self.ok,
+                "seconds": self.seconds,
+                "load_seconds": self.load_seconds,
+                "output_bytes": self.output_bytes,
+                "stages": self.stages,
+                "error": self.error}
+
+
+class LayerStore(object):
+    """ Layers loaded by a worker, kept between jobs.
+
+    Layers are keyed by their source, so every sheet drawing a file draws
+    the same Layer objects, and *cache* holds their projected coordinates
+    for every projection used. At most *max_sources* sources are kept, the
+    least recently used being dropped first.
+    """
+
+    def __init__(self, max_sources=64, cache=None):
+        self.max_sources = max_sources
+        if cache is None:
+            cache = ProjectionCache()
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+        self._layers = OrderedDict()
+
+    def __len__(self):
+        return len(self._layers)
+
+    def __repr__(self):
+        return "<LayerStore sources={} hits={} misses={}>".format(
+            len(self), self.hits, self.misses)
+
+    def layers(self, source):
+        """ Return the list of Layers read from *source*, a tuple (path,
+        format, objects, mesh) as built by parse_manifest """
+        layers = self._layers.get(source)
+        if layers is not None:
+            self.hits += 1
+            self._layers.move_to_end(source)
+            return layers
+        self.misses += 1
+        layers = _read_source(*source)
+        self._layers[source] = layers
+        if self.max_sources is not None:
+            while len(self._layers) > self.max_sources:
+                self._layers.popitem(last=False)
+        return layers
+
+    def warm(self, jobs):
+        """ Load the layers of *jobs* and project them, with their spatial
+        indexes, into the projection of each job that draws them. Sources
+        that cannot be read are skipped, and fail in the jobs using them. """
+        for job in jobs:
+            proj = _resolve_projection(job["sheet"].get("projection"))
+            for spec in job["layers"]:
+                try:
+                    layers = self.layers(spec["source"])
+                except Exception:
+                    continue
+                for layer in layers:
+                    layer.spatial_index(proj, self.cache.projected(layer, proj))
+
+
+def load_manifest(filename):
+    """ Read the manifest *filename*, as YAML if its extension is .yaml or
+    .yml (which requires PyYAML) and as JSON otherwise, and return the list
+    of jobs built by parse_manifest """
+    path = os.fspath(filename)
+    with open(path) as f:
+        text = f.read()
+    if os.path.splitext(path)[1].lower() in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError:
+            raise ManifestError("reading YAML manifests requires PyYAML")
+        try:
+            manifest = yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise ManifestError("{}: {}".format(path, e))
+    else:
+        try:
+            manifest = json.loads(text)
+        except ValueError as e:
+            raise ManifestError("{}: {}".format(path, e))
+    return parse_manifest(manifest, os.path.dirname(os.path.abspath(path)))
+
+
+def parse_manifest(manifest, base_dir="."):
+    """ Validate a manifest, given as a dict, and return a list of jobs, one
+    per sheet. Jobs are plain dicts, with defaults applied and paths made
+    absolute against *base_dir*, so they can be sent to worker processes.
+    Raises ManifestError for invalid sheets. """
+    if not isinstance(manifest, dict) or \
+            not isinstance(manifest.get("sheets"), list):
+        raise ManifestError("a manifest must have a list of sheets")
+    defaults = manifest.get("defaults", {})
+    if not isinstance(defaults, dict):
+        raise ManifestError("manifest defaults must be a mapping")
+    unknown = set(manifest) - set(["defaults", "sheets"])
+    if len(unknown) != 0:
+        raise ManifestError("unknown manifest keys: {}".format(
+            ", ".join(sorted(unknown))))
+
+    jobs = []
+    for index, entry in enumerate(manifest["sheets"]):
+        if not isinstance(entry, dict):
+            raise ManifestError("sheet {} is not a mapping".format(index))
+        merged = dict(defaults)
+        merged.update(entry)
+        try:
+            jobs.append(_parse_sheet(index, merged, base_dir))
+        except ManifestError as e:
+            raise ManifestError("sheet {}: {}".format(index, e))
+    return jobs
+
+
+def _parse_sheet(index, entry, base_dir):
+    unknown = set(entry) - set(SHEET_KEYS) - \
+        set(["output", "name", "style_file", "layers"])
+    if len(unknown) != 0:
+        raise ManifestError("unknown keys: {}".format(
+            ", ".join(sorted(unknown))))
+    if "output" not in entry:
+        raise ManifestError("no output path")
+    output = os.path.join(base_dir, entry["output"])
+
+    sheet = dict((k, entry[k]) for k in SHEET_KEYS if k in entry)
+    for k in ("bbox", "center"):
+        if sheet.get(k) is not None:
+            sheet[k] = tuple(sheet[k])
+    if "projection" in sheet:
+        _resolve_projection(sheet["projection"])
+    style_file = entry.get("style_file")
+    if style_file is not None:
+        if "style" in entry:
+            raise ManifestError("both style and style_file are given")
+        style_file = os.path.join(base_dir, style_file)
+
+    layers = []
+    for spec in entry.get("layers", []):
+        if not isinstance(spec, dict) or "file" not in spec:
+            raise ManifestError("each layer needs a file")
+        unknown = set(spec) - set(LAYER_KEYS) - \
+            set(["file", "format", "objects", "mesh"])
+        if len(unknown) != 0:
+            raise ManifestError("unknown layer keys: {}".format(
+                ", ".join(sorted(unknown))))
+        path = os.path.join(base_dir, spec["file"])
+        fmt = spec.get("format")
+        if fmt is None:
+            fmt = FORMATS.get(os.path.splitext(path)[1].lower())
+        if fmt not in ("geojson", "topojson", "layerfile"):
+            raise ManifestError("unknown format of layer {}".format(
+                spec["file"]))
+        objects = spec.get("objects")
+        if objects is not None:
+            objects = tuple(objects)
+        source = (path, fmt, objects, spec.get("mesh", False))
+        params = dict((k, spec[k]) for k in LAYER_KEYS if k in spec)
+        layers.append({"source": source, "params": params})
+
+    return {"index": index,
+            "name": entry.get("name", entry["output"]),
+            "output": output,
+            "sheet": sheet,
+            "style_file": style_file,
+            "layers": layers}
+
+
+def _resolve_projection(name):
+    if name is None:
+        return _projection.WebMercator
+    proj = getattr(_projection, name, None) if isinstance(name, str) else None
+    if not isinstance(proj, _projection.Projection):
+        names = sorted(k for k, v in vars(_projection).items()
+                       if isinstance(v, _projection.Projection))
+        raise ManifestError("unknown projection '{}' (choose from {})".format(
+            name, ", ".join(names)))
+    return proj
+
+
+def _read_source(path, fmt, objects, mesh):
+    if fmt == "layerfile":
+        return [load_layer(path)]
+    with open(path) as f:
+        text = f.read()
+    if fmt == "topojson":
+        topology = Topology.fromstring(text)
+        if objects is None:
+            objects = list(topology.objects)
+        return [topology.layer(name, mesh=mesh) for name in objects]
+    return [Layer.from_geojson(picogeojson.fromstring(text))]
+
+
+def render_job(job, store):
+    """ Render the sheet of *job* with layers from the LayerStore *store*,
+    and return a JobResult. Exceptions are caught and recorded in the
+    result. The document is written to a temporary file and renamed, so a
+    failed job leaves no partial output. """
+    result = JobResult(job["index"], job["name"], job["output"])
+    tmp = None
+    t0 = clock()
+    try:
+        kw = dict(job["sheet"])
+        kw["projection"] = _resolve_projection(kw.get("projection"))
+        if job["style_file"] is not None:
+            with open(job["style_file"]) as f:
+                kw["style"] = f.read()
+        if kw.get("compress") is None:
+            kw["compress"] = job["output"].endswith(".svgz")
+        stages = {}
+        sheet = MapSheet(None, cache=store.cache,
+                         stats_callback=lambda s: stages.update(s.stages),
+                         **kw)
+
+        for spec in job["layers"]:
+            t, misses = clock(), store.misses
+            layers = store.layers(spec["source"])
+            if store.misses != misses:
+                result.load_seconds += clock() - t
+            for layer in layers:
+                sheet.add_layer(layer, **spec["params"])
+
+        dirname = os.path.dirname(job["output"])
+        os.makedirs(dirname, exist_ok=True)
+        tmp = os.path.join(dirname, ".{}.{}.tmp".format(
+            os.path.basename(job["output"]), os.getpid()))
+        sheet.save(tmp)
+        os.replace(tmp, job["output"])
+        tmp = None
+        result.output_bytes = os.path.getsize(job["output"])
+        result.stages = stages
+    except Exception:
+        result.error = traceback.format_exc()
+        if tmp is not None and os.path.exists(tmp):
+            os.remove(tmp)
+    result.seconds = clock() - t0
+    return result
+
+
+# layers kept by a worker process between jobs, shared with forked workers
+# when warmed by the parent (see fork_context)
+_store = None
+
+
+def _init_worker(max_sources):
+    global _store
+    if _store is None:
+        _store = LayerStore(max_sources)
+    else:
+        _store.max_sources = max_sources
+
+
+def _render_in_worker(job):
+    return render_job(job, _store)
+
+
+def render_jobs(jobs, processes=None, max_sources=64, warm=True):
+    """ Render *jobs*, as returned by load_manifest, and yield a JobResult
+    for each as it completes.
+
+    processes : int
+        number of worker processes. If None, the number of CPUs is used, and
+        if 1, jobs are rendered in this process.
+
+    max_sources : int
+        number of layer sources each worker keeps loaded
+
+    warm : bool
+        if True and worker processes are forked, every layer is loaded and
+        projected before the pool starts, so that workers share them
+    """
+    global _store
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if processes <= 1 or len(jobs) <= 1:
+        store = LayerStore(max_sources)
+        for job in jobs:
+            yield render_job(job, store)
+        return
+
+    try:
+        ctx = fork_context()
+        if ctx is None:
+            ctx = multiprocessing.get_context()
+        elif warm:
+            _store = LayerStore(None)
+            _store.warm(jobs)
+        chunksize = max(1, min(16, len(jobs) // (4 * processes)))
+        with ctx.Pool(processes, initializer=_init_worker,
+                      initargs=(max_sources,)) as pool:
+            for result in pool.imap_unordered(_render_in_worker, jobs,
+                                              chunksize):
+                yield result
+    finally:
+        _store = None
+
+
+def main(argv=None):
+    """ Entry point of the worldly command """
+    parser = argparse.ArgumentParser(
+        prog="worldly",
+        description="Render the map sheets listed in a JSON or YAML manifest")
+    parser.add_argument("manifest", help="path of the manifest")
+    parser.add_argument("-j", "--processes", type=int, default=None,
+                        help="number of worker processes (default: number "
+                             "of CPUs)")
+    parser.add_argument("--report", default=None,
+                        help="write per-sheet timings and errors to this "
+                             "JSON file")
+    parser.add_argument("--max-sources", type=int, default=64,
+                        help="layer files each worker keeps loaded")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="only report failures and the summary")
+    args = parser.parse_args(argv)
+
+    try:
+        jobs = load_manifest(args.manifest)
+    except (IOError, ManifestError) as e:
+        print("worldly: {}".format(e), file=sys.stderr)
+        return 2
+
+    t0 = clock()
+    results = []
+    for result in render_jobs(jobs, processes=args.processes,
+                              max_sources=args.max_sources):
+        results.append(result)
+        if not result.ok:
+            print("FAIL {:9.3f}s  {}\n{}".format(
+                result.seconds, result.name, result.error.rstrip()),
+                file=sys.stderr)
+        elif not args.quiet:
+            print("ok   {:9.3f}s  {}".format(result.seconds, result.name))
+    elapsed = clock() - t0
+
+    results.sort(key=lambda r: r.index)
+    failed = [r for r in results if not r.ok]
+    summary = {"sheets": len(results),
+               "failed": len(failed),
+               "seconds": elapsed,
+               "job_seconds": sum(r.seconds for r in results),
+               "load_seconds": sum(r.load_seconds for r in results),
+               "output_bytes": sum(r.output_bytes for r in results)}
+    print("{} sheets, {} failed, {:.3f}s ({:.3f}s in jobs, {:.3f}s loading "
+          "layers)".format(summary["sheets"], summary["failed"],
+                           summary["seconds"], summary["job_seconds"],
+                           summary["load_seconds"]))
+    if args.report is not None:
+        with open(args.report, "w") as f:
+            json.dump({"summary": summary,
+                       "jobs": [r.as_dict() for r in results]}, f, indent=1)
+    return 1 if len(failed) != 0 else 0
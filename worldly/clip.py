@@ -0,0 +1,115 @@
+""" Clipping of map-space geometries to a rectangular viewport """
+
+import numpy as np
+
+
+def bbox_intersects(bboxes, bbox):
+    """ Returns a boolean array indicating which of an (n, 4) array of
+    *bboxes* intersect *bbox*. Empty (NaN) bounding boxes never intersect.
+    """
+    bboxes = np.asarray(bboxes, dtype=np.float64)
+    return ((bboxes[...,0] <= bbox[2]) & (bboxes[...,2] >= bbox[0]) &
+            (bboxes[...,1] <= bbox[3]) & (bboxes[...,3] >= bbox[1]))
+
+
+def bbox_contains(outer, inner):
+    """ Returns True if bounding box *inner* is inside *outer* """
+    return (outer[0] <= inner[0] and outer[1] <= inner[1] and
+            outer[2] >= inner[2] and outer[3] >= inner[3])
+
+
+def clip_points(xy, bbox):
+    """ Returns the vertices of an (n, 2) array that are inside *bbox* """
+    inside = ((xy[:,0] >= bbox[0]) & (xy[:,0] <= bbox[2]) &
+              (xy[:,1] >= bbox[1]) & (xy[:,1] <= bbox[3]))
+    return xy[inside]
+
+
+def clip_line(xy, bbox):
+    """ Clips a linestring to *bbox* using the Liang-Barsky algorithm.
+
+    Returns a list of (n, 2) arrays, one for each visible piece of the line.
+    """
+    if len(xy) < 2:
+        return [xy] if len(clip_points(xy, bbox)) != 0 else []
+
+    p0 = xy[:-1]
+    d = xy[1:] - p0
+    t0 = np.zeros(len(d))
+    t1 = np.ones(len(d))
+    visible = np.ones(len(d), dtype=bool)
+
+    # each boundary is written as p*t <= q
+    for p, q in ((-d[:,0], p0[:,0] - bbox[0]),
+                 (d[:,0], bbox[2] - p0[:,0]),
+                 (-d[:,1], p0[:,1] - bbox[1]),
+                 (d[:,1], bbox[3] - p0[:,1])):
+        parallel = p == 0
+        visible &= ~(parallel & (q < 0))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            r = q / p
+        entering = (p < 0) & ~parallel
+        leaving = (p > 0) & ~parallel
+        t0 = np.where(entering, np.maximum(t0, r), t0)
+        t1 = np.where(leaving, np.minimum(t1, r), t1)
+
+    visible &= t0 <= t1
+    if not visible.any():
+        return []
+
+    entry = p0 + t0[:,np.newaxis] * d
+    exit_ = p0 + t1[:,np.newaxis] * d
+
+    # a segment continues the previous piece if both are visible and the
+    # previous segment was not cut at its end nor this one at its start
+    continues = np.zeros(len(d), dtype=bool)
+    continues[1:] = visible[:-1] & visible[1:] & (t1[:-1] == 1) & (t0[1:] == 0)
+    starts = visible & ~continues
+
+    # every piece begins with the entry vertex of its first segment, followed
+    # by the exit vertex of each of its segments
+    candidates = np.stack([entry, exit_], axis=1)
+    mask = np.stack([starts, visible], axis=1).ravel()
+    vertices = candidates.reshape(-1, 2)[mask]
+    piece_starts = np.flatnonzero(np.tile([True, False], len(d))[mask])
+    return np.split(vertices, piece_starts[1:])
+
+
+def clip_polygon(xy, bbox):
+    """ Clips a closed ring to *bbox* using the Sutherland-Hodgman algorithm.
+
+    Returns an (n, 2) array with the first vertex repeated at the end, or an
+    empty array if the ring is outside *bbox*.
+    """
+    if len(xy) > 1 and (xy[0] == xy[-1]).all():
+        xy = xy[:-1]
+
+    for axis, value, keep_greater in ((0, bbox[0], True),
+                                      (0, bbox[2], False),
+                                      (1, bbox[1], True),
+                                      (1, bbox[3], False)):
+        if len(xy) == 0:
+            break
+        if keep_greater:
+            inside = xy[:,axis] >= value
+        else:
+            inside = xy[:,axis] <= value
+        if inside.all():
+            continue
+
+        prev = np.roll(xy, 1, axis=0)
+        prev_inside = np.roll(inside, 1)
+        crossing = inside != prev_inside
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = (value - prev[:,axis]) / (xy[:,axis] - prev[:,axis])
+            intersections = prev + t[:,np.newaxis] * (xy - prev)
+        intersections[:,axis] = value
+
+        candidates = np.stack([intersections, xy], axis=1)
+        mask = np.stack([crossing, inside], axis=1)
+        xy = candidates[mask]
+
+    if len(xy) < 3:
+        return np.empty((0, 2))
+    return np.vstack([xy, xy[:1]])
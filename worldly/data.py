@@ -0,0 +1,233 @@
+""" Joining tables of data to layers, and classifying values for styling
+
+A Table is joined to the features of a Layer once, by a key, giving the row
+of each feature. Columns are then looked up, scaled and classified as
+arrays, and the results are passed to MapSheet as *feature_params*, which
+set an attribute of each feature without calling Python functions per
+feature. Restyling from another column only repeats the array operations.
+"""
+
+import csv
+import numpy as np
+
+# anchor colours of sequential colour ramps, from light to dark
+RAMPS = {"blues": ["#f7fbff", "#c6dbef", "#6baed6", "#2171b5", "#08306b"],
+         "greens": ["#f7fcf5", "#c7e9c0", "#74c476", "#238b45", "#00441b"],
+         "reds": ["#fff5f0", "#fcbba1", "#fb6a4a", "#cb181d", "#67000d"],
+         "greys": ["#ffffff", "#d9d9d9", "#969696", "#525252", "#000000"],
+         "viridis": ["#fde725", "#5ec962", "#21918c", "#3b528b", "#440154"]}
+
+
+class Table(object):
+    """ A table of named columns of equal length.
+
+    columns : dict
+        maps column names to sequences, which are stored as numpy arrays
+    """
+
+    def __init__(self, columns):
+        self.columns = dict((name, np.asarray(values))
+                            for name, values in columns.items())
+        lengths = set(len(values) for values in self.columns.values())
+        if len(lengths) > 1:
+            raise ValueError("columns have different lengths")
+        self._indexes = {}
+
+    def __len__(self):
+        for values in self.columns.values():
+            return len(values)
+        return 0
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @classmethod
+    def from_csv(cls, f, text_columns=(), **kw):
+        """ Read a table from a CSV file, given as a path or a text file
+        object, with a header row. Columns whose values are all numbers
+        (or empty, which is read as NaN) become float64 arrays, except for
+        those named in *text_columns*, such as codes with leading zeros.
+        Other keyword arguments are passed to csv.reader. """
+        if hasattr(f, "read"):
+            rows = list(csv.reader(f, **kw))
+        else:
+            with open(f, newline="") as fh:
+                rows = list(csv.reader(fh, **kw))
+        if len(rows) == 0:
+            return cls({})
+        header, rows = rows[0], rows[1:]
+        columns = {}
+        for k, name in enumerate(header):
+            values = [row[k] if k < len(row) else "" for row in rows]
+            if name not in text_columns:
+                try:
+                    values = np.array([float(v) if v.strip() != "" else np.nan
+                                       for v in values])
+                except ValueError:
+                    pass
+            columns[name] = values
+        return cls(columns)
+
+    def index(self, column):
+        """ Return a dict mapping the values of *column* to the first row
+        containing them. The index is built on first use and kept. """
+        index = self._indexes.get(column)
+        if index is None:
+            index = {}
+            for row, value in enumerate(self.columns[column].tolist()):
+                index.setdefault(value, row)
+            self._indexes[column] = index
+        return index
+
+    def take(self, column, rows, missing=None):
+        """ Return the values of *column* at *rows*, as returned by join,
+        with *missing* where the row is -1. Numeric columns give float64
+        arrays, with NaN where *missing* is None. """
+        values = self.columns[column]
+        rows = np.asarray(rows)
+        matched = rows >= 0
+        if values.dtype.kind in "fiub" and missing is None:
+            out = np.full(len(rows), np.nan)
+        else:
+            out = np.full(len(rows), missing, dtype=object)
+        out[matched] = values[rows[matched]]
+        return out
+
+
+def join(layer, key, table, column=None):
+    """ Hash join a Table to the features of *layer*, matching the feature
+    property *key* to the values of the table *column*, which defaults to
+    *key*. Returns an int64 array giving the table row of each feature, or
+    -1 for features without a match. """
+    index = table.index(key if column is None else column)
+    rows = np.full(len(layer), -1, dtype=np.int64)
+    for i, properties in enumerate(layer.properties):
+        if properties is not None:
+            rows[i] = index.get(properties.get(key), -1)
+    return rows
+
+
+def linear_scale(values, domain, output, clamp=True):
+    """ Map *values* linearly from the interval *domain* to the interval
+    *output*, clamping to *output* unless *clamp* is False """
+    values = np.asarray(values, dtype=np.float64)
+    t = (values - domain[0]) / float(domain[1] - domain[0])
+    if clamp:
+        t = np.clip(t, 0.0, 1.0)
+    return output[0] + t * (output[1] - output[0])
+
+
+def equal_interval_breaks(values, n):
+    """ Return the n+1 class edges dividing the range of *values* into *n*
+    classes of equal width. NaNs are ignored. """
+    finite = _finite(values)
+    return np.linspace(finite.min(), finite.max(), n+1)
+
+
+def quantile_breaks(values, n):
+    """ Return the n+1 class edges dividing *values* into *n* classes with
+    equal numbers of values. NaNs are ignored. """
+    return np.quantile(_finite(values), np.linspace(0.0, 1.0, n+1))
+
+
+def jenks_breaks(values, n):
+    """ Return the n+1 class edges of the Jenks natural breaks of *values*
+    into *n* classes, which minimise the sum of squared deviations from the
+    class means. NaNs are ignored.
+
+    The optimal classes are found by dynamic programming (Fisher's method)
+    in O(n m**2) time for m values, which is a fraction of a second for a
+    few thousand values.
+    """
+    x = np.sort(_finite(values))
+    m = len(x)
+    if m <= n:
+        return np.concatenate([x, np.repeat(x[-1], n + 1 - m)])
+
+    # prefix sums give the squared deviation of any run x[a:b] in O(1)
+    centered = x - x.mean()
+    s1 = np.concatenate([[0.0], np.cumsum(centered)])
+    s2 = np.concatenate([[0.0], np.cumsum(centered**2)])
+
+    # cost[b] is the least deviation of x[:b] split into j classes, and
+    # starts[j][b] is where the last of those classes begins
+    b = np.arange(m+1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cost = s2 - s1**2 / b
+    cost[0] = 0.0
+    starts = []
+    for j in range(2, n+1):
+        new_cost = np.full(m+1, np.inf)
+        start = np.zeros(m+1, dtype=np.int64)
+        # take blocks of class ends b at a time, bounding the temporary
+        # arrays, against the possible starts j-1 <= a < b
+        for b0 in range(j, m+1, 256):
+            bs = np.arange(b0, min(b0+256, m+1))
+            a = np.arange(j-1, bs[-1])
+            count = bs[:,None] - a[None,:]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                total = cost[None,a] + (s2[bs,None] - s2[None,a]) - \
+                    (s1[bs,None] - s1[None,a])**2 / count
+            total[count <= 0] = np.inf
+            best = np.argmin(total, axis=1)
+            new_cost[bs] = total[np.arange(len(bs)), best]
+            start[bs] = a[best]
+        cost = new_cost
+        starts.append(start)
+
+    # the upper edge of each class is its largest value
+    edges = [x[-1]]
+    end = m
+    for start in reversed(starts):
+        end = start[end]
+        edges.append(x[end-1])
+    edges.append(x[0])
+    return np.array(edges[::-1])
+
+
+def classify(values, breaks):
+    """ Return the class of each value for class edges *breaks*, as an
+    int64 array. Class *i* holds values from breaks[i] (exclusive, except
+    for the first class) to breaks[i+1] (inclusive). Values beyond the edges
+    fall in the first or last class, and NaNs in class -1. """
+    values = np.asarray(values, dtype=np.float64)
+    classes = np.searchsorted(np.asarray(breaks)[1:-1], values, side="left")
+    classes[np.isnan(values)] = -1
+    return classes
+
+
+def color_ramp(colors, n):
+    """ Return *n* hex colours evenly spaced along the ramp through
+    *colors*, a list of hex colours or the name of a ramp in RAMPS """
+    if isinstance(colors, str):
+        colors = RAMPS[colors]
+    anchors = np.array([[int(c.lstrip("#")[k:k+2], 16) for k in (0, 2, 4)]
+                        for c in colors], dtype=np.float64)
+    if n == 1:
+        positions = np.array([0.0])
+    else:
+        positions = np.linspace(0.0, len(anchors) - 1, n)
+    rgb = np.column_stack([np.interp(positions, np.arange(len(anchors)),
+                                     anchors[:,k]) for k in range(3)])
+    return ["#{:02x}{:02x}{:02x}".format(*c)
+            for c in np.round(rgb).astype(int).tolist()]
+
+
+def choropleth(values, breaks, colors, missing=None):
+    """ Return the colour of each value, classified by *breaks*, from
+    *colors*, which is a list with a colour for each class or a ramp for
+    color_ramp. Values in class -1 get *missing*. The result is a list
+    suitable for MapSheet *feature_params*. """
+    nclasses = len(breaks) - 1
+    if isinstance(colors, str) or len(colors) != nclasses:
+        colors = color_ramp(colors, nclasses)
+    palette = np.array(list(colors) + [missing], dtype=object)
+    return palette[classify(values, breaks)].tolist()
+
+
+def _finite(values):
+    values = np.asarray(values, dtype=np.float64)
+    finite = values[np.isfinite(values)]
+    if len(finite) == 0:
+        raise ValueError("no finite values to classify")
+    return finite
@@ -0,0 +1,206 @@
+""" Concurrent fetching of remote layers with asyncio """
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import gzip
+import http.client
+import threading
+from urllib.parse import urlencode, urljoin, urlsplit
+
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+
+class FetchError(IOError):
+    """ Raised when a server responds with a status other than success
+    (2xx), including a redirect that was not followed """
+
+    def __init__(self, url, status, reason=""):
+        super(FetchError, self).__init__("{} {} fetching {}".format(
+            status, reason, url))
+        self.url = url
+        self.status = status
+
+
+class ConnectionPool(object):
+    """ A thread-safe pool of persistent HTTP(S) connections, kept per host
+    so that repeated requests to a server reuse its connections.
+
+    maxsize : int
+        maximum number of idle connections kept per host
+
+    timeout : float
+        socket timeout in seconds for connecting and for each read
+
+    max_redirects : int
+        maximum number of redirects followed by each request
+    """
+
+    def __init__(self, maxsize=4, timeout=30.0, max_redirects=5):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self.connections_opened = 0
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def close(self):
+        """ Close every idle connection """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for conn in connections:
+                conn.close()
+
+    def _acquire(self, scheme, netloc):
+        with self._lock:
+            connections = self._idle.get((scheme, netloc))
+            if connections:
+                return connections.pop(), True
+            self.connections_opened += 1
+        if scheme == "https":
+            conn = http.client.HTTPSConnection(netloc, timeout=self.timeout)
+        elif scheme == "http":
+            conn = http.client.HTTPConnection(netloc, timeout=self.timeout)
+        else:
+            raise ValueError("unsupported URL scheme '{}'".format(scheme))
+        return conn, False
+
+    def _release(self, scheme, netloc, conn):
+        with self._lock:
+            connections = self._idle.setdefault((scheme, netloc), [])
+            if len(connections) < self.maxsize:
+                connections.append(conn)
+                return
+        conn.close()
+
+    def get(self, url):
+        """ Perform a GET request, returning the response status, reason and
+        body. Redirects are followed, up to *max_redirects* of them, after
+        which the last redirect response is returned. Blocks until the
+        response has been read. """
+        for _ in range(self.max_redirects):
+            status, reason, body, location = self._get(url)
+            if status not in REDIRECT_STATUSES or location is None:
+                break
+            url = urljoin(url, location)
+        else:
+            status, reason, body, _ = self._get(url)
+        return status, reason, body
+
+    def _get(self, url):
+        """ Perform a single GET request, returning the response status,
+        reason, body and Location header """
+        parts = urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        headers = {"Accept-Encoding": "gzip"}
+
+        conn, reused = self._acquire(parts.scheme, parts.netloc)
+        try:
+            try:
+                conn.request("GET", path, headers=headers)
+                response = conn.getresponse()
+            except (http.client.HTTPException, ConnectionError):
+                if not reused:
+                    raise
+                # the server may have closed an idle connection, so retry
+                # once with a new one
+                conn.close()
+                conn, _ = self._acquire_new(parts.scheme, parts.netloc)
+                conn.request("GET", path, headers=headers)
+                response = conn.getresponse()
+            body = response.read()
+        except BaseException:
+            conn.close()
+            raise
+
+        if response.will_close:
+            conn.close()
+        else:
+            self._release(parts.scheme, parts.netloc, conn)
+        if response.getheader("Content-Encoding", "").lower() == "gzip":
+            body = gzip.decompress(body)
+        return (response.status, response.reason, body,
+                response.getheader("Location"))
+
+    def _acquire_new(self, scheme, netloc):
+        # the other idle connections to the host are likely stale too
+        with self._lock:
+            stale = self._idle.pop((scheme, netloc), [])
+        for conn in stale:
+            conn.close()
+        return self._acquire(scheme, netloc)
+
+
+class Fetcher(object):
+    """ Fetches and parses remote resources concurrently from asyncio code.
+
+    Requests and parsing run in a thread pool, at most *max_concurrency*
+    requests at a time, over a shared ConnectionPool. A Fetcher may be shared
+    by several MapSheets.
+
+    A Fetcher holds open connections and threads until it is closed, so
+    callers that create one must call close() when they are done with it.
+
+    max_concurrency : int
+        maximum number of requests in flight
+
+    timeout : float
+        seconds allowed for each request, including reading the response
+        and following redirects
+
+    executor : concurrent.futures.Executor
+        runs requests and parsing. If None, a thread pool of
+        *max_concurrency* threads is created.
+    """
+
+    def __init__(self, max_concurrency=4, timeout=30.0, executor=None):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.pool = ConnectionPool(maxsize=max_concurrency, timeout=timeout)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max_concurrency)
+            self._own_executor = True
+        else:
+            self._own_executor = False
+        self.executor = executor
+        self._semaphores = {}
+
+    def close(self):
+        """ Close pooled connections, and the executor if it was created by
+        the Fetcher """
+        self.pool.close()
+        if self._own_executor:
+            self.executor.shutdown(wait=False)
+
+    def _semaphore(self):
+        # semaphores belong to an event loop
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores = {loop: semaphore}
+        return semaphore
+
+    async def fetch(self, url, params=None, parse=None):
+        """ Return the body of the resource at *url*, with query *params*
+        added. If *parse* is given, it is called with the body in the thread
+        pool and its result is returned instead.
+
+        Raises FetchError for responses other than success, after any
+        redirects have been followed, and asyncio.TimeoutError if
+        the request takes longer than *timeout*.
+        """
+        if params:
+            url += ("&" if "?" in url else "?") + urlencode(params)
+        loop = asyncio.get_running_loop()
+        async with self._semaphore():
+            status, reason, body = await asyncio.wait_for(
+                loop.run_in_executor(self.executor, self.pool.get, url),
+                self.timeout)
+        if not 200 <= status < 300:
+            raise FetchError(url, status, reason)
+        if parse is not None:
+            return await loop.run_in_executor(self.executor, parse, body)
+        return body
@@ -0,0 +1,118 @@
+""" Bulk-loaded spatial index over bounding boxes """
+
+import math
+import numpy as np
+
+
+class STRtree(object):
+    """ A static R-tree packed with the Sort-Tile-Recursive algorithm.
+
+    bboxes : (n, 4) array
+        item bounding boxes (xmin, ymin, xmax, ymax). Items whose bounding
+        boxes are entirely NaN, such as empty features, are never returned by
+        queries. Any other non-finite bounding box raises ValueError, rather
+        than silently leaving its item out of the index.
+
+    node_capacity : int
+        maximum number of children per node
+    """
+
+    def __init__(self, bboxes, node_capacity=16):
+        bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+        self.node_capacity = node_capacity
+        self.size = len(bboxes)
+
+        finite = np.isfinite(bboxes).all(axis=1)
+        invalid = ~finite & ~np.isnan(bboxes).all(axis=1)
+        if invalid.any():
+            raise ValueError("non-finite bounding box for item {}"
+                             .format(np.flatnonzero(invalid)[0]))
+        valid = np.flatnonzero(finite)
+        order, starts, stops = _str_pack(bboxes[valid], node_capacity)
+        self.items = valid[order]
+        self.item_bboxes = bboxes[self.items]
+
+        # levels[0] holds the leaves, whose children are ranges of self.items,
+        # and levels[-1] holds the children of the root
+        self.levels = []
+        child_bboxes = self.item_bboxes
+        while True:
+            node_bboxes = _group_bboxes(child_bboxes, starts)
+            self.levels.append((node_bboxes, starts, stops))
+            if len(node_bboxes) <= node_capacity:
+                break
+            order, parent_starts, parent_stops = _str_pack(node_bboxes,
+                                                           node_capacity)
+            self.levels[-1] = (node_bboxes[order], starts[order], stops[order])
+            child_bboxes = node_bboxes[order]
+            starts, stops = parent_starts, parent_stops
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def bbox(self):
+        """ Bounding box of every indexed item, or None if empty """
+        node_bboxes = self.levels[-1][0]
+        if len(node_bboxes) == 0:
+            return None
+        return tuple(node_bboxes[:,:2].min(axis=0).tolist() +
+                     node_bboxes[:,2:].max(axis=0).tolist())
+
+    def query(self, bbox):
+        """ Return the sorted indices of items whose bounding boxes intersect
+        *bbox* """
+        nodes = np.arange(len(self.levels[-1][0]))
+        for node_bboxes, starts, stops in reversed(self.levels):
+            nodes = nodes[_intersects(node_bboxes[nodes], bbox)]
+            nodes = _expand_ranges(starts[nodes], stops[nodes])
+
+        # nodes are now positions in self.items
+        nodes = nodes[_intersects(self.item_bboxes[nodes], bbox)]
+        return np.sort(self.items[nodes])
+
+
+def _intersects(bboxes, bbox):
+    return ((bboxes[:,0] <= bbox[2]) & (bboxes[:,2] >= bbox[0]) &
+            (bboxes[:,1] <= bbox[3]) & (bboxes[:,3] >= bbox[1]))
+
+
+def _str_pack(bboxes, capacity):
+    """ Sort-Tile-Recursive packing of bounding boxes into groups of at most
+    *capacity*. Returns the packing order and the start and stop positions of
+    each group in that order. """
+    n = len(bboxes)
+    if n == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+
+    nleaves = int(math.ceil(n / float(capacity)))
+    nslices = int(math.ceil(math.sqrt(nleaves)))
+    slice_size = nslices * capacity
+
+    cx = bboxes[:,0] + bboxes[:,2]
+    cy = bboxes[:,1] + bboxes[:,3]
+    order = np.argsort(cx, kind="stable")
+    for i in range(0, n, slice_size):
+        chunk = order[i:i+slice_size]
+        order[i:i+slice_size] = chunk[np.argsort(cy[chunk], kind="stable")]
+
+    starts = np.arange(0, n, capacity, dtype=np.int64)
+    stops = np.minimum(starts + capacity, n)
+    return order, starts, stops
+
+
+def _group_bboxes(bboxes, starts):
+    """ Union of the bounding boxes in each contiguous group """
+    if len(starts) == 0:
+        return np.zeros((0, 4))
+    return np.hstack([np.minimum.reduceat(bboxes[:,:2], starts, axis=0),
+                      np.maximum.reduceat(bboxes[:,2:], starts, axis=0)])
+
+
+def _expand_ranges(starts, stops):
+    """ Concatenate the integer ranges [starts[i], stops[i]) """
+    counts = stops - starts
+    offsets = np.cumsum(counts) - counts
+    return (np.arange(counts.sum()) - np.repeat(offsets, counts) +
+            np.repeat(starts, counts))
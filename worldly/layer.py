@@ -0,0 +1,253 @@
+""" Columnar storage for GeoJSON geometries """
+
+from array import array
+import numpy as np
+from .projection import project_array
+from .index import STRtree
+from .simplify import LODPyramid, DOUGLAS_PEUCKER
+
+POINT = 1
+LINESTRING = 2
+POLYGON = 3
+MULTIPOINT = 4
+MULTILINESTRING = 5
+MULTIPOLYGON = 6
+
+GEOMETRY_TYPES = {"Point": POINT,
+                  "LineString": LINESTRING,
+                  "Polygon": POLYGON,
+                  "MultiPoint": MULTIPOINT,
+                  "MultiLineString": MULTILINESTRING,
+                  "MultiPolygon": MULTIPOLYGON}
+
+
+class Layer(object):
+    """ A Layer stores a collection of geometries as flat arrays, in the
+    manner of GeoArrow ragged arrays.
+
+    coords : (n, 2) float64 array
+        every vertex in the layer
+
+    ring_offsets : int64 array
+        ring *i* spans coords[ring_offsets[i]:ring_offsets[i+1]]. Rings are
+        polygon rings, linestrings, or single points.
+
+    part_offsets : int64 array
+        part *i* spans rings[part_offsets[i]:part_offsets[i+1]]. Parts are the
+        members of multipart geometries.
+
+    geom_offsets : int64 array
+        geometry *i* spans parts[geom_offsets[i]:geom_offsets[i+1]]
+
+    geom_types : uint8 array
+        type code for each geometry
+
+    feature_offsets : int64 array
+        feature *i* spans geometries[feature_offsets[i]:feature_offsets[i+1]].
+        GeometryCollections are flattened into their members.
+
+    properties : list
+        properties for each feature, or None for bare geometries
+    """
+
+    def __init__(self, coords, ring_offsets, part_offsets, geom_offsets,
+                 geom_types, feature_offsets, properties):
+        self.coords = coords
+        self.ring_offsets = ring_offsets
+        self.part_offsets = part_offsets
+        self.geom_offsets = geom_offsets
+        self.geom_types = geom_types
+        self.feature_offsets = feature_offsets
+        self.properties = properties
+        self._indexes = {}
+        self._pyramids = {}
+
+    def __len__(self):
+        return len(self.properties)
+
+    @classmethod
+    def from_geojson(cls, *objs):
+        """ Build a Layer from picogeojson namedtuples """
+        builder = LayerBuilder()
+        for obj in objs:
+            builder.add(obj)
+        return builder.build()
+
+    @property
+    def nvertices(self):
+        return len(self.coords)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.coords, self.ring_offsets,
+                                      self.part_offsets, self.geom_offsets,
+                                      self.geom_types, self.feature_offsets))
+
+    def feature_geometries(self, i):
+        """ Return the range of geometry indices belonging to feature *i* """
+        return range(self.feature_offsets[i], self.feature_offsets[i+1])
+
+    def geometry_rings(self, i):
+        """ Return a list of (start, stop) coordinate ranges for every ring in
+        geometry *i* """
+        p0, p1 = self.geom_offsets[i], self.geom_offsets[i+1]
+        r0, r1 = self.part_offsets[p0], self.part_offsets[p1]
+        offsets = self.ring_offsets[r0:r1+1].tolist()
+        return list(zip(offsets[:-1], offsets[1:]))
+
+    def geometry_parts(self, i):
+        """ Return a list of parts in geometry *i*, each given as a list of
+        (start, stop) coordinate ranges for its rings """
+        p0, p1 = self.geom_offsets[i], self.geom_offsets[i+1]
+        parts = []
+        for p in range(p0, p1):
+            r0, r1 = self.part_offsets[p], self.part_offsets[p+1]
+            offsets = self.ring_offsets[r0:r1+1].tolist()
+            parts.append(list(zip(offsets[:-1], offsets[1:])))
+        return parts
+
+    def projected(self, projection):
+        """ Return an (n, 2) array of coordinates projected by *projection* """
+        out = np.empty_like(self.coords)
+        if len(self.coords) != 0:
+            out[:,0], out[:,1] = project_array(projection,
+                                               self.coords[:,0],
+                                               self.coords[:,1])
+        return out
+
+    def bbox(self, coords=None):
+        """ Return the bounding box (xmin, ymin, xmax, ymax) of *coords*,
+        which defaults to the unprojected layer coordinates """
+        if coords is None:
+            coords = self.coords
+        xmin, ymin = coords.min(axis=0).tolist()
+        xmax, ymax = coords.max(axis=0).tolist()
+        return (xmin, ymin, xmax, ymax)
+
+    def feature_bboxes(self, coords=None):
+        """ Return an (nfeatures, 4) array of feature bounding boxes computed
+        from *coords*, which defaults to the unprojected layer coordinates.
+        Features without vertices have NaN bounding boxes.
+        """
+        if coords is None:
+            coords = self.coords
+        starts = self.ring_offsets[
+                    self.part_offsets[
+                        self.geom_offsets[self.feature_offsets]]]
+        counts = np.diff(starts)
+        bboxes = np.full((len(counts), 4), np.nan)
+        nonempty = counts != 0
+        if len(coords) != 0 and nonempty.any():
+            idx = starts[:-1][nonempty]
+            bboxes[nonempty,:2] = np.minimum.reduceat(coords, idx, axis=0)
+            bboxes[nonempty,2:] = np.maximum.reduceat(coords, idx, axis=0)
+        return bboxes
+
+
+    def spatial_index(self, projection, coords=None):
+        """ Return an STRtree over the feature bounding boxes in the space of
+        *projection*. The tree is built on first use from *coords*, the
+        projected layer coordinates, and kept for later calls. """
+        key = id(projection)
+        entry = self._indexes.get(key)
+        if entry is None or entry[0] is not projection:
+            if coords is None:
+                coords = self.projected(projection)
+            entry = (projection, STRtree(self.feature_bboxes(coords)))
+            self._indexes[key] = entry
+        return entry[1]
+
+    def lod_pyramid(self, projection, method=DOUGLAS_PEUCKER, coords=None):
+        """ Return a worldly.simplify.LODPyramid of the layer in the space of
+        *projection*, for simplification by *method*. The pyramid is built
+        on first use from *coords*, the projected layer coordinates, and kept
+        for later calls. """
+        key = (id(projection), method)
+        entry = self._pyramids.get(key)
+        if entry is None or entry[0] is not projection:
+            if coords is None:
+                coords = self.projected(projection)
+            entry = (projection, LODPyramid(coords, self.ring_offsets,
+                                            method=method))
+            self._pyramids[key] = entry
+        return entry[1]
+
+
+class LayerBuilder(object):
+    """ Accumulates geometries and features and builds a Layer """
+
+    def __init__(self):
+        self.coords = array("d")
+        self.ring_offsets = array("q", [0])
+        self.part_offsets = array("q", [0])
+        self.geom_offsets = array("q", [0])
+        self.geom_types = array("B")
+        self.feature_offsets = array("q", [0])
+        self.properties = []
+
+    @property
+    def nvertices(self):
+        return len(self.coords) // 2
+
+    def __len__(self):
+        return len(self.properties)
+
+    def add(self, obj):
+        """ Add a picogeojson Geometry, Feature, or FeatureCollection """
+        typename = type(obj).__name__
+        if typename == "FeatureCollection":
+            for feature in obj.features:
+                self.add(feature)
+        elif typename == "Feature":
+            self._add_geometry(obj.geometry)
+            self.feature_offsets.append(len(self.geom_types))
+            self.properties.append(obj.properties)
+        else:
+            self._add_geometry(obj)
+            self.feature_offsets.append(len(self.geom_types))
+            self.properties.append(None)
+
+    def _add_geometry(self, geom):
+        if geom is None:            # Features may have null geometries
+            return
+        typename = type(geom).__name__
+        if typename == "GeometryCollection":
+            for g in geom.geometries:
+                self._add_geometry(g)
+            return
+        elif typename not in GEOMETRY_TYPES:
+            raise NotImplementedError("'{}' not handled".format(type(geom)))
+
+        crds = geom.coordinates
+        if typename == "Point":
+            parts = [[[crds]]]
+        elif typename == "LineString":
+            parts = [[crds]]
+        elif typename == "Polygon":
+            parts = [crds]
+        elif typename == "MultiPoint":
+            parts = [[[xy]] for xy in crds]
+        elif typename == "MultiLineString":
+            parts = [[ls] for ls in crds]
+        else:
+            parts = crds
+
+        for part in parts:
+            for ring in part:
+                for xy in ring:
+                    self.coords.append(xy[0])
+                    self.coords.append(xy[1])
+                self.ring_offsets.append(len(self.coords) // 2)
+            self.part_offsets.append(len(self.ring_offsets) - 1)
+        self.geom_offsets.append(len(self.part_offsets) - 1)
+        self.geom_types.append(GEOMETRY_TYPES[typename])
+
+    def build(self):
+        coords = np.frombuffer(self.coords, dtype=np.float64).reshape(-1, 2)
+        return Layer(coords.copy(),
+                     np.frombuffer(self.ring_offsets, dtype=np.int64).copy(),
+                     np.frombuffer(self.part_offsets, dtype=np.int64).copy(),
+                     np.frombuffer(self.geom_offsets, dtype=np.int64).copy(),
+                     np.frombuffer(self.geom_types, dtype=np.uint8).copy(),
+                     np.frombuffer(self.feature_offsets, dtype=np.int64).copy(),
+                     self.properties)
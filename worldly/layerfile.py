@@ -0,0 +1,173 @@
+""" A binary file format for Layers, loaded by memory-mapping
+
+A layer file holds the coordinate and offset arrays of a Layer, the
+bounding box of each feature, and feature properties as a table of JSON
+documents. Arrays are stored uncompressed, little-endian and aligned, so
+that loading maps them directly and processes loading the same file share
+its pages.
+
+The file begins with the magic bytes b"WORLDLY\\x00", then the version and
+the length of a JSON header as little-endian uint32s, then the header. The
+header gives the dtype, shape and byte offset of each array.
+"""
+
+import json
+import mmap as _mmap
+import os
+import numpy as np
+from .layer import Layer
+
+MAGIC = b"WORLDLY\x00"
+VERSION = 1
+ALIGNMENT = 64
+
+_ARRAYS = (("coords", "<f8"),
+           ("ring_offsets", "<i8"),
+           ("part_offsets", "<i8"),
+           ("geom_offsets", "<i8"),
+           ("geom_types", "u1"),
+           ("feature_offsets", "<i8"),
+           ("feature_bboxes", "<f8"),
+           ("property_offsets", "<i8"),
+           ("properties", "u1"))
+
+
+class MappedLayer(Layer):
+    """ A Layer loaded from a layer file. Its arrays are read-only and, if
+    it was memory-mapped, backed by the file.
+
+    feature_bboxes : (nfeatures, 4) float64 array
+        stored bounding boxes of the features in geographical coordinates
+
+    See Layer for the remaining arguments.
+    """
+
+    def __init__(self, coords, ring_offsets, part_offsets, geom_offsets,
+                 geom_types, feature_offsets, properties, feature_bboxes):
+        super(MappedLayer, self).__init__(coords, ring_offsets, part_offsets,
+                                          geom_offsets, geom_types,
+                                          feature_offsets, properties)
+        self._feature_bboxes = feature_bboxes
+
+    def feature_bboxes(self, coords=None):
+        """ Return an (nfeatures, 4) array of feature bounding boxes. For
+        the unprojected layer coordinates, the stored bounding boxes are
+        returned. See Layer.feature_bboxes. """
+        if coords is None:
+            return self._feature_bboxes
+        return super(MappedLayer, self).feature_bboxes(coords)
+
+
+class PropertyTable(object):
+    """ A read-only sequence of feature properties, each stored as a JSON
+    document and decoded when it is accessed.
+
+    offsets : int64 array
+        document *i* spans data[offsets[i]:offsets[i+1]]
+
+    data : uint8 array
+        UTF-8 encoded JSON documents
+    """
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("property index out of range")
+        a, b = int(self.offsets[i]), int(self.offsets[i+1])
+        return json.loads(self.data[a:b].tobytes().decode("utf-8"))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def save_layer(layer, filename):
+    """ Write *layer* to the layer file *filename* """
+    documents = [json.dumps(p, separators=(",", ":")).encode("utf-8")
+                 for p in layer.properties]
+    property_offsets = np.zeros(len(documents)+1, dtype=np.int64)
+    np.cumsum(np.array([len(d) for d in documents], dtype=np.int64),
+              out=property_offsets[1:])
+    columns = {"coords": layer.coords.reshape(-1, 2),
+               "ring_offsets": layer.ring_offsets,
+               "part_offsets": layer.part_offsets,
+               "geom_offsets": layer.geom_offsets,
+               "geom_types": layer.geom_types,
+               "feature_offsets": layer.feature_offsets,
+               "feature_bboxes": layer.feature_bboxes(),
+               "property_offsets": property_offsets,
+               "properties": np.frombuffer(b"".join(documents),
+                                           dtype=np.uint8)}
+    values = [(name, np.ascontiguousarray(columns[name], dtype=dtype))
+              for name, dtype in _ARRAYS]
+
+    # the header gives the array offsets, which depend on its length, so
+    # reserve space for it and grow the reservation until it fits
+    start = len(MAGIC) + 8
+    reserved = 1024
+    while True:
+        arrays = []
+        header = {"nfeatures": len(layer), "arrays": {}}
+        offset = _align(start + reserved)
+        for name, a in values:
+            header["arrays"][name] = [a.dtype.str, list(a.shape), offset]
+            arrays.append((offset, a))
+            offset = _align(offset + a.nbytes)
+        encoded = json.dumps(header, sort_keys=True).encode("utf-8")
+        if len(encoded) <= reserved:
+            break
+        reserved *= 2
+
+    with open(os.fspath(filename), "wb") as f:
+        f.write(MAGIC)
+        f.write(np.array([VERSION, len(encoded)], dtype="<u4").tobytes())
+        f.write(encoded)
+        for offset, a in arrays:
+            f.write(b"\x00" * (offset - f.tell()))
+            f.write(a.tobytes())
+
+
+def load_layer(filename, mmap=True):
+    """ Load a MappedLayer from the layer file *filename*. If *mmap* is
+    True, the arrays are memory-mapped rather than read. """
+    with open(os.fspath(filename), "rb") as f:
+        if mmap:
+            buf = _mmap.mmap(f.fileno(), 0, access=_mmap.ACCESS_READ)
+        else:
+            buf = f.read()
+
+    start = len(MAGIC) + 8
+    if len(buf) < start or bytes(buf[:len(MAGIC)]) != MAGIC:
+        raise ValueError("{} is not a layer file".format(filename))
+    version, length = np.frombuffer(buf, dtype="<u4", count=2,
+                                    offset=len(MAGIC)).tolist()
+    if version != VERSION:
+        raise ValueError("unsupported layer file version {}".format(version))
+    header = json.loads(bytes(buf[start:start+length]).decode("utf-8"))
+
+    arrays = {}
+    for name, (dtype, shape, offset) in header["arrays"].items():
+        count = int(np.prod(shape))
+        arrays[name] = np.frombuffer(buf, dtype=dtype, count=count,
+                                     offset=offset).reshape(shape)
+    return MappedLayer(arrays["coords"], arrays["ring_offsets"],
+                       arrays["part_offsets"], arrays["geom_offsets"],
+                       arrays["geom_types"], arrays["feature_offsets"],
+                       PropertyTable(arrays["property_offsets"],
+                                     arrays["properties"]),
+                       arrays["feature_bboxes"])
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
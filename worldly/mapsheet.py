@@ -1,8 +1,30 @@
+import asyncio
+from collections import OrderedDict
+import copy
+import gzip
+import hashlib
+import io
+import os
+from itertools import groupby
 from math import sqrt
 import xml.etree.ElementTree as ET
 import picogeojson
-from .svg import SVGNode, SVGRoot, SVGPath
+import numpy as np
+from .svg import SVGNode, SVGRoot, SVGPath, SVGCircle, SVGUse
 from .projection import WebMercator
+from .cache import ProjectionCache
+from .clip import bbox_contains, clip_points, clip_line, clip_polygon
+from .simplify import (drop_duplicates, ring_area,
+                       simplify as simplify_vertices)
+from .layerfile import load_layer
+from .prepared import PreparedLayer
+from .stats import RenderStats, clock, encoded_size
+from .stream import GeoJSONStream
+from .topojson import Topology
+from .workers import fork_context
+from .tiles import render_tiles
+from .layer import (Layer, POINT, LINESTRING, POLYGON,
+                    MULTIPOINT, MULTILINESTRING, MULTIPOLYGON)
 
 
 class MapSheet(object):
@@ -38,9 +60,67 @@ class MapSheet(object):
         the map center, in geographical coordinates. Ignored if *bbox* is not
         None. If *center* and *bbox* are None, the centroid of the map entities
         is used.
+
+    clip : bool
+        if True (default), GeoJSON features outside of the map are omitted and
+        features crossing the map edge are clipped to it
+
+    clip_margin : float
+        fraction of the map width and height by which the clipping region
+        extends beyond the map edges, so that strokes are not cut off
+
+    simplify : str
+        if "douglas-peucker" or "visvalingam", lines and polygon rings are
+        simplified before drawing. Consecutive vertices that coincide after
+        rounding are also dropped.
+
+    tolerance : float
+        simplification tolerance, in output pixels
+
+    min_area : float
+        polygon rings smaller than this area, in square output pixels, are
+        dropped (along with their holes)
+
+    cache : ProjectionCache
+        cache of projected coordinates, which may be shared between map
+        sheets. If None, coordinates are projected once per serialization.
+
+    compact : bool
+        if True, path data is written with relative commands and without
+        redundant characters, and vertices that repeat at the output
+        precision are dropped. Coordinates are rounded as they are
+        otherwise, and the map transform is the same, so the files are
+        smaller but draw identically.
+
+    compress : bool
+        if True, the document is written to *dest* gzip-compressed (SVGZ). If
+        None (default), output is compressed when *dest* is a path or a
+        named file ending in ".svgz".
+
+    stats_callback : callable
+        if given, every serialization collects a worldly.stats.RenderStats
+        and calls *stats_callback* with it when the document is complete
+
+    incremental : bool
+        if True, the encoded fragment of each GeoJSON or TopoJSON layer is
+        kept, and later serializations reuse it unless the layer's
+        parameters or the scale, extent or rendering settings have changed.
+        Layers must not be modified in place (see clear_fragments).
+
+    lod : bool
+        if True and *simplify* is set, a level-of-detail pyramid of each
+        layer is built when the layer is added (see
+        worldly.simplify.LODPyramid), and lines and rings are simplified
+        starting from the coarsest level that the tolerance allows, so that
+        zoomed-out maps of detailed layers are drawn quickly. Geometries are
+        simplified before they are clipped.
     """
     def __init__(self, dest, width=500, height=500, style=None,
-                 projection=WebMercator, bbox=None, scale=None, center=None):
+                 projection=WebMercator, bbox=None, scale=None, center=None,
+                 clip=True, clip_margin=0.05,
+                 simplify=None, tolerance=0.5, min_area=0.0, cache=None,
+                 compact=False, compress=None, stats_callback=None,
+                 incremental=False, lod=False):
         self.dest = dest
         self.width = width
         self.height = height
@@ -51,30 +131,213 @@ class MapSheet(object):
         self.bbox = bbox
         self.scale = scale
         self.center = center
+        self.clip = clip
+        self.clip_margin = clip_margin
+        self.simplify = simplify
+        self.tolerance = tolerance
+        self.min_area = min_area
+        self.cache = cache
+        self.compact = compact
+        self.compress = compress
+        self.stats_callback = stats_callback
+        self.incremental = incremental
+        self.lod = lod
 
         self.entities = []
+        self.fetcher = None
+        self._own_fetcher = False
+        self._parse_seconds = 0.0
+        self._fragments = {}
+        self._pending = []
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
         if exc_type is None and exc_value is None and traceback is None:
-            if hasattr(self.dest, "write"):
-                self.dest.write(self.serialize())
-            elif isinstance(self.dest, str):
-                with open(self.dest, "w") as f:
-                    f.write(self.serialize())
+            if self.dest is not None:
+                self.save()
         return False  # re-raise exceptions
 
-    def add_geojson_file(self, filename, **kw):
-        """ Add contents of a GeoJSON file """
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                await self.loaded()
+                if self.dest is not None:
+                    loop = asyncio.get_running_loop()
+                    await loop.run_in_executor(None, self.save)
+            else:
+                pending, self._pending = self._pending, []
+                for task in pending:
+                    task.cancel()
+                # wait for the cancellations, so that no task is left pending
+                await asyncio.gather(*pending, return_exceptions=True)
+        finally:
+            self.close()
+        return False  # re-raise exceptions
+
+    def close(self):
+        """ Close the Fetcher created by add_geojson_url, if any. Map sheets
+        used with "async with" are closed at the end of the block. """
+        if self.fetcher is not None and self._own_fetcher:
+            self.fetcher.close()
+            self.fetcher = None
+
+    def save(self, dest=None, workers=None):
+        """ Write the map to *dest*, a path or a text or binary file-like
+        object, which defaults to the map's *dest*. Output is compressed as
+        described for *compress*. See iterserialize for *workers*. """
+        if dest is None:
+            dest = self.dest
+        compress = self.compress
+        if hasattr(dest, "write"):
+            if compress is None:
+                name = getattr(dest, "name", None)
+                compress = isinstance(name, str) and name.endswith(".svgz")
+            self.write(dest, workers=workers, compress=compress)
+        else:
+            path = os.fspath(dest)
+            if compress is None:
+                compress = path.endswith(".svgz")
+            if compress:
+                with open(path, "wb") as f:
+                    self.write(f, workers=workers, compress=True)
+            else:
+                with open(path, "w") as f:
+                    self.write(f, workers=workers)
+
+    def add_geojson_file(self, filename, stream=False, **kw):
+        """ Add contents of a GeoJSON file. If *stream* is True, the file is
+        read incrementally each time the map is drawn instead of being loaded
+        now, and may also contain newline-delimited GeoJSON. """
+        if stream:
+            self.entities.append((GeoJSONStream(filename), kw))
+            return
         with open(filename) as f:
             self.add_geojson(f.read(), **kw)
 
     def add_geojson(self, *strings, **kw):
         """ Add GeoJSON strings """
         for string in strings:
-            self.entities.append((picogeojson.fromstring(string), kw))
+            t0 = clock()
+            layer = Layer.from_geojson(picogeojson.fromstring(string))
+            self._parse_seconds += clock() - t0
+            self._build_lod(layer)
+            self.entities.append((layer, kw))
+
+    def add_geojson_url(self, url, params=None, fetcher=None, **kw):
+        """ Fetch a GeoJSON layer from *url*, with query *params*, as an
+        asyncio task, and return the task. Must be called from a running
+        event loop.
+
+        The layer takes its place among the map entities when this method is
+        called, so layers are drawn in the order they were added however
+        their downloads finish. Requests are made concurrently, at most
+        *fetcher.max_concurrency* at a time, and parsed in the fetcher's
+        thread pool. If *fetcher* is None, a worldly.fetch.Fetcher owned by
+        the map sheet is used, which must be released with MapSheet.close()
+        unless the map sheet is used with "async with". A *fetcher* that is
+        given remains open, and is closed by the caller.
+
+        Await the returned task, or MapSheet.loaded(), before serializing.
+        When the map sheet is used with "async with", layers still loading
+        at the end of the block are awaited before the map is saved. If a
+        download fails, its layer is removed and the task raises the
+        exception.
+        """
+        if fetcher is None:
+            if self.fetcher is None:
+                # imported here, so that only maps drawing remote layers load
+                # the HTTP client and thread pool modules
+                from .fetch import Fetcher
+                self.fetcher = Fetcher()
+                self._own_fetcher = True
+            fetcher = self.fetcher
+        slot = _PendingLayer(url)
+        self.entities.append((slot, kw))
+        task = asyncio.ensure_future(self._load_url(slot, url, params,
+                                                    fetcher, kw))
+        self._pending.append(task)
+        return task
+
+    async def _load_url(self, slot, url, params, fetcher, kw):
+        try:
+            layer, seconds = await fetcher.fetch(url, params,
+                                                 parse=_parse_geojson_bytes)
+        except BaseException:
+            self.entities = [(e, p) for e, p in self.entities if e is not slot]
+            raise
+        self._parse_seconds += seconds
+        self._build_lod(layer)
+        for k, (entity, _) in enumerate(self.entities):
+            if entity is slot:
+                self.entities[k] = (layer, kw)
+        return layer
+
+    async def loaded(self):
+        """ Wait until every layer added with add_geojson_url has loaded,
+        raising the first exception from a failed download """
+        pending, self._pending = self._pending, []
+        if len(pending) != 0:
+            await asyncio.gather(*pending)
+
+    def add_layer(self, layer, **kw):
+        """ Add a worldly.layer.Layer, such as one that has been joined to a
+        table with worldly.data """
+        self._build_lod(layer)
+        self.entities.append((layer, kw))
+
+    def add_layer_file(self, filename, mmap=True, **kw):
+        """ Add a layer written by worldly.layerfile.save_layer. The file is
+        memory-mapped unless *mmap* is False, so nothing is parsed and
+        processes drawing the same file share its memory. """
+        t0 = clock()
+        layer = load_layer(filename, mmap=mmap)
+        self._parse_seconds += clock() - t0
+        self._build_lod(layer)
+        self.entities.append((layer, kw))
+
+    def add_topojson_file(self, filename, objects=None, mesh=False, **kw):
+        """ Add contents of a TopoJSON file. See add_topojson. """
+        with open(filename) as f:
+            self.add_topojson(f.read(), objects=objects, mesh=mesh, **kw)
+
+    def add_topojson(self, topology, objects=None, mesh=False, **kw):
+        """ Add the objects of a TopoJSON *topology*, given as a string or as
+        a worldly.topojson.Topology. Arcs are projected once, however many
+        objects or layers use them.
+
+        objects : list of str
+            names of the objects to add. If None, every object is added.
+
+        mesh : bool or str
+            if True, each arc used by an object is drawn once as a line
+            rather than drawing its geometries. If "interior", only the arcs
+            shared by more than one geometry are drawn, and if "exterior",
+            only the arcs that are not shared.
+        """
+        t0 = clock()
+        if not isinstance(topology, Topology):
+            topology = Topology.fromstring(topology)
+        if objects is None:
+            objects = list(topology.objects)
+        layers = [topology.layer(name, mesh=mesh) for name in objects]
+        self._parse_seconds += clock() - t0
+        for layer in layers:
+            self._build_lod(layer)
+            self.entities.append((layer, kw))
+
+    def _build_lod(self, layer):
+        """ Build the level-of-detail pyramid of a newly added layer """
+        if self.lod and self.simplify is not None:
+            if self.cache is None:
+                xy = None
+            else:
+                xy = self.cache.projected(layer, self.projection)
+            layer.lod_pyramid(self.projection, self.simplify, xy)
 
     def add_svg(self, *svgnodes):
         """ Add raw SVGNodes """
@@ -84,26 +347,370 @@ class MapSheet(object):
             else:
                 raise ValueError("{} not an instance of SVGNode".format(node))
 
-    def serialize(self):
-        """ Return an encoded SVG string """
+    def prepare(self, entity, **kw):
+        """ Convert a base layer once for the projection, extent and
+        rendering options of this map sheet, and return a
+        worldly.prepared.PreparedLayer, which can be added to this and other
+        map sheets with add_prepared. The layer is not added to this map
+        sheet.
+
+        *entity* is a Layer or a GeoJSON string, and *kw* are the layer
+        parameters accepted by add_geojson. If the extent of the map is
+        computed from its entities, the layer is included as though it had
+        been added.
+        """
+        if not isinstance(entity, Layer):
+            entity = Layer.from_geojson(picogeojson.fromstring(entity))
+        if self.cache is None:
+            cache = ProjectionCache(max_bytes=None)
+        else:
+            cache = self.cache
+        bbox_p, scale = self._extent(cache, self.entities + [(entity, kw)])
+        _, scalefunc, precision, convert, render_key = \
+            self._render_settings(bbox_p, scale, cache)
+        fragments = [str(node) for node in
+                     _convert_geojson_tuple(entity, scalefunc,
+                                            self.projection, precision,
+                                            **dict(convert, **kw))]
+        bbox = entity.spatial_index(self.projection,
+                                    cache.projected(entity,
+                                                    self.projection)).bbox
+        return PreparedLayer(entity, dict(kw), "".join(fragments), render_key,
+                             bbox, len(fragments))
+
+    def add_prepared(self, *prepared):
+        """ Add layers converted by MapSheet.prepare. A prepared layer is
+        written without conversion when this map sheet's rendering settings
+        match those it was prepared with, and converted again otherwise. """
+        for layer in prepared:
+            if isinstance(layer, PreparedLayer):
+                self.entities.append((layer, {}))
+            else:
+                raise ValueError("{} not an instance of "
+                                 "PreparedLayer".format(layer))
+
+    def clear_fragments(self):
+        """ Discard the fragments kept for incremental serialization, so that
+        every layer is converted again """
+        self._fragments = {}
+
+    def render_tiles(self, zoom_range, out_dir, tile_size=256,
+                     projection=WebMercator, processes=None):
+        """ Render the GeoJSON layers of the map as XYZ tiles in *out_dir*.
+        See worldly.tiles.render_tiles. """
+        return render_tiles(self, zoom_range, out_dir, tile_size=tile_size,
+                            projection=projection, processes=processes)
+
+    def serialize(self, workers=None, stats=None):
+        """ Return an encoded SVG string. See iterserialize for *workers* and
+        *stats*. """
+        return "".join(self.iterserialize(workers=workers, stats=stats))
+
+    def write(self, f, workers=None, compress=False, stats=None):
+        """ Write the encoded SVG document to the file-like object *f*, one
+        element at a time. See iterserialize for *workers* and *stats*.
+
+        *f* may be opened in text or binary mode. If *compress* is True, *f*
+        must be binary, and the document is gzip-compressed as it is written.
+        """
+        binary = _is_binary(f)
+        if compress:
+            if not binary:
+                raise ValueError("compressed output requires a binary file")
+            gz = gzip.GzipFile(fileobj=f, mode="wb", mtime=0)
+            with io.TextIOWrapper(gz, encoding="utf-8") as out:
+                for chunk in self.iterserialize(workers=workers, stats=stats):
+                    out.write(chunk)
+        elif binary:
+            for chunk in self.iterserialize(workers=workers, stats=stats):
+                f.write(chunk.encode("utf-8"))
+        else:
+            for chunk in self.iterserialize(workers=workers, stats=stats):
+                f.write(chunk)
+
+    def iterserialize(self, workers=None, stats=None):
+        """ Generate the encoded SVG document as a sequence of strings. Map
+        entities are converted and encoded one at a time, so that the
+        complete document never needs to be held in memory.
+
+        If *workers* is greater than one, features are converted in chunks by
+        a pool of that many forked processes, which share the projected
+        coordinates with the parent. The output is identical to the serial
+        output. Where forking is unavailable, conversion is serial.
+
+        If *stats* is a worldly.stats.RenderStats, stage timings and counts
+        are added to it. Timings and counts per layer are collected only by
+        serial conversion. *stats_callback* is called after the last string
+        is generated.
+        """
+        loading = [e for e, _ in self.entities if isinstance(e, _PendingLayer)]
+        if len(loading) != 0:
+            raise RuntimeError("{} layers are still loading; await "
+                               "MapSheet.loaded() first".format(len(loading)))
+
+        if stats is None and self.stats_callback is None:
+            for chunk in self._iterserialize(workers, None):
+                yield chunk
+            return
+
+        if stats is None:
+            stats = RenderStats()
+        t0 = clock()
+        stats.add_time("parse", self._parse_seconds)
+        for chunk in self._iterserialize(workers, stats):
+            stats.output_bytes += encoded_size(chunk)
+            yield chunk
+        stats.add_time("total", clock() - t0)
+        if self.stats_callback is not None:
+            self.stats_callback(stats)
+
+    def _iterserialize(self, workers, stats):
+        if self.cache is None:
+            cache = ProjectionCache(max_bytes=None)
+        else:
+            cache = self.cache
+        t0 = clock()
+        bbox_p, scale = self._extent(cache)
+        if stats is not None:
+            stats.add_time("extent", clock() - t0)
+
+        transform, scalefunc, precision, convert, render_key = \
+            self._render_settings(bbox_p, scale, cache)
+        entities = self._resolve_prepared(render_key)
+
+        symbols = _symbol_definitions(entities,
+                                      *self._map_scale(bbox_p, scale))
+        root = SVGRoot(self.width, self.height)
+        if len(symbols) != 0 or \
+                any(isinstance(entity, SVGUse) for entity, _ in entities):
+            root.declare_xlink()
+        yield root.open_tag()
+
+        if len(self.style) != 0:
+            style = ET.Element("style")
+            style.text = self.style
+            yield ET.tostring(style, encoding="unicode")
 
+        if len(symbols) != 0:
+            defs = SVGNode("defs")
+            yield defs.open_tag()
+            for symbol in symbols:
+                yield symbol
+            yield defs.close_tag()
+
+        g = SVGNode("g", transform=transform)
+        yield g.open_tag()
+
+        if self.incremental:
+            for chunk in self._convert_incremental(entities, workers, stats,
+                                                   render_key, scalefunc,
+                                                   precision, convert):
+                yield chunk
+        elif workers is not None and workers > 1 and \
+                fork_context() is not None:
+            for chunk in _convert_parallel(entities, workers, scalefunc,
+                                           self.projection, precision,
+                                           **convert):
+                yield chunk
+        elif stats is not None:
+            for k, (entity, params) in enumerate(entities):
+                layer_stats = stats.add_layer(k, _entity_name(entity, params))
+                for chunk in _convert_instrumented(entity, layer_stats,
+                                                   scalefunc, self.projection,
+                                                   precision,
+                                                   **dict(convert, **params)):
+                    yield chunk
+                for stage, seconds in layer_stats.stages.items():
+                    stats.add_time(stage, seconds)
+        else:
+            for entity, params in entities:
+                for chunk in _convert_entity(entity, scalefunc,
+                                             self.projection, precision,
+                                             **dict(convert, **params)):
+                    yield chunk
+
+        yield g.close_tag()
+        yield root.close_tag()
+
+    def _map_scale(self, bbox_p, scale):
+        """ Return the scale factors (sx, sy) of the map transform, from map
+        units to pixels """
+        return (self.width / (bbox_p[2]*scale - bbox_p[0]*scale),
+                -self.height / (bbox_p[3]*scale - bbox_p[1]*scale))
+
+    def _render_settings(self, bbox_p, scale, cache):
+        """ Return the map transform, the function scaling projected
+        coordinates, the output precision, the conversion options, and the
+        render key: everything that determines the fragment of a layer,
+        other than the layer and its parameters """
         precision = 1
+        sx, sy = self._map_scale(bbox_p, scale)
+        transform = ("translate({dx1},{dy1}) "
+                     "scale({sx},{sy}) "
+                     "translate({dx0},{dy0})".format(
+                     sx=sx,
+                     sy=sy,
+                     dx1=0.5*self.width,
+                     dy1=0.5*self.height,
+                     dx0=-0.5*(bbox_p[0]*scale + bbox_p[2]*scale),
+                     dy0=-0.5*(bbox_p[1]*scale + bbox_p[3]*scale)))
+
+        def scalefunc(xy):
+            return xy[...,:2] * scale
+
+        clip_bbox = None
+        if self.clip:
+            x0, x1 = sorted((bbox_p[0], bbox_p[2]))
+            y0, y1 = sorted((bbox_p[1], bbox_p[3]))
+            mx = self.clip_margin * (x1 - x0)
+            my = self.clip_margin * (y1 - y0)
+            clip_bbox = (x0 - mx, y0 - my, x1 + mx, y1 + my)
+
+        # convert pixel tolerances to map units
+        pixel = 1.0 / max(abs(sx), abs(sy))
+        tolerance = self.tolerance * pixel
+        min_area = self.min_area / abs(sx * sy)
+
+        lod_tolerance = None
+        if self.lod:
+            lod_tolerance = tolerance / scale
+
+        convert = dict(clip_bbox=clip_bbox,
+                       simplify=self.simplify,
+                       tolerance=tolerance,
+                       min_area=min_area,
+                       cache=cache,
+                       compact=self.compact,
+                       lod_tolerance=lod_tolerance)
+        render_key = (self.projection, scale, precision, clip_bbox,
+                      self.simplify, tolerance, min_area, self.compact,
+                      self.lod)
+        return transform, scalefunc, precision, convert, render_key
+
+    def _resolve_prepared(self, render_key):
+        """ Return the map entities with each prepared layer that does not
+        match *render_key* replaced by its layer, to be converted again """
+        entities = []
+        for entity, params in self.entities:
+            if isinstance(entity, PreparedLayer) and \
+                    entity.render_key != render_key:
+                entities.append((entity.layer, entity.params))
+            else:
+                entities.append((entity, params))
+        return entities
+
+    def _convert_incremental(self, entities, workers, stats, render_key,
+                             scale, precision, convert):
+        """ Generates a fragment for each map entity, reusing the fragments
+        of layers whose parameters and *render_key* match the last
+        serialization. Only the layers that changed are converted, in
+        parallel if *workers* is greater than one. """
+        previous = self._fragments
+        self._fragments = {}
+
+        # a layer may be added more than once, so the nth occurrence of a
+        # layer identifies its fragment
+        keys = []
+        occurrences = {}
+        stale = []
+        for k, (entity, params) in enumerate(entities):
+            if not isinstance(entity, Layer):
+                keys.append(None)       # SVG nodes and streams are not kept
+                continue
+            n = occurrences.get(id(entity), 0)
+            occurrences[id(entity)] = n + 1
+            key = (id(entity), n)
+            keys.append(key)
+            entry = previous.get(key)
+            if entry is not None and entry[0] is entity and \
+                    _params_equal(entry[1], params) and \
+                    entry[2] == render_key:
+                self._fragments[key] = entry
+            else:
+                stale.append(k)
+
+        rendered = {}
+        if workers is not None and workers > 1 and len(stale) != 0 and \
+                fork_context() is not None:
+            parts = dict((k, []) for k in stale)
+            for j, fragment in _convert_parallel_tagged(
+                    [entities[k] for k in stale], workers, scale,
+                    self.projection, precision, **convert):
+                parts[stale[j]].append(fragment)
+            rendered = dict((k, "".join(f)) for k, f in parts.items())
+
+        stale = set(stale)
+        for k, (entity, params) in enumerate(entities):
+            key = keys[k]
+            if key is not None and k not in stale:
+                fragment = self._fragments[key][3]
+                if stats is not None:
+                    layer_stats = stats.add_layer(k, _entity_name(entity,
+                                                                  params))
+                    layer_stats.cached = True
+                    layer_stats.output_bytes = encoded_size(fragment)
+                yield fragment
+                continue
+
+            if k in rendered:
+                fragment = rendered[k]
+            elif stats is not None:
+                layer_stats = stats.add_layer(k, _entity_name(entity, params))
+                fragment = "".join(_convert_instrumented(
+                    entity, layer_stats, scale, self.projection, precision,
+                    **dict(convert, **params)))
+                for stage, seconds in layer_stats.stages.items():
+                    stats.add_time(stage, seconds)
+            else:
+                fragment = "".join(_convert_entity(
+                    entity, scale, self.projection, precision,
+                    **dict(convert, **params)))
 
+            if key is not None:
+                try:
+                    snapshot = copy.deepcopy(params)
+                except (TypeError, copy.Error):
+                    snapshot = None     # never matches, so always converted
+                if snapshot is not None:
+                    self._fragments[key] = (entity, snapshot, render_key,
+                                            fragment)
+            yield fragment
+
+    def _extent(self, cache, entities=None):
+        """ Return the projected bounding box of the map and the scale.
+        *entities* defaults to the map entities. """
+        if entities is None:
+            entities = self.entities
         if self.scale is None:      # compute scale from bbox
             bbox = (-180, -80, 180, 80) if self.bbox is None else self.bbox
             ll = self.projection(bbox[0], bbox[1])
             ur = self.projection(bbox[2], bbox[3])
             bbox_p = (ll[0], ll[1], ur[0], ur[1])
-            d = sqrt((bbox_p[2] - bbox_p[1])**2 + (bbox_p[3] - bbox_p[1])**2)
+            d = sqrt((bbox_p[2] - bbox_p[0])**2 + (bbox_p[3] - bbox_p[1])**2)
             L = sqrt(self.width**2 + self.height**2)
             scale = L/d
 
         else:                       # compute bbox from scale
             scale = self.scale
 
-            _bboxes = [projected_bbox(entity, self.projection)
-                       for entity, _ in self.entities
-                       if not isinstance(entity, SVGNode)]
+            _bboxes = [entity.spatial_index(self.projection,
+                                            cache.projected(entity,
+                                                            self.projection)).bbox
+                       for entity, _ in entities
+                       if isinstance(entity, Layer)]
+            _bboxes.extend(entity.projected_bbox(self.projection)
+                           for entity, _ in entities
+                           if isinstance(entity, GeoJSONStream))
+            for entity, _ in entities:
+                if not isinstance(entity, PreparedLayer):
+                    continue
+                elif entity.projection is self.projection:
+                    _bboxes.append(entity.bbox)
+                else:
+                    xy = cache.projected(entity.layer, self.projection)
+                    _bboxes.append(entity.layer.spatial_index(self.projection,
+                                                              xy).bbox)
+            _bboxes = [bb for bb in _bboxes if bb is not None]
             _bbox_p = (min(bb[0] for bb in _bboxes),
                        min(bb[1] for bb in _bboxes),
                        max(bb[2] for bb in _bboxes),
@@ -122,55 +729,305 @@ class MapSheet(object):
                 dx = 0.5 * (abs(bbox_p[3]-bbox_p[1]) / map_aspect - (bbox_p[2]-bbox_p[0]))
                 bbox_p = (bbox_p[0]-dx, bbox_p[1], bbox_p[2]+dx, bbox_p[3])
 
-        transform = ("translate({dx1},{dy1}) "
-                     "scale({sx},{sy}) "
-                     "translate({dx0},{dy0})".format(
-                     sx=self.width / (bbox_p[2]*scale - bbox_p[0]*scale),
-                     sy=-self.height / (bbox_p[3]*scale - bbox_p[1]*scale),
-                     dx1=0.5*self.width,
-                     dy1=0.5*self.height,
-                     dx0=-0.5*(bbox_p[0]*scale + bbox_p[2]*scale),
-                     dy0=-0.5*(bbox_p[1]*scale + bbox_p[3]*scale)))
+        return bbox_p, scale
 
-        def scalefunc(xy):
-            return [a*scale for a in xy[:2]]
+# the conversion in progress, shared with forked workers (see fork_context)
+_parallel_job = None
 
-        svgs = []
-        for entity, params in self.entities:
-            if isinstance(entity, SVGNode):
-                svgs.append(entity)
+
+def _convert_parallel(entities, workers, scale, projection, precision,
+                      **kw):
+    """ Converts map entities to encoded SVG fragments in a pool of forked
+    processes. Fragments are generated in the same order as by the serial
+    conversion. See _convert_geojson_tuple for parameters.
+    """
+    for _, fragment in _convert_parallel_tagged(entities, workers, scale,
+                                                projection, precision, **kw):
+        yield fragment
+
+
+def _convert_parallel_tagged(entities, workers, scale, projection, precision,
+                             clip_bbox=None, cache=None, **kw):
+    """ Like _convert_parallel, but generates (k, fragment) tuples, where *k*
+    is the position in *entities* of the entity that *fragment* draws """
+    global _parallel_job
+
+    if cache is None:
+        cache = ProjectionCache(max_bytes=None)
+
+    # project coordinates and select features before forking so that workers
+    # inherit them, even if the cache cannot keep them. A task is a range of
+    # the selected features of a layer.
+    layers = []
+    coords = []
+    selected = []
+    tasks = []
+    for k, (entity, params) in enumerate(entities):
+        if isinstance(entity, (SVGNode, GeoJSONStream, PreparedLayer)):
+            layers.append(entity)
+            coords.append(None)
+            selected.append(None)
+            tasks.append((k, None))
+            continue
+        layer = entity if isinstance(entity, Layer) else Layer.from_geojson(entity)
+        xy = cache.projected(layer, projection)
+        if kw.get("lod_tolerance") is not None and \
+                kw.get("simplify") is not None:
+            layer.lod_pyramid(projection, kw["simplify"], xy)
+        if clip_bbox is None:
+            features = list(range(len(layer)))
+        else:
+            features = layer.spatial_index(projection, xy).query(clip_bbox).tolist()
+        layers.append(layer)
+        coords.append(xy)
+        selected.append(features)
+        size = max(1, len(features) // (4 * workers))
+        for i in range(0, len(features), size):
+            tasks.append((k, (i, i+size)))
+
+    _parallel_job = (layers, coords, selected,
+                     [params for _, params in entities],
+                     (scale, projection, precision),
+                     dict(kw, clip_bbox=clip_bbox, cache=cache))
+    try:
+        with fork_context().Pool(workers) as pool:
+            # streamed entities are read and prepared layers are written by
+            # the parent, between runs of tasks for the other entities
+            run = []
+            for task in tasks + [None]:
+                if task is None or isinstance(layers[task[0]],
+                                              (GeoJSONStream, PreparedLayer)):
+                    results = zip(run, pool.imap(_convert_chunk, run))
+                    for k, group in groupby(results, lambda r: r[0][0]):
+                        params = entities[k][1]
+                        if params.get("batch", False):
+                            # workers return unmerged paths, which are
+                            # batched across chunks here
+                            nodes = (node for _, nodes in group
+                                     for node in nodes)
+                            for path in _batch_paths(
+                                    nodes, params.get("max_batch_vertices",
+                                                      10000)):
+                                yield k, str(path)
+                        else:
+                            for _, fragment in group:
+                                yield k, fragment
+                    run = []
+                    if task is not None:
+                        for fragment in _convert_entity(
+                                layers[task[0]], scale, projection, precision,
+                                **dict(kw, clip_bbox=clip_bbox,
+                                       **entities[task[0]][1])):
+                            yield task[0], fragment
+                else:
+                    run.append(task)
+    finally:
+        _parallel_job = None
+
+
+def _convert_chunk(task):
+    k, span = task
+    layers, coords, selected, params, args, kw = _parallel_job
+    if span is None:
+        return str(layers[k])
+    features = selected[k][span[0]:span[1]]
+    if params[k].get("batch", False):
+        return list(_convert_geojson_tuple(layers[k], *args, features=features,
+                                           coords=coords[k],
+                                           **dict(kw, **dict(params[k],
+                                                             batch=False))))
+    return "".join(str(node) for node in
+                   _convert_geojson_tuple(layers[k], *args, features=features,
+                                          coords=coords[k],
+                                          **dict(kw, **params[k])))
+
+
+class _PendingLayer(object):
+    """ Placeholder for a layer that is being fetched """
+
+    def __init__(self, url):
+        self.url = url
+
+    def __repr__(self):
+        return "<_PendingLayer {}>".format(self.url)
+
+
+def _parse_geojson_bytes(body):
+    t0 = clock()
+    layer = Layer.from_geojson(picogeojson.fromstring(body.decode("utf-8")))
+    return layer, clock() - t0
+
+
+def _convert_entity(entity, scale, projection, precision, **kw):
+    """ Converts any map entity to encoded SVG fragments. See
+    _convert_geojson_tuple for parameters. """
+    if isinstance(entity, SVGNode):
+        yield str(entity)
+    elif isinstance(entity, PreparedLayer):
+        yield entity.fragment
+    elif isinstance(entity, GeoJSONStream):
+        for fragment in _convert_stream(entity, scale, projection, precision,
+                                        **kw):
+            yield fragment
+    else:
+        for node in _convert_geojson_tuple(entity, scale, projection,
+                                           precision, **kw):
+            yield str(node)
+
+
+def _entity_name(entity, params):
+    if isinstance(entity, PreparedLayer):
+        params = entity.params
+    if "class_name" in params:
+        return params["class_name"]
+    return type(entity).__name__
+
+
+def _convert_instrumented(entity, layer_stats, scale, projection, precision,
+                          clip_bbox=None, cache=None, **kw):
+    """ Converts a map entity to encoded SVG fragments like the serial
+    conversion, recording timings and counts in *layer_stats*. See
+    _convert_geojson_tuple for parameters. """
+    stages = layer_stats.stages
+
+    if isinstance(entity, SVGNode):
+        t0 = clock()
+        fragment = str(entity)
+        stages["encoding"] += clock() - t0
+        layer_stats.paths += 1
+        layer_stats.output_bytes += encoded_size(fragment)
+        yield fragment
+        return
+
+    if isinstance(entity, PreparedLayer):
+        layer_stats.features = len(entity)
+        layer_stats.paths = entity.paths
+        layer_stats.output_bytes = encoded_size(entity.fragment)
+        layer_stats.cached = True
+        yield entity.fragment
+        return
+
+    if isinstance(entity, GeoJSONStream):
+        # temporary layers get their own cache, so that their projection is
+        # timed separately and not kept, and like _convert_stream, they have
+        # no level-of-detail pyramids
+        layers = ((layer, ProjectionCache(max_bytes=None))
+                  for layer in entity.layers())
+        kw = dict(kw, lod_tolerance=None)
+    else:
+        layers = [(entity, cache)]
+
+    for layer, layer_cache in layers:
+        t0 = clock()
+        xy = layer_cache.projected(layer, projection)
+        t1 = clock()
+        if clip_bbox is None:
+            features = np.arange(len(layer))
+        else:
+            features = layer.spatial_index(projection, xy).query(clip_bbox)
+        t2 = clock()
+        stages["projection"] += t1 - t0
+        stages["selection"] += t2 - t1
+
+        starts = layer.ring_offsets[layer.part_offsets[
+                    layer.geom_offsets[layer.feature_offsets]]]
+        layer_stats.features += len(layer)
+        layer_stats.features_selected += len(features)
+        layer_stats.vertices_in += int((starts[features+1] -
+                                        starts[features]).sum())
+
+        nodes = _convert_geojson_tuple(layer, scale, projection, precision,
+                                       clip_bbox=clip_bbox, cache=layer_cache,
+                                       features=features.tolist(), **kw)
+        while True:
+            t0 = clock()
+            try:
+                node = next(nodes)
+            except StopIteration:
+                stages["conversion"] += clock() - t0
+                break
+            t1 = clock()
+            fragment = str(node)
+            t2 = clock()
+            stages["conversion"] += t1 - t0
+            stages["encoding"] += t2 - t1
+            layer_stats.paths += 1
+            if isinstance(node, SVGPath):
+                layer_stats.vertices_out += sum(len(ring)
+                                                for ring in node.vertices)
             else:
-                g = _convert_geojson_tuple(entity, scalefunc, self.projection,
-                                           precision, **params)
-                svgs.extend(g)
+                layer_stats.vertices_out += 1
+            layer_stats.output_bytes += encoded_size(fragment)
+            yield fragment
 
-        root = SVGRoot(self.width, self.height).svg()
-        g = SVGNode("g", transform=transform).svg()
 
-        for item in svgs:
-            g.append(item.svg())
+def _is_binary(f):
+    """ Guess whether a file-like object accepts bytes rather than str """
+    if isinstance(f, io.TextIOBase):
+        return False
+    if isinstance(f, (io.RawIOBase, io.BufferedIOBase)):
+        return True
+    return "b" in getattr(f, "mode", "")
 
-        if len(self.style) != 0:
-            style = ET.Element("style")
-            style.text = self.style
-            root.append(style)
 
-        root.append(g)
-        return ET.tostring(root, encoding="unicode")
+def _convert_stream(stream, scale, projection, precision, cache=None,
+                    lod_tolerance=None, **kw):
+    """ Converts the features of a GeoJSONStream to encoded SVG fragments,
+    one Layer of features at a time. Temporary layers are never cached, and
+    have no level-of-detail pyramids. See _convert_geojson_tuple for
+    parameters. """
+    for layer in stream.layers():
+        for node in _convert_geojson_tuple(layer, scale, projection,
+                                           precision, **kw):
+            yield str(node)
+
 
-def _convert_geojson_tuple(geojson, scale, projection, precision, **kw):
-    """ Converts a picogeojson namedtuple to a list of SVGNode instances
+def _convert_geojson_tuple(geojson, scale, projection, precision,
+                           clip_bbox=None, simplify=None, tolerance=0.0,
+                           min_area=0.0, cache=None, coords=None,
+                           features=None, compact=False, batch=False,
+                           max_batch_vertices=10000, lod_tolerance=None,
+                           **kw):
+    """ Converts a Layer or picogeojson namedtuple to SVGNode instances,
+    generated one feature at a time
 
     arguments
     ---------
-    geojson : picogeojson namedtuple
+    geojson : Layer or picogeojson namedtuple
         geometry, feature, or featurecollection to convert
     scale : function
-        rescales projected coordinates to map space
+        rescales an array of projected coordinates to map space
     projection : function
         projects geographical coordinates to cartesian coordinates
     precision : float
         number of decimal places to retain in svg coordinates
+    clip_bbox : tuple of 4 floats, optional
+        bounding box (xmin, ymin, xmax, ymax) in projected coordinates.
+        Features outside of it are skipped using the layer spatial index, and
+        features crossing it are clipped.
+    simplify : str, optional
+        simplification method, "douglas-peucker" or "visvalingam"
+    tolerance : float
+        simplification tolerance in map units
+    min_area : float
+        minimum polygon ring area in square map units
+    cache : ProjectionCache, optional
+        source of projected coordinates
+    coords : (n, 2) array, optional
+        projected layer coordinates, which replace those from *cache*
+    features : list of int, optional
+        indices of the features to convert, which replace the selection by
+        *clip_bbox*
+    compact : bool
+        if True, paths use the compact relative encoding
+    batch : bool
+        if True, features that end up with identical attributes are merged
+        into multi-subpath paths (see _batch_paths)
+    max_batch_vertices : int
+        maximum number of vertices in a merged path
+    lod_tolerance : float, optional
+        *tolerance* in projected units. If given, lines and rings are
+        simplified starting from the level-of-detail pyramid of the layer.
 
     keyword arguments
     -----------------
@@ -178,126 +1035,357 @@ def _convert_geojson_tuple(geojson, scale, projection, precision, **kw):
         used as class attribute
     id_name : str
         used as id attribute
+    symbol : str or SVGNode
+        if "circle", points are drawn as circles of radius *symbol_size*,
+        which an "r" entry of *static_params* or *dynamic_params* overrides.
+        If an SVGNode, it is defined once in the document and each point
+        places a copy of it with a <use> element. Symbol definitions cancel
+        the map transform, so symbols are drawn upright and sized in pixels.
+        By default, points are drawn as zero-length paths, sized by their
+        stroke width.
+    symbol_size : float
+        radius of circle symbols
+    feature_params : dict
+        maps attribute names to sequences with a value for each feature of
+        the layer, such as the colours returned by worldly.data.choropleth.
+        None leaves the attribute unset. Numeric arrays are formatted in
+        bulk.
     """
     static_params = kw.get("static_params", {})
     dynamic_params = kw.get("dynamic_params", {})
     scales = kw.get("scales", {})
     class_name = kw.get("class_name", None)
     id_name = kw.get("id_name", None)
+    symbol = kw.get("symbol", None)
+    symbol_size = kw.get("symbol_size", 1.0)
+    feature_params = kw.get("feature_params", {})
+    if symbol is not None and symbol != "circle" and \
+            not isinstance(symbol, SVGNode):
+        raise ValueError("unknown symbol '{}'".format(symbol))
 
-    pending = [geojson]
-    results = []
-    while len(pending) != 0:
-
-        geojson = pending[0]
-        pending = pending[1:]
-
-        if type(geojson).__name__ == "FeatureCollection":
-            pending.extend(geojson.features)
-        elif type(geojson).__name__ == "Feature":
-            intermediate = _geometry_to_svg(geojson.geometry,
-                                            scale, projection,
-                                            precision=precision,
-                                            class_name=class_name,
-                                            id_name=id_name)
-            _set_attrs(intermediate, static_params, scales)
+    if isinstance(geojson, Layer):
+        layer = geojson
+    else:
+        layer = Layer.from_geojson(geojson)
+    if coords is not None:
+        xy = coords
+    elif cache is None:
+        xy = layer.projected(projection)
+    else:
+        xy = cache.projected(layer, projection)
+
+    if features is None and clip_bbox is None:
+        features = range(len(layer))
+    elif features is None:
+        features = layer.spatial_index(projection, xy).query(clip_bbox).tolist()
+
+    if len(feature_params) != 0:
+        feature_params = _feature_strings(feature_params, len(layer))
+
+    lod = None
+    if lod_tolerance is not None and simplify is not None:
+        pyramid = layer.lod_pyramid(projection, simplify, xy)
+        lod = (pyramid, pyramid.level(lod_tolerance), lod_tolerance)
+
+    nodes = _convert_features(layer, xy, features, scale, precision,
+                              class_name, id_name, clip_bbox, simplify,
+                              tolerance, min_area, compact,
+                              static_params, dynamic_params, scales, lod,
+                              symbol, symbol_size, feature_params)
+    if batch:
+        nodes = _batch_paths(nodes, max_batch_vertices)
+    for node in nodes:
+        yield node
+
+
+def _convert_features(layer, xy, features, scale, precision, class_name,
+                      id_name, clip_bbox, simplify, tolerance, min_area,
+                      compact, static_params, dynamic_params, scales,
+                      lod=None, symbol=None, symbol_size=1.0,
+                      feature_params=None):
+    """ Generates an SVGNode for each geometry of the selected features, with
+    attributes set. See _convert_geojson_tuple for parameters. """
+    for i in features:
+        properties = layer.properties[i]
+        intermediate = [_geometry_to_svg(layer, xy, j, scale,
+                                         precision=precision,
+                                         class_name=class_name,
+                                         id_name=id_name,
+                                         clip_bbox=clip_bbox,
+                                         simplify=simplify,
+                                         tolerance=tolerance,
+                                         min_area=min_area,
+                                         compact=compact,
+                                         lod=lod,
+                                         symbol=symbol,
+                                         symbol_size=symbol_size)
+                        for j in layer.feature_geometries(i)]
+        # symbols return a node for each point of a multipoint
+        intermediate = [node for nodes in intermediate if nodes is not None
+                        for node in (nodes if isinstance(nodes, list)
+                                     else [nodes])]
+        _set_attrs(intermediate, static_params, scales)
+        if properties is not None:
             _set_attrs_from_properties(intermediate, dynamic_params, scales,
-                                       geojson.properties)
-            results.extend(intermediate)
+                                       properties)
+        if feature_params:
+            for k, values in feature_params.items():
+                if values[i] is not None:
+                    for node in intermediate:
+                        node.attrs[k] = values[i]
+        for node in intermediate:
+            yield node
+
+
+def _batch_paths(paths, max_vertices):
+    """ Merges SVGPaths with identical attributes and encoding into
+    multi-subpath paths of up to *max_vertices* vertices, unless a single
+    path is larger. A merged path is generated when it is full or after the
+    last path, so merged paths are drawn in order of completion rather than
+    in the order of the features they contain. """
+    batches = OrderedDict()
+    for path in paths:
+        if not isinstance(path, SVGPath):
+            yield path
+            continue
+        key = (path.closed, path.compact, path.precision,
+               tuple(sorted(path.attrs.items())))
+        n = sum(len(ring) for ring in path.vertices)
+        batch = batches.get(key)
+        if batch is not None and batch[1] + n > max_vertices:
+            full, _, rings = batches.pop(key)
+            full.vertices = rings
+            yield full
+            batch = None
+        if batch is None:
+            batches[key] = [path, n, list(path.vertices)]
         else:
-            intermediate = _geometry_to_svg(geojson,
-                                            scale, projection,
-                                            precision=precision,
-                                            class_name=class_name,
-                                            id_name=id_name)
-            _set_attrs(intermediate, static_params, scales)
-            results.extend(intermediate)
+            batch[1] += n
+            batch[2].extend(path.vertices)
+    for path, _, rings in batches.values():
+        path.vertices = rings
+        yield path
 
-    return results
+def _geometry_to_svg(layer, xy, index, scale, precision=6,
+                     class_name=None, id_name=None, clip_bbox=None,
+                     simplify=None, tolerance=0.0, min_area=0.0,
+                     compact=False, lod=None, symbol=None, symbol_size=1.0):
+    """ Converts geometry *index* of a Layer to an SVGNode instance, or to a
+    list of SVGNodes for point symbols, taking vertices from the projected
+    coordinate array *xy*. Returns None if nothing remains after clipping
+    and simplification. See _convert_geojson_tuple for parameters. *lod* is
+    None or a tuple of a LODPyramid, the level to use and the tolerance in
+    projected units.
+    """
+    geomtype = layer.geom_types[index]
+    rings = []
+    outer = []
+    method = simplify
+    if lod is None or geomtype in (POINT, MULTIPOINT):
+        for part in layer.geometry_parts(index):
+            for k, (a, b) in enumerate(part):
+                rings.append(xy[a:b])
+                outer.append(k == 0)
+    else:
+        # simplify now, taking the vertices the pyramid keeps
+        pyramid, level, lod_tolerance = lod
+        p0, p1 = layer.geom_offsets[index], layer.geom_offsets[index+1]
+        for p in range(p0, p1):
+            r0, r1 = layer.part_offsets[p], layer.part_offsets[p+1]
+            for r in range(r0, r1):
+                rings.append(xy[pyramid.ring(r, level, lod_tolerance)])
+                outer.append(r == r0)
+        method = None
+
+    if clip_bbox is not None and len(rings) != 0:
+        start, stop = _coordinate_span(layer, index)
+        gverts = xy[start:stop]
+        if len(gverts) != 0:
+            gbbox = gverts.min(axis=0).tolist() + gverts.max(axis=0).tolist()
+            if not bbox_contains(clip_bbox, gbbox):
+                rings, outer = _clip_rings(rings, outer, geomtype, clip_bbox)
+                if len(rings) == 0:
+                    return None
+
+    rings = [scale(ring) for ring in rings]
+
+    if (simplify is not None or min_area > 0) and \
+            geomtype not in (POINT, MULTIPOINT):
+        rings = _simplify_rings(rings, outer, geomtype, precision,
+                                method, tolerance, min_area)
+        if len(rings) == 0:
+            return None
+
+    if geomtype in (POINT, MULTIPOINT) and symbol == "circle":
+        return [SVGCircle(ring[0].tolist(), symbol_size,
+                          precision=precision,
+                          class_name=class_name,
+                          id_name=id_name) for ring in rings]
+
+    elif geomtype in (POINT, MULTIPOINT) and symbol is not None:
+        href = "#" + _symbol_id(symbol)
+        return [SVGUse(href, ring[0].tolist(),
+                       precision=precision,
+                       class_name=class_name,
+                       id_name=id_name) for ring in rings]
+
+    elif geomtype in (POINT, MULTIPOINT):
+        return SVGPath(rings,
+                       closed=True,
+                       stroke_linecap="round",
+                       compact=compact,
+                       precision=precision,
+                       class_name=class_name,
+                       id_name=id_name)
 
-def _geometry_to_svg(geojson, scale, projection, precision=6,
-                     class_name=None, id_name=None):
-    """ Converts a picogeojson Geometry to a list of SVGNode instances.
-    See _convert_geojson_tuple for parameters
+    elif geomtype == LINESTRING:
+        return SVGPath(rings,
+                       compact=compact,
+                       precision=precision,
+                       class_name=class_name,
+                       id_name=id_name)
+
+    elif geomtype == MULTILINESTRING:
+        return SVGPath(rings,
+                       compact=compact,
+                       precision=precision,
+                       class_name=class_name,
+                       id_name=id_name)
+
+    elif geomtype in (POLYGON, MULTIPOLYGON):
+        return SVGPath(rings,
+                       closed=True,
+                       compact=compact,
+                       precision=precision,
+                       class_name=class_name,
+                       id_name=id_name)
+
+    else:
+        raise NotImplementedError("geometry type code '{}' not handled".format(geomtype))
+
+
+def _symbol_id(symbol):
+    """ Return the id of a symbol node, which is its id attribute or is
+    derived from its content """
+    if "id" in symbol.attrs:
+        return symbol.attrs["id"]
+    return "symbol-" + hashlib.sha1(str(symbol).encode("utf-8")).hexdigest()[:8]
+
+
+def _symbol_definitions(entities, sx, sy):
+    """ Return the encoded symbol definitions used by map entities, once
+    each. A definition is a group, with the symbol id, that holds the symbol
+    node and cancels the map scale factors *sx* and *sy*, including any
+    flip, so that each <use> draws the symbol upright and in pixel units.
     """
+    definitions = OrderedDict()
+    for entity, params in entities:
+        if isinstance(entity, PreparedLayer):
+            params = entity.params
+        symbol = params.get("symbol", None)
+        if isinstance(symbol, SVGNode):
+            symbol_id = _symbol_id(symbol)
+            if symbol_id not in definitions:
+                node = copy.copy(symbol)
+                node.attrs = dict(symbol.attrs)
+                node.attrs.pop("id", None)
+                group = SVGNode("g", id_name=symbol_id,
+                                transform="scale({:.6g},{:.6g})".format(
+                                    1.0/sx, 1.0/sy))
+                definitions[symbol_id] = group.open_tag() + str(node) + \
+                    group.close_tag()
+    return list(definitions.values())
+
+
+def _coordinate_span(layer, index):
+    """ Returns the range of coordinates belonging to geometry *index* """
+    p0, p1 = layer.geom_offsets[index], layer.geom_offsets[index+1]
+    return (layer.ring_offsets[layer.part_offsets[p0]],
+            layer.ring_offsets[layer.part_offsets[p1]])
+
+
+def _clip_rings(rings, outer, geomtype, bbox):
+    """ Clips the rings of a geometry to *bbox*, discarding empty results.
+    *outer* flags the rings that begin a part, and is returned updated along
+    with the clipped rings. """
+    if geomtype in (POINT, MULTIPOINT):
+        clipped = [ring if len(clip_points(ring, bbox)) != 0 else ring[:0]
+                   for ring in rings]
+    elif geomtype in (LINESTRING, MULTILINESTRING):
+        clipped = [piece for ring in rings for piece in clip_line(ring, bbox)]
+        outer = [True for _ in clipped]
+    else:
+        clipped = [clip_polygon(ring, bbox) for ring in rings]
+    keep = [len(ring) != 0 for ring in clipped]
+    return ([ring for ring, k in zip(clipped, keep) if k],
+            [o for o, k in zip(outer, keep) if k])
+
+
+def _simplify_rings(rings, outer, geomtype, precision, method, tolerance,
+                    min_area):
+    """ Simplifies the rings of a line or polygon geometry, rounds them to
+    *precision*, and removes duplicate vertices. Degenerate rings are
+    dropped, and polygon rings smaller than *min_area* are dropped along with
+    the holes that follow them. """
+    closed = geomtype in (POLYGON, MULTIPOLYGON)
     results = []
-    pending = [geojson]
-    while len(pending) != 0:
-        geojson = pending[0]
-        pending = pending[1:]
-
-        if type(geojson).__name__ == "Point":
-            vert = scale(projection(*geojson.coordinates[:2]))
-            results.append(SVGPath([[vert]],
-                                   closed=True,
-                                   stroke_linecap="round",
-                                   precision=precision,
-                                   class_name=class_name,
-                                   id_name=id_name))
-
-        elif type(geojson).__name__ == "LineString":
-            verts = [scale(projection(*xy[:2])) for xy in geojson.coordinates]
-            results.append(SVGPath([verts], class_name=class_name,
-                                            id_name=id_name))
-
-        elif type(geojson).__name__ == "Polygon":
-            ring_list = []
-            for ring in geojson.coordinates:
-                verts = [scale(projection(*xy[:2])) for xy in ring]
-                ring_list.append(verts)
-            results.append(SVGPath(ring_list,
-                                   closed=True,
-                                   precision=precision,
-                                   class_name=class_name,
-                                   id_name=id_name))
-
-        elif type(geojson).__name__ == "MultiPoint":
-            verts = []
-            for xy in geojson.coordinates:
-                v = scale(projection(*xy[:2]))
-                verts.append(v)
-            verts_listed = [[v] for v in verts]
-            results.append(SVGPath(verts_listed,
-                                   closed=True,
-                                   stroke_linecap="round",
-                                   precision=precision,
-                                   class_name=class_name,
-                                   id_name=id_name))
-
-        elif type(geojson).__name__ == "MultiLineString":
-            linestrings = []
-            for ls in geojson.coordinates:
-                v = [scale(projection(*xy[:2])) for xy in ls]
-                linestrings.append(v)
-            results.append(SVGPath(linestrings,
-                                   precision=precision,
-                                   class_name=class_name,
-                                   id_name=id_name))
-
-        elif type(geojson).__name__ == "MultiPolygon":
-            poly_list = []
-            for poly in geojson.coordinates:
-                ring_list = []
-                for ring in poly:
-                    verts = [scale(projection(*xy[:2])) for xy in ring]
-                    ring_list.append(verts)
-                poly_list.extend(ring_list)
-            results.append(SVGPath(poly_list,
-                                   closed=True,
-                                   precision=precision,
-                                   class_name=class_name,
-                                   id_name=id_name))
-
-        elif type(geojson).__name__ == "GeometryCollection":
-            for g in geojson.geometries:
-                pending.append(g)
+    keep_part = True
+    for ring, is_outer in zip(rings, outer):
+        if is_outer:
+            keep_part = True
+        elif not keep_part:
+            continue
 
-        else:
-            raise NotImplementedError("'{}' not handled".format(type(geojson)))
+        if method is not None and len(ring) > 2:
+            ring = ring[simplify_vertices(ring, tolerance, method)]
+        ring = drop_duplicates(np.round(ring, precision))
 
+        if closed and (len(ring) < 4 or
+                       (min_area > 0 and ring_area(ring) < min_area)):
+            keep_part = not is_outer
+            continue
+        elif not closed and len(ring) < 2:
+            continue
+        results.append(ring)
     return results
 
 
+def _feature_strings(feature_params, nfeatures):
+    """ Return *feature_params* with every sequence converted to a list of
+    strings or None """
+    converted = {}
+    for k, values in feature_params.items():
+        if len(values) != nfeatures:
+            raise ValueError("feature_params['{}'] has {} values for {} "
+                             "features".format(k, len(values), nfeatures))
+        if isinstance(values, np.ndarray) and values.dtype.kind in "fiub":
+            strings = values.astype(str).astype(object)
+            if values.dtype.kind == "f":
+                strings[np.isnan(values)] = None
+            converted[k] = strings.tolist()
+        else:
+            converted[k] = [v if v is None or isinstance(v, str) else str(v)
+                            for v in values]
+    return converted
+
+
+def _params_equal(a, b):
+    """ Compare layer parameters, which may contain arrays """
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return isinstance(a, np.ndarray) and isinstance(b, np.ndarray) and \
+            a.shape == b.shape and a.dtype == b.dtype and \
+            bool(np.all((a == b) | ((a != a) & (b != b))))
+    elif isinstance(a, SVGNode) and isinstance(b, SVGNode):
+        return type(a) is type(b) and str(a) == str(b)
+    elif isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_params_equal(a[k], b[k])
+                                            for k in a)
+    elif isinstance(a, (list, tuple)) and type(a) is type(b):
+        return len(a) == len(b) and all(_params_equal(u, v)
+                                        for u, v in zip(a, b))
+    return bool(a == b)
+
+
 def _set_attrs(geoms, params, scales):
     for k, v in params.items():
         func = scales.get(k, lambda a: a)
@@ -332,7 +1420,9 @@ def apply_index_nested(coordinates, func, idx):
         return func(apply_index_nested(crds, func, idx) for crds in coordinates)
 
 def projected_bbox(geojson, projection):
-    if type(geojson).__name__ == "Point":
+    if isinstance(geojson, Layer):
+        bbox = geojson.bbox(geojson.projected(projection))
+    elif type(geojson).__name__ == "Point":
         pcrds = project_nested(geojson.coordinates, projection)
         bbox = (pcrds[0], pcrds[1], pcrds[0], pcrds[1])
     elif hasattr(geojson, "coordinates"):
@@ -0,0 +1,55 @@
+""" Base layers converted once and spliced into many map sheets """
+
+
+class PreparedLayer(object):
+    """ A layer that has been converted to SVG for one projection, scale,
+    clipping region and set of rendering options. Create it with
+    MapSheet.prepare and add it to any number of map sheets with
+    MapSheet.add_prepared.
+
+    A map sheet whose rendering settings match those of the sheet that
+    prepared the layer writes the encoded fragment as it is, without
+    projecting or converting the layer. Map sheets with the same
+    projection, dimensions, *bbox* and options as the preparing sheet
+    match. Otherwise the layer is converted as if it had been added
+    normally.
+
+    layer : Layer
+        the layer that was converted
+
+    params : dict
+        the parameters the layer was converted with, such as class_name
+
+    fragment : str
+        the encoded SVG elements drawing the layer
+
+    render_key : tuple
+        the rendering settings that the fragment is valid for
+
+    bbox : tuple of 4 floats
+        bounding box of the layer in projected coordinates, or None if the
+        layer is empty
+
+    paths : int
+        number of SVG elements in the fragment
+    """
+
+    def __init__(self, layer, params, fragment, render_key, bbox, paths):
+        self.layer = layer
+        self.params = params
+        self.fragment = fragment
+        self.render_key = render_key
+        self.bbox = bbox
+        self.paths = paths
+
+    def __repr__(self):
+        return "<PreparedLayer features={} paths={} bytes={}>".format(
+            len(self.layer), self.paths, len(self.fragment))
+
+    def __len__(self):
+        """ Number of features """
+        return len(self.layer)
+
+    @property
+    def projection(self):
+        return self.render_key[0]
@@ -1,10 +1,16 @@
 """ Implements coordinate projections """
 
 import math
-from math import sin, cos, tan, acos, asin, sqrt, pi
+from math import sin, cos, tan, atan, atan2, acos, asin, exp, sqrt, pi
+import numpy as np
 
 
 class Projection(object):
+    """ Base class for projections. Subclasses implement scalar *project* and
+    *inverse* methods, and may override *project_array* and *inverse_array*
+    with vectorized versions. The default array methods fall back to calling
+    the scalar methods once per vertex.
+    """
 
     def __call__(self, *args):
         return self.project(*args)
@@ -12,17 +18,56 @@ class Projection(object):
     def project(self, lon, lat):
         return lon, lat
 
+    def inverse(self, x, y):
+        return x, y
+
+    def project_array(self, lons, lats):
+        """ Project arrays of longitudes and latitudes, returning arrays of x
+        and y """
+        return _apply_scalar(self.project, lons, lats)
+
+    def inverse_array(self, xs, ys):
+        """ Inverse-project arrays of x and y, returning arrays of longitudes
+        and latitudes """
+        return _apply_scalar(self.inverse, xs, ys)
+
 
 class SphericalMercator(Projection):
+    """ Spherical Mercator projection. Latitudes are clamped to
+    +/-MAX_LATITUDE, the limit of the square Web Mercator world, because the
+    poles project to infinity. """
+
+    MAX_LATITUDE = 85.0511287798
 
     def __init__(self, R):
         self.R = R
 
     def project(self, lon, lat):
+        lat = min(max(lat, -self.MAX_LATITUDE), self.MAX_LATITUDE)
         x = self.R / pi * (lon*pi/180.0 + pi)
         y = self.R / pi * (pi - math.log(tan(pi * (0.25 + lat/360))))
         return x, y
 
+    def inverse(self, x, y):
+        lon = (x * pi / self.R - pi) * 180.0 / pi
+        lat = (atan(exp(pi - y * pi / self.R)) / pi - 0.25) * 360
+        return lon, lat
+
+    def project_array(self, lons, lats):
+        lons = np.asarray(lons, dtype=np.float64)
+        lats = np.clip(np.asarray(lats, dtype=np.float64),
+                       -self.MAX_LATITUDE, self.MAX_LATITUDE)
+        x = self.R / pi * (np.radians(lons) + pi)
+        y = self.R / pi * (pi - np.log(np.tan(pi * (0.25 + lats/360))))
+        return x, y
+
+    def inverse_array(self, xs, ys):
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        lons = np.degrees(xs * pi / self.R - pi)
+        lats = (np.arctan(np.exp(pi - ys * pi / self.R)) / pi - 0.25) * 360
+        return lons, lats
+
 
 class SphericalStereographic(Projection):
 
@@ -43,6 +88,95 @@ class SphericalStereographic(Projection):
                  sin(phi1) * cos(phi) * cos(lamda-lamda0))
         return x, y
 
+    def inverse(self, x, y):
+        lamda0 = self.lon0 * pi / 180.0
+        phi1 = self.lat1   * pi / 180.0
+        rho = sqrt(x*x + y*y)
+        if rho == 0:
+            return self.lon0, self.lat1
+        c = 2 * atan(rho / (2 * self.k0))
+        phi = asin(cos(c) * sin(phi1) + y * sin(c) * cos(phi1) / rho)
+        lamda = lamda0 + atan2(x * sin(c),
+                               rho * cos(phi1) * cos(c) - y * sin(phi1) * sin(c))
+        return lamda * 180.0 / pi, phi * 180.0 / pi
+
+    def project_array(self, lons, lats):
+        # trigonometric functions of the projection origin are computed once
+        # per call rather than once per vertex
+        lamda0 = math.radians(self.lon0)
+        phi1 = math.radians(self.lat1)
+        sin_phi1 = sin(phi1)
+        cos_phi1 = cos(phi1)
+
+        dlamda = np.radians(np.asarray(lons, dtype=np.float64)) - lamda0
+        phi = np.radians(np.asarray(lats, dtype=np.float64))
+        sin_phi = np.sin(phi)
+        cos_phi = np.cos(phi)
+        cos_dlamda = np.cos(dlamda)
+
+        k = 2 * self.k0 / (1 + sin_phi1*sin_phi + cos_phi1*cos_phi*cos_dlamda)
+        x = k * cos_phi * np.sin(dlamda)
+        y = k * (cos_phi1 * sin_phi - sin_phi1 * cos_phi * cos_dlamda)
+        return x, y
+
+    def inverse_array(self, xs, ys):
+        lamda0 = math.radians(self.lon0)
+        phi1 = math.radians(self.lat1)
+        sin_phi1 = sin(phi1)
+        cos_phi1 = cos(phi1)
+
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        rho = np.hypot(xs, ys)
+        c = 2 * np.arctan(rho / (2 * self.k0))
+        sin_c = np.sin(c)
+        cos_c = np.cos(c)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            phi = np.arcsin(cos_c * sin_phi1 + ys * sin_c * cos_phi1 / rho)
+        lamda = lamda0 + np.arctan2(xs * sin_c,
+                                    rho * cos_phi1 * cos_c - ys * sin_phi1 * sin_c)
+
+        # the projection origin maps back to (lon0, lat1)
+        origin = rho == 0
+        phi = np.where(origin, phi1, phi)
+        lamda = np.where(origin, lamda0, lamda)
+        return np.degrees(lamda), np.degrees(phi)
+
+
+def _apply_scalar(func, a, b):
+    """ Apply a scalar coordinate function *func(a, b) -> (c, d)* over arrays
+    """
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    out = np.empty(a.shape + (2,), dtype=np.float64)
+    flat = out.reshape(-1, 2)
+    for i, (u, v) in enumerate(zip(a.ravel().tolist(), b.ravel().tolist())):
+        flat[i] = func(u, v)[:2]
+    return out[..., 0], out[..., 1]
+
+
+def project_array(projection, lons, lats):
+    """ Project arrays of longitudes and latitudes with *projection*, which
+    may be a Projection instance or any callable *f(lon, lat) -> (x, y)*.
+    Returns arrays of x and y.
+    """
+    if hasattr(projection, "project_array"):
+        return projection.project_array(lons, lats)
+    return _apply_scalar(projection, lons, lats)
+
+
+def inverse_array(projection, xs, ys):
+    """ Inverse-project arrays of x and y with *projection*, which must
+    provide either *inverse_array* or *inverse*. Returns arrays of longitudes
+    and latitudes.
+    """
+    if hasattr(projection, "inverse_array"):
+        return projection.inverse_array(xs, ys)
+    elif hasattr(projection, "inverse"):
+        return _apply_scalar(projection.inverse, xs, ys)
+    raise TypeError("projection '{}' has no inverse".format(projection))
+
 
 def sphere_distance(lon1, lat1, lon2, lat2, radius=1.0):
     dx = abs(lon1-lon2)
@@ -61,4 +195,3 @@ R = 6371000
 WebMercator = SphericalMercator(R)
 NorthPolarStereographic = SphericalStereographic(R, 0.0, 90.0)
 SouthPolarStereographic = SphericalStereographic(R, 0.0, -90.0)
-
@@ -0,0 +1,241 @@
+""" Line and polygon simplification """
+
+import heapq
+import numpy as np
+
+DOUGLAS_PEUCKER = "douglas-peucker"
+VISVALINGAM = "visvalingam"
+
+
+def douglas_peucker_importance(xy, cutoff=0.0):
+    """ Computes the Douglas-Peucker importance of each vertex in an (n, 2)
+    array. Simplifying with a tolerance *t* retains exactly the vertices with
+    importance greater than *t*. Endpoints have infinite importance.
+
+    Recursion stops at ranges whose importance is *cutoff* or less, so that
+    vertices less important than *cutoff* are reported as zero.
+    """
+    n = len(xy)
+    importance = np.zeros(n)
+    if n == 0:
+        return importance
+    importance[0] = importance[-1] = np.inf
+
+    # every range of vertices at the same depth of the recursion is split in
+    # a single vectorized step
+    i0 = np.array([0])
+    i1 = np.array([n-1])
+    parent = np.array([np.inf])
+    while len(i0) != 0:
+        splittable = i1 - i0 >= 2
+        i0, i1, parent = i0[splittable], i1[splittable], parent[splittable]
+        if len(i0) == 0:
+            break
+
+        counts = i1 - i0 - 1
+        offsets = np.cumsum(counts) - counts
+        range_id = np.repeat(np.arange(len(i0)), counts)
+        idx = np.arange(counts.sum()) - offsets[range_id] + i0[range_id] + 1
+
+        a = xy[i0][range_id]
+        seg = xy[i1][range_id] - a
+        rel = xy[idx] - a
+        seglen = np.hypot(seg[:,0], seg[:,1])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            dist = np.where(seglen == 0,
+                            np.hypot(rel[:,0], rel[:,1]),
+                            np.abs(seg[:,0]*rel[:,1] - seg[:,1]*rel[:,0]) / seglen)
+
+        # farthest vertex of each range, taking the first in case of ties
+        dmax = np.maximum.reduceat(dist, offsets)
+        candidates = np.flatnonzero(dist == dmax[range_id])
+        _, first = np.unique(range_id[candidates], return_index=True)
+        k = idx[candidates[first]]
+
+        d = np.minimum(dmax, parent)
+        importance[k] = d
+        more = d > cutoff
+        i0, i1, k, d = i0[more], i1[more], k[more], d[more]
+        i0, i1, parent = (np.concatenate([i0, k]),
+                          np.concatenate([k, i1]),
+                          np.concatenate([d, d]))
+    return importance
+
+
+def visvalingam_importance(xy):
+    """ Computes the Visvalingam-Whyatt effective area of each vertex in an
+    (n, 2) array. Simplifying with an area threshold *a* retains exactly the
+    vertices with effective area greater than *a*. Endpoints have infinite
+    importance.
+    """
+    n = len(xy)
+    importance = np.full(n, np.inf)
+    if n < 3:
+        return importance
+
+    x = xy[:,0].tolist()
+    y = xy[:,1].tolist()
+
+    def area(i, j, k):
+        return 0.5 * abs((x[j]-x[i]) * (y[k]-y[i]) - (x[k]-x[i]) * (y[j]-y[i]))
+
+    prev = list(range(-1, n-1))
+    next_ = list(range(1, n+1))
+    areas = [np.inf] + [area(i-1, i, i+1) for i in range(1, n-1)] + [np.inf]
+    heap = [(areas[i], i) for i in range(1, n-1)]
+    heapq.heapify(heap)
+
+    last = 0.0
+    while len(heap) != 0:
+        a, i = heapq.heappop(heap)
+        if a != areas[i]:
+            continue                # stale entry
+        # a vertex is never more important than one eliminated before it
+        last = max(last, a)
+        importance[i] = last
+        areas[i] = None
+
+        p, q = prev[i], next_[i]
+        next_[p] = q
+        prev[q] = p
+        for j in (p, q):
+            if 0 < j < n-1:
+                areas[j] = area(prev[j], j, next_[j])
+                heapq.heappush(heap, (areas[j], j))
+    return importance
+
+
+def simplify(xy, tolerance, method=DOUGLAS_PEUCKER):
+    """ Simplifies an (n, 2) array of vertices, returning the indices of the
+    retained vertices.
+
+    For Douglas-Peucker, *tolerance* is the maximum distance between the
+    original and simplified lines. For Visvalingam-Whyatt, vertices
+    spanning triangles smaller than *tolerance* squared are removed.
+    """
+    if method == DOUGLAS_PEUCKER:
+        importance = douglas_peucker_importance(xy, cutoff=tolerance)
+        return np.flatnonzero(importance > tolerance)
+    elif method == VISVALINGAM:
+        return np.flatnonzero(visvalingam_importance(xy) > tolerance**2)
+    raise ValueError("unknown simplification method '{}'".format(method))
+
+
+def drop_duplicates(xy):
+    """ Removes consecutive duplicate vertices from an (n, 2) array """
+    if len(xy) < 2:
+        return xy
+    keep = np.ones(len(xy), dtype=bool)
+    keep[1:] = (xy[1:] != xy[:-1]).any(axis=1)
+    return xy[keep]
+
+
+def ring_area(xy):
+    """ Returns the unsigned area of a ring with the shoelace formula """
+    if len(xy) < 3:
+        return 0.0
+    x = xy[:,0] - xy[0,0]
+    y = xy[:,1] - xy[0,1]
+    return 0.5 * abs(np.dot(x[:-1], y[1:]) - np.dot(x[1:], y[:-1]))
+
+
+class LODPyramid(object):
+    """ Precomputed levels of detail for the lines and polygon rings of a
+    Layer, in one projection.
+
+    The importance of every vertex is computed once, in projected units.
+    Level *k* keeps the indices of the vertices more important than
+    base_tolerance * factor**k, so that simplifying with any tolerance
+    starts from the coarsest level that contains the result, chosen in
+    constant time, rather than from every vertex.
+
+    xy : (n, 2) float64 array
+        projected layer coordinates
+
+    ring_offsets : int64 array
+        ring offsets of the layer. Rings of fewer than three vertices, such
+        as points, are always kept whole.
+
+    method : str
+        "douglas-peucker" or "visvalingam". Visvalingam-Whyatt importances
+        are stored as the square root of the effective area, so both are
+        compared with a length.
+
+    factor : float
+        ratio of the tolerances of successive levels
+    """
+
+    def __init__(self, xy, ring_offsets, method=DOUGLAS_PEUCKER, factor=2.0):
+        if method not in (DOUGLAS_PEUCKER, VISVALINGAM):
+            raise ValueError("unknown simplification method "
+                             "'{}'".format(method))
+        self.method = method
+        self.factor = factor
+        self.ring_offsets = ring_offsets
+        self.importance = np.full(len(xy), np.inf)
+        offsets = ring_offsets.tolist()
+        for a, b in zip(offsets[:-1], offsets[1:]):
+            if b - a < 3:
+                continue
+            if method == DOUGLAS_PEUCKER:
+                self.importance[a:b] = douglas_peucker_importance(xy[a:b])
+            else:
+                self.importance[a:b] = np.sqrt(visvalingam_importance(xy[a:b]))
+
+        finite = self.importance[np.isfinite(self.importance) &
+                                 (self.importance > 0)]
+        self.levels = []
+        if len(finite) == 0:
+            self.base_tolerance = np.inf
+            return
+
+        # levels run from the scale of the finest detail to that of the
+        # coarsest, where only the ends of each ring are left
+        self.base_tolerance = float(np.percentile(finite, 10))
+        nlevels = int(np.ceil(np.log(finite.max() / self.base_tolerance) /
+                              np.log(factor))) + 1
+        dtype = np.int32 if len(xy) < 2**31 else np.int64
+        ring_ids = np.repeat(np.arange(len(offsets)-1), np.diff(ring_offsets))
+        for k in range(min(nlevels, 64)):
+            keep = np.flatnonzero(self.importance >
+                                  self.base_tolerance * factor**k)
+            level_offsets = np.zeros(len(offsets), dtype=np.int64)
+            np.cumsum(np.bincount(ring_ids[keep], minlength=len(offsets)-1),
+                      out=level_offsets[1:])
+            self.levels.append((keep.astype(dtype), level_offsets))
+
+    def __repr__(self):
+        return "<LODPyramid levels={} vertices={}>".format(
+            len(self.levels), [len(idx) for idx, _ in self.levels])
+
+    @property
+    def nbytes(self):
+        return self.importance.nbytes + sum(idx.nbytes + offsets.nbytes
+                                            for idx, offsets in self.levels)
+
+    def level(self, tolerance):
+        """ Return the index of the coarsest level containing every vertex
+        that simplification with *tolerance* (in projected units) keeps, or
+        -1 if no level is coarse enough and every vertex must be
+        considered """
+        if not tolerance >= self.base_tolerance:
+            return -1
+        elif np.isinf(tolerance):
+            return len(self.levels) - 1
+        k = int(np.log(tolerance / self.base_tolerance) / np.log(self.factor))
+        # guard against rounding in the logarithms
+        k = min(k, len(self.levels) - 1)
+        while k > 0 and self.base_tolerance * self.factor**k > tolerance:
+            k -= 1
+        return k
+
+    def ring(self, r, level, tolerance):
+        """ Return the indices of the vertices of ring *r* that
+        simplification with *tolerance* keeps, taken from *level* """
+        if level < 0:
+            a, b = self.ring_offsets[r], self.ring_offsets[r+1]
+            idx = np.arange(a, b)
+        else:
+            indices, offsets = self.levels[level]
+            idx = indices[offsets[r]:offsets[r+1]]
+        return idx[self.importance[idx] > tolerance]
@@ -0,0 +1,149 @@
+""" Render statistics collected while serializing a MapSheet """
+
+from collections import OrderedDict
+import time
+
+STAGES = ("parse", "extent", "projection", "selection", "conversion",
+          "encoding", "total")
+
+
+class RenderStats(object):
+    """ Wall times, counts and sizes from one serialization of a MapSheet.
+
+    stages : OrderedDict
+        seconds spent in each stage: "parse" (reading GeoJSON when it was
+        added to the map), "extent" (computing the map extent, which in
+        scale= mode includes projecting the layers), "projection",
+        "selection" (spatial index queries), "conversion" (clipping,
+        simplification and building SVG nodes), "encoding" (formatting path
+        data and XML), and "total" (the whole serialization, including time
+        spent by the consumer of the output)
+
+    layers : list of LayerStats
+        one entry per map entity, in drawing order
+
+    output_bytes : int
+        size of the UTF-8 encoded document
+    """
+
+    def __init__(self):
+        self.stages = OrderedDict((stage, 0.0) for stage in STAGES)
+        self.layers = []
+        self.output_bytes = 0
+
+    def __repr__(self):
+        return ("<RenderStats layers={} vertices_in={} vertices_out={} "
+                "output_bytes={} total={:.6f}s>".format(
+                    len(self.layers), self.vertices_in, self.vertices_out,
+                    self.output_bytes, self.stages["total"]))
+
+    @property
+    def vertices_in(self):
+        return sum(layer.vertices_in for layer in self.layers)
+
+    @property
+    def vertices_out(self):
+        return sum(layer.vertices_out for layer in self.layers)
+
+    def add_layer(self, index, name):
+        layer = LayerStats(index, name)
+        self.layers.append(layer)
+        return layer
+
+    def add_time(self, stage, seconds):
+        self.stages[stage] += seconds
+
+    def as_dict(self):
+        """ Return the statistics as a dictionary of built-in types, suitable
+        for JSON encoding """
+        return {"stages": dict(self.stages),
+                "vertices_in": self.vertices_in,
+                "vertices_out": self.vertices_out,
+                "output_bytes": self.output_bytes,
+                "layers": [layer.as_dict() for layer in self.layers]}
+
+
+class LayerStats(object):
+    """ Statistics for one map entity.
+
+    index : int
+        position of the entity in MapSheet.entities
+
+    name : str
+        the class name given when the layer was added, or the kind of entity
+
+    features : int
+        number of features in the layer
+
+    features_selected : int
+        number of features intersecting the clipping region
+
+    vertices_in : int
+        number of vertices in the selected features
+
+    vertices_out : int
+        number of vertices drawn, after clipping and simplification
+
+    paths : int
+        number of SVG elements written
+
+    output_bytes : int
+        size of the encoded elements
+
+    stages : OrderedDict
+        seconds spent by this layer in the projection, selection, conversion
+        and encoding stages
+
+    cached : bool
+        True if the layer was not converted because its fragment from an
+        earlier incremental serialization, or from a PreparedLayer, was
+        reused
+    """
+
+    def __init__(self, index, name):
+        self.index = index
+        self.name = name
+        self.features = 0
+        self.features_selected = 0
+        self.vertices_in = 0
+        self.vertices_out = 0
+        self.paths = 0
+        self.output_bytes = 0
+        self.cached = False
+        self.stages = OrderedDict((stage, 0.0) for stage in
+                                  ("projection", "selection", "conversion",
+                                   "encoding"))
+
+    def __repr__(self):
+        return ("<LayerStats {} '{}' features={}/{} vertices={}/{} paths={} "
+                "output_bytes={}>".format(self.index, self.name,
+                                          self.features_selected,
+                                          self.features, self.vertices_out,
+                                          self.vertices_in, self.paths,
+                                          self.output_bytes))
+
+    @property
+    def seconds(self):
+        return sum(self.stages.values())
+
+    def as_dict(self):
+        return {"index": self.index,
+                "name": self.name,
+                "features": self.features,
+                "features_selected": self.features_selected,
+                "vertices_in": self.vertices_in,
+                "vertices_out": self.vertices_out,
+                "paths": self.paths,
+                "output_bytes": self.output_bytes,
+                "cached": self.cached,
+                "stages": dict(self.stages)}
+
+
+def encoded_size(s):
+    """ Return the length of *s* encoded as UTF-8 """
+    if s.isascii():
+        return len(s)
+    return len(s.encode("utf-8"))
+
+
+clock = time.perf_counter
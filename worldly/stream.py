@@ -0,0 +1,180 @@
+""" Incremental reading of large GeoJSON files """
+
+import json
+import picogeojson
+from .layer import LayerBuilder
+
+_WHITESPACE = " \t\n\r\x1e"     # includes the GeoJSONSeq record separator
+_decoder = json.JSONDecoder()
+
+
+def iter_features(f, chunk_size=65536):
+    """ Generate the Features and Geometries in the file-like object *f* as
+    decoded GeoJSON dictionaries, reading *chunk_size* characters at a time.
+
+    *f* may contain a FeatureCollection, whose members are generated one at a
+    time without decoding the collection as a whole, or a sequence of GeoJSON
+    texts separated by whitespace or record separators, such as
+    newline-delimited GeoJSON (GeoJSONSeq).
+    """
+    reader = _Reader(f, chunk_size)
+    while reader.skip_whitespace():
+        if reader.peek() != "{":
+            # a bare GeoJSON text that is not an object is invalid, but
+            # decoding it yields a useful error message
+            reader.decode()
+            continue
+        for obj in _iter_object(reader):
+            yield obj
+
+
+def iter_layers(f, max_vertices=65536, chunk_size=65536):
+    """ Generate Layers from the features in the file-like object *f*. Each
+    Layer holds consecutive features, up to *max_vertices* vertices unless a
+    single feature is larger. """
+    builder = LayerBuilder()
+    for obj in iter_features(f, chunk_size=chunk_size):
+        builder.add(picogeojson.fromdict(obj))
+        if builder.nvertices >= max_vertices:
+            yield builder.build()
+            builder = LayerBuilder()
+    if len(builder) != 0:
+        yield builder.build()
+
+
+class GeoJSONStream(object):
+    """ A map entity that reads features from a GeoJSON or GeoJSONSeq file
+    while the map is drawn, so that the file is never held in memory. See
+    iter_layers for *max_vertices*. """
+
+    def __init__(self, filename, max_vertices=65536):
+        self.filename = filename
+        self.max_vertices = max_vertices
+
+    def layers(self):
+        """ Generate Layers of consecutive features from the file """
+        with open(self.filename) as f:
+            for layer in iter_layers(f, max_vertices=self.max_vertices):
+                yield layer
+
+    def projected_bbox(self, projection):
+        """ Return the bounding box of the projected features, or None if
+        there are no vertices. Requires a complete pass over the file. """
+        bboxes = [layer.bbox(layer.projected(projection))
+                  for layer in self.layers() if layer.nvertices != 0]
+        if len(bboxes) == 0:
+            return None
+        return (min(bb[0] for bb in bboxes), min(bb[1] for bb in bboxes),
+                max(bb[2] for bb in bboxes), max(bb[3] for bb in bboxes))
+
+
+def _iter_object(reader):
+    """ Decode an object member by member. If it has a "features" member,
+    generate its items as they are decoded. Otherwise, generate the complete
+    object. """
+    reader.expect("{")
+    members = {}
+    streamed = False
+    while True:
+        reader.skip_whitespace()
+        if reader.peek() == "}":
+            reader.advance()
+            break
+        key = reader.decode()
+        reader.skip_whitespace()
+        reader.expect(":")
+        reader.skip_whitespace()
+        if key == "features" and reader.peek() == "[":
+            streamed = True
+            for feature in _iter_array(reader):
+                yield feature
+        else:
+            members[key] = reader.decode()
+        reader.skip_whitespace()
+        if reader.peek() == ",":
+            reader.advance()
+    if not streamed:
+        yield members
+
+
+def _iter_array(reader):
+    reader.expect("[")
+    while True:
+        reader.skip_whitespace()
+        if reader.peek() == "]":
+            reader.advance()
+            return
+        yield reader.decode()
+        reader.skip_whitespace()
+        if reader.peek() == ",":
+            reader.advance()
+
+
+class _Reader(object):
+    """ Buffered reader that decodes JSON values spanning chunk boundaries """
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, n):
+        """ Read at least *n* more characters, if available """
+        if self.pos != 0:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        chunks = [self.buf]
+        nread = 0
+        while nread < n:
+            chunk = self.f.read(max(n, self.chunk_size))
+            if not chunk:
+                self.eof = True
+                break
+            chunks.append(chunk)
+            nread += len(chunk)
+        self.buf = "".join(chunks)
+        return nread != 0
+
+    def skip_whitespace(self):
+        """ Advance past whitespace, returning False at the end of input """
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return True
+            if self.eof or not self._fill(1):
+                return False
+
+    def peek(self):
+        if self.pos >= len(self.buf) and not self._fill(1):
+            raise ValueError("unexpected end of GeoJSON input")
+        return self.buf[self.pos]
+
+    def advance(self):
+        self.pos += 1
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError("expected '{}' in GeoJSON input, found '{}'"
+                             .format(char, self.peek()))
+        self.advance()
+
+    def decode(self):
+        """ Decode the JSON value at the current position """
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                # the value may continue past the buffer; read more, doubling
+                # the request so that large values are read in few passes
+                if self.eof or not self._fill(max(1, len(self.buf) - self.pos)):
+                    raise
+                continue
+            if end == len(self.buf) and not self.eof:
+                # a number at the end of the buffer may be truncated
+                if self._fill(1):
+                    continue
+            self.pos = end
+            return value
@@ -1,6 +1,10 @@
 """ Implements an abstraction over SVG elements """
 
+import re
 import xml.etree.ElementTree as ET
+import numpy as np
+
+XLINK = "http://www.w3.org/1999/xlink"
 
 
 class SVGNode(object):
@@ -22,6 +26,14 @@ class SVGNode(object):
     def svg(self):
         return ET.Element(self.name, attrib=self.attrs)
 
+    def open_tag(self):
+        """ Return the encoded start tag of the node """
+        return ET.tostring(self.svg(), encoding="unicode")[:-3] + ">"
+
+    def close_tag(self):
+        """ Return the encoded end tag of the node """
+        return "</{}>".format(self.name)
+
 
 class SVGRoot(SVGNode):
 
@@ -31,43 +43,248 @@ class SVGRoot(SVGNode):
         self.attrs["height"] = str(height)
         self.attrs["xmlns"] = "http://www.w3.org/2000/svg"
 
+    def declare_xlink(self):
+        """ Declare the XLINK namespace, used by xlink:href attributes """
+        self.attrs["xmlns:xlink"] = XLINK
+
 
 class SVGCircle(SVGNode):
 
     def __init__(self, vertex, radius, **kw):
         super(SVGCircle, self).__init__("circle", **kw)
-        self.attrs["cx"] = str(round(vertex[0], self.precision))
-        self.attrs["cy"] = str(round(vertex[1], self.precision))
-        self.attrs["r"] = str(round(radius, self.precision))
+        self.attrs["cx"] = _format_number(vertex[0], self.precision)
+        self.attrs["cy"] = _format_number(vertex[1], self.precision)
+        self.attrs["r"] = _format_number(radius, self.precision)
+
+
+class SVGUse(SVGNode):
+    """ An instance of the element referenced by *href*, such as "#marker",
+    placed with its origin at *vertex*. The reference is also written as
+    xlink:href for renderers that predate SVG 2, so documents must declare
+    the XLINK namespace (see SVGRoot.declare_xlink). """
+
+    def __init__(self, href, vertex, **kw):
+        super(SVGUse, self).__init__("use", **kw)
+        self.attrs["href"] = href
+        self.attrs["xlink:href"] = href
+        self.attrs["x"] = _format_number(vertex[0], self.precision)
+        self.attrs["y"] = _format_number(vertex[1], self.precision)
 
 
 class SVGPath(SVGNode):
+    """ A path of one or more linestrings or rings.
+
+    If *compact* is True, the path data is written with relative commands
+    and no redundant characters (see compact_path_data).
+
+    The path data is kept once it has been encoded, until *vertices* is
+    assigned a new value. Vertices are stored as a tuple of read-only rings
+    (tuples, or read-only views of arrays), so they can only be changed by
+    assignment.
+    """
 
-    def __init__(self, vertices, closed=False, **kw):
+    def __init__(self, vertices, closed=False, compact=False, **kw):
         self.vertices = vertices
         self.closed = closed
+        self.compact = compact
         super(SVGPath, self).__init__("path", **kw)
 
+    @property
+    def vertices(self):
+        return self._vertices
+
+    @vertices.setter
+    def vertices(self, vertices):
+        self._vertices = tuple(_read_only(ring) for ring in vertices)
+        self._d = None
+
     def svg(self):
-        d = []
-        for linestring in self.vertices:
-            d.append("M{x},{y}".format(x=round(linestring[0][0], self.precision),
-                                       y=round(linestring[0][1], self.precision)))
-            d.extend(["L{x},{y}".format(x=round(x, self.precision),
-                                        y=round(y, self.precision))
-                                        for (x, y) in linestring[1:]])
-            if self.closed:
-                d.append("Z")
-        self.attrs["d"] = " ".join(d)
+        settings = (self.closed, self.compact, self.precision)
+        if self._d is None or self._d[0] != settings:
+            if self.compact:
+                d = compact_path_data(self.vertices, self.closed,
+                                      self.precision)
+            else:
+                d = path_data(self.vertices, self.closed, self.precision)
+            self._d = (settings, d)
+        self.attrs["d"] = self._d[1]
         return ET.Element("path", attrib=self.attrs)
 
 
+def _read_only(ring):
+    """ Return a ring as a read-only view if it is an array, or otherwise as
+    a tuple """
+    if isinstance(ring, np.ndarray):
+        ring = ring.view()
+        ring.flags.writeable = False
+        return ring
+    return tuple(ring)
+
+
+def path_data(vertices, closed=False, precision=2):
+    """ Encode linestrings as path data with absolute commands, and with
+    coordinates rounded to *precision* decimal places and written without
+    trailing zeros """
+    subpaths = []
+    for linestring in vertices:
+        if len(linestring) == 0:
+            continue
+        d = format_coordinates(linestring, precision, "M", " L")
+        if closed:
+            d += " Z"
+        subpaths.append(d)
+    return " ".join(subpaths)
+
+
+def format_coordinates(xy, precision, first="", rest=" "):
+    """ Format a sequence or (n, 2) array of coordinates as "x,y" pairs,
+    rounded to *precision* decimal places and without trailing zeros. The
+    first pair is preceded by *first* and the others by *rest*.
+
+    All of the numbers are written by a single fixed-point %-operation,
+    which rounds as round() does, and trailing zeros are then removed from
+    the whole string at once.
+    """
+    xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+    if len(xy) == 0:
+        return ""
+    if precision <= 0:
+        xy = np.round(xy, precision)
+        precision = 0
+    number = "%.{}f".format(precision)
+    pair = number + "," + number
+    text = (first + pair + (rest + pair) * (len(xy) - 1)) % \
+        tuple(xy.ravel().tolist())
+    return _strip_zeros(text, precision)
+
+
+def _strip_zeros(text, precision):
+    """ Remove trailing zeros, bare decimal points and negative signs of zero
+    from numbers written with *precision* (at least 0) decimal places """
+    if precision > 0:
+        # every number has a point, so zeros ending a number are fractional
+        text = _BARE_POINT.sub("", _TRAILING_ZEROS.sub("", text))
+    return _NEGATIVE_ZERO.sub("0", text)
+
+
+_TRAILING_ZEROS = re.compile(r"0+(?![\d.])")
+_BARE_POINT = re.compile(r"\.(?!\d)")
+_NEGATIVE_ZERO = re.compile(r"-0(?![\d.])")
+
+
+def compact_path_data(vertices, closed=False, precision=0):
+    """ Encode linestrings as path data with relative commands. Vertices are
+    rounded to *precision* decimal places, and vertices that rounding makes
+    repeat are dropped. Each subpath starts with an absolute (M) or relative
+    (m) move, and segments are relative lines (l), or horizontal (h) or
+    vertical (v) lines when they follow an axis, with consecutive h or v
+    segments in the same direction merged. Repeated commands, separators and
+    leading zeros are omitted. """
+    tokens = []
+    # relative moves are mostly small and repeat, so each is formatted once
+    numbers = _QuantaFormatter(precision)
+    cx = cy = 0
+    for linestring in vertices:
+        if len(linestring) == 0:
+            continue
+        # vertices as integer multiples of the precision, so that the
+        # relative moves are exact
+        quanta = np.rint(np.asarray(linestring, dtype=np.float64)
+                         .reshape(-1, 2) * 10.0**precision).astype(np.int64)
+        moved = np.any(quanta[1:] != quanta[:-1], axis=1)
+        quanta = np.concatenate([quanta[:1], quanta[1:][moved]])
+        xs = quanta[:,0].tolist()
+        ys = quanta[:,1].tolist()
+        if len(tokens) == 0:
+            tokens.append("M")
+            _append_numbers(tokens, numbers, xs[0], ys[0])
+        else:
+            tokens.append("m")
+            _append_numbers(tokens, numbers, xs[0]-cx, ys[0]-cy)
+
+        command = None
+        last = 0
+        for i in range(1, len(xs)):
+            dx = xs[i] - xs[i-1]
+            dy = ys[i] - ys[i-1]
+            if dy == 0 or dx == 0:
+                axis = "h" if dy == 0 else "v"
+                delta = dx + dy
+                if command == axis and (delta > 0) == (last > 0):
+                    # extend the previous segment along the same axis,
+                    # choosing its separator again for the new number
+                    last += delta
+                    del tokens[mark:]
+                    _append_numbers(tokens, numbers, last)
+                    continue
+                if command != axis:
+                    command = axis
+                    tokens.append(command)
+                last = delta
+                mark = len(tokens)
+                _append_numbers(tokens, numbers, delta)
+            else:
+                if command != "l":
+                    command = "l"
+                    tokens.append(command)
+                _append_numbers(tokens, numbers, dx, dy)
+
+        if closed:
+            tokens.append("z")
+            # closing a subpath returns to its first point
+            cx, cy = xs[0], ys[0]
+        else:
+            cx, cy = xs[-1], ys[-1]
+    return "".join(tokens)
+
+
+def _append_numbers(tokens, numbers, *quanta):
+    """ Append numbers, given as integer multiples of the precision and
+    formatted by the _QuantaFormatter *numbers*, to path data tokens, with a
+    separating space only where no command, minus sign or second decimal
+    point divides them """
+    for n in quanta:
+        text = numbers[n]
+        previous = tokens[-1]
+        if previous[-1] not in "MmLlHhVvZz" and text[0] != "-" and \
+                not (text[0] == "." and "." in previous):
+            tokens.append(" ")
+        tokens.append(text)
+
+
+class _QuantaFormatter(dict):
+    """ Maps integers *n* to the text of n * 10**-precision, without
+    trailing zeros or a leading zero, formatting each one once """
+
+    def __init__(self, precision):
+        self.precision = precision
+
+    def __missing__(self, n):
+        if self.precision <= 0:
+            text = str(n * 10**-self.precision)
+        else:
+            whole, fraction = divmod(abs(n), 10**self.precision)
+            fraction = str(fraction).zfill(self.precision).rstrip("0")
+            text = str(whole) if whole != 0 or fraction == "" else ""
+            if fraction != "":
+                text += "." + fraction
+            if n < 0:
+                text = "-" + text
+        self[n] = text
+        return text
+
+
 class SVGPolygon(SVGNode):
 
     def __init__(self, vertices, **kw):
         super(SVGPolygon, self).__init__("polygon", **kw)
-        point_string = " ".join(["{x},{y}".format(x=round(x, self.precision),
-                                                  y=round(y, self.precision))
-                                                  for (x, y) in vertices])
-        self.attrs["points"] = point_string
+        self.attrs["points"] = format_coordinates(vertices, self.precision)
+
 
+def _format_number(value, precision):
+    """ Format *value* rounded to *precision* decimal places as
+    format_coordinates formats each coordinate, without trailing zeros """
+    if precision <= 0:
+        value = round(value, precision)
+        precision = 0
+    return _strip_zeros("%.{}f".format(precision) % value, precision)
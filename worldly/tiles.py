@@ -0,0 +1,157 @@
+""" Rendering of XYZ (slippy map) tile pyramids """
+
+import math
+import os
+from .cache import ProjectionCache
+from .layer import Layer
+from .prepared import PreparedLayer
+from .projection import WebMercator
+from .workers import fork_context
+
+
+def tile_bounds(z, x, y, projection=WebMercator):
+    """ Return the projected bounds (xmin, ymin, xmax, ymax) of tile *x*, *y*
+    at zoom level *z*. *projection* must be a SphericalMercator, for which
+    projected y increases southward, so *ymin* is the northern edge. """
+    size = 2 * projection.R / 2**z
+    return (x * size, y * size, (x+1) * size, (y+1) * size)
+
+
+def tile_bbox(z, x, y, projection=WebMercator):
+    """ Return the geographical bounding box (lon_w, lat_s, lon_e, lat_n) of
+    tile *x*, *y* at zoom level *z* """
+    x0, y0, x1, y1 = tile_bounds(z, x, y, projection)
+    lon_w, lat_n = projection.inverse(x0, y0)
+    lon_e, lat_s = projection.inverse(x1, y1)
+    return (lon_w, lat_s, lon_e, lat_n)
+
+
+def tile_range(z, bounds, projection=WebMercator):
+    """ Return the ranges of tile columns and rows at zoom level *z* that
+    intersect projected *bounds* """
+    n = 2**z
+    size = 2 * projection.R / n
+
+    def clamp(i):
+        return min(max(i, 0), n-1)
+
+    return (range(clamp(int(math.floor(bounds[0] / size))),
+                  clamp(int(math.floor(bounds[2] / size))) + 1),
+            range(clamp(int(math.floor(bounds[1] / size))),
+                  clamp(int(math.floor(bounds[3] / size))) + 1))
+
+
+# the pyramid being rendered, shared with forked workers (see fork_context)
+_job = None
+
+
+def render_tiles(sheet, zoom_range, out_dir, tile_size=256,
+                 projection=WebMercator, processes=None):
+    """ Render the GeoJSON layers of a MapSheet as a pyramid of SVG tiles,
+    written to *out_dir*/z/x/y.svg.
+
+    Layer coordinates are projected once for the whole pyramid, and each tile
+    is drawn with its own extent, clipping and precision. Tiles that no
+    feature intersects are skipped.
+
+    sheet : MapSheet
+        provides layers, style, and clipping and simplification settings
+
+    zoom_range : tuple of 2 ints
+        lowest and highest zoom level, inclusive
+
+    out_dir : str
+        root directory of the pyramid
+
+    tile_size : int
+        tile width and height in pixels
+
+    projection : SphericalMercator
+
+    processes : int
+        if given, tiles are rendered by a pool of this many processes
+
+    Returns a list of (z, x, y) tuples for the tiles written.
+    """
+    global _job
+
+    # prepared layers are drawn at tile scales, so are converted again
+    layers = [(entity, params) if isinstance(entity, Layer)
+              else (entity.layer, entity.params)
+              for entity, params in sheet.entities
+              if isinstance(entity, (Layer, PreparedLayer))]
+
+    # project layers and build their spatial indexes up front, so that worker
+    # processes inherit them. The job keeps the projected coordinates in its
+    # own unbounded cache, which every tile draws from, so that each layer is
+    # projected once however little the sheet's cache holds.
+    cache = ProjectionCache(max_bytes=None)
+    for layer, _ in layers:
+        if sheet.cache is None:
+            cache.projected(layer, projection)
+        else:
+            cache.add(layer, projection,
+                      sheet.cache.projected(layer, projection))
+    indexes = [layer.spatial_index(projection, cache.projected(layer, projection))
+               for layer, _ in layers]
+    if sheet.lod and sheet.simplify is not None:
+        # one pyramid serves every zoom level
+        for layer, _ in layers:
+            layer.lod_pyramid(projection, sheet.simplify,
+                              cache.projected(layer, projection))
+    extents = [idx.bbox for idx in indexes if idx.bbox is not None]
+    if len(extents) == 0:
+        return []
+    bounds = (min(b[0] for b in extents), min(b[1] for b in extents),
+              max(b[2] for b in extents), max(b[3] for b in extents))
+
+    tiles = []
+    for z in range(zoom_range[0], zoom_range[1]+1):
+        xs, ys = tile_range(z, bounds, projection)
+        for x in xs:
+            for y in ys:
+                x0, y0, x1, y1 = tile_bounds(z, x, y, projection)
+                mx = sheet.clip_margin * (x1 - x0)
+                my = sheet.clip_margin * (y1 - y0)
+                query = (x0 - mx, y0 - my, x1 + mx, y1 + my)
+                if any(len(idx.query(query)) != 0 for idx in indexes):
+                    tiles.append((z, x, y))
+
+    _job = (sheet, layers, cache, out_dir, tile_size, projection)
+    ctx = fork_context()
+    try:
+        if processes is not None and processes > 1 and ctx is not None:
+            chunksize = max(1, len(tiles) // (4 * processes))
+            with ctx.Pool(processes) as pool:
+                for _ in pool.imap_unordered(_render_tile, tiles, chunksize):
+                    pass
+        else:
+            for tile in tiles:
+                _render_tile(tile)
+    finally:
+        _job = None
+    return tiles
+
+
+def _render_tile(tile):
+    sheet, layers, cache, out_dir, tile_size, projection = _job
+    z, x, y = tile
+    tilesheet = type(sheet)(None, width=tile_size, height=tile_size,
+                            style=sheet.style,
+                            projection=projection,
+                            bbox=tile_bbox(z, x, y, projection),
+                            clip=True,
+                            clip_margin=sheet.clip_margin,
+                            simplify=sheet.simplify,
+                            tolerance=sheet.tolerance,
+                            min_area=sheet.min_area,
+                            cache=cache,
+                            compact=sheet.compact,
+                            lod=sheet.lod)
+    tilesheet.entities.extend(layers)
+
+    dirname = os.path.join(out_dir, str(z), str(x))
+    os.makedirs(dirname, exist_ok=True)
+    with open(os.path.join(dirname, "{}.svg".format(y)), "w") as f:
+        tilesheet.write(f)
+    return tile
@@ -0,0 +1,296 @@
+""" TopoJSON topologies as Layers that share projected arcs """
+
+from array import array
+import json
+import numpy as np
+from .layer import Layer, MULTILINESTRING, GEOMETRY_TYPES
+from .projection import project_array
+
+
+class Topology(object):
+    """ A decoded TopoJSON topology.
+
+    Arcs are dequantized and delta-decoded into a single (n, 2) array,
+    *coords*, in which arc *i* spans coords[arc_offsets[i]:arc_offsets[i+1]].
+    Projected arcs are computed once per projection and shared by every
+    TopoLayer made from the topology.
+
+    obj : dict
+        decoded TopoJSON
+    """
+
+    def __init__(self, obj):
+        if obj.get("type") != "Topology":
+            raise ValueError("not a TopoJSON Topology")
+        self.objects = obj.get("objects", {})
+        transform = obj.get("transform")
+        if transform is None:
+            self._scale = None
+        else:
+            self._scale = np.asarray(transform["scale"], dtype=np.float64)
+            self._translate = np.asarray(transform["translate"],
+                                         dtype=np.float64)
+        self.coords, self.arc_offsets = self._decode_arcs(obj.get("arcs", []))
+        self._projected = {}
+
+    @classmethod
+    def fromstring(cls, s):
+        return cls(json.loads(s))
+
+    def __len__(self):
+        """ Number of arcs """
+        return len(self.arc_offsets) - 1
+
+    def _decode_arcs(self, arcs):
+        counts = np.array([len(arc) for arc in arcs], dtype=np.int64)
+        offsets = np.zeros(len(arcs)+1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        if offsets[-1] == 0:
+            return np.zeros((0, 2)), offsets
+
+        positions = np.array([xy[:2] for arc in arcs for xy in arc],
+                             dtype=np.float64)
+        if self._scale is None:
+            return positions, offsets
+
+        # undo the delta encoding, restarting the running sum at each arc
+        starts = offsets[:-1][counts != 0]
+        return self._dequantize(_segmented_cumsum(positions, starts)), offsets
+
+    def _dequantize(self, positions):
+        if self._scale is None:
+            return np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        return np.asarray(positions, dtype=np.float64).reshape(-1, 2) * \
+            self._scale + self._translate
+
+    def projected(self, projection):
+        """ Return the (n, 2) array of arc coordinates projected by
+        *projection*, computing it on first use """
+        key = id(projection)
+        entry = self._projected.get(key)
+        if entry is None or entry[0] is not projection:
+            entry = (projection, _project(projection, self.coords))
+            self._projected[key] = entry
+        return entry[1]
+
+    def layer(self, name, mesh=False):
+        """ Return a TopoLayer for the object *name*.
+
+        If *mesh* is False, the layer has a feature for every geometry in the
+        object. Otherwise the layer has a single MultiLineString feature
+        drawing each arc used by the object once. *mesh* may be "interior"
+        for only the arcs shared by more than one geometry, such as internal
+        borders, or "exterior" for only the arcs that are not shared.
+        """
+        obj = self.objects[name]
+        if obj.get("type") == "GeometryCollection":
+            geometries = obj.get("geometries", [])
+        else:
+            geometries = [obj]
+        builder = _TopoLayerBuilder(self)
+        if mesh:
+            builder.add_mesh(geometries, mesh)
+        else:
+            for geom in geometries:
+                builder.add_feature(geom)
+        return builder.build()
+
+    def layers(self, mesh=False):
+        """ Return a TopoLayer for every object, in order. See layer. """
+        return [self.layer(name, mesh=mesh) for name in self.objects]
+
+
+class TopoLayer(Layer):
+    """ A Layer whose coordinates are gathered from the arcs of a Topology
+    and from its own points, so that projecting the layer projects each arc
+    of the topology only once.
+
+    topology : Topology
+
+    points : (m, 2) float64 array
+        coordinates of Point and MultiPoint geometries, which are not stored
+        as arcs
+
+    gather : int64 array
+        the coordinates of the layer are
+        concatenate([topology.coords, points])[gather]
+
+    See Layer for the remaining arguments.
+    """
+
+    def __init__(self, topology, points, gather, ring_offsets, part_offsets,
+                 geom_offsets, geom_types, feature_offsets, properties):
+        coords = np.vstack([topology.coords, points])[gather]
+        super(TopoLayer, self).__init__(coords, ring_offsets, part_offsets,
+                                        geom_offsets, geom_types,
+                                        feature_offsets, properties)
+        self.topology = topology
+        self.points = points
+        self.gather = gather
+
+    def projected(self, projection):
+        """ Return an (n, 2) array of coordinates projected by *projection*.
+        Arcs are projected by the topology, once per projection. """
+        return np.vstack([self.topology.projected(projection),
+                          _project(projection, self.points)])[self.gather]
+
+
+class _TopoLayerBuilder(object):
+    """ Accumulates TopoJSON geometries and builds a TopoLayer """
+
+    def __init__(self, topology):
+        self.topology = topology
+        self.arc_offsets = topology.arc_offsets.tolist()
+        self.gather = array("q")
+        self.points = []
+        self.ring_offsets = array("q", [0])
+        self.part_offsets = array("q", [0])
+        self.geom_offsets = array("q", [0])
+        self.geom_types = array("B")
+        self.feature_offsets = array("q", [0])
+        self.properties = []
+
+    def add_feature(self, geom):
+        self._add_geometry(geom)
+        self.feature_offsets.append(len(self.geom_types))
+        properties = geom.get("properties")
+        if "id" in geom:
+            properties = dict({"id": geom["id"]}, **(properties or {}))
+        self.properties.append(properties)
+
+    def add_mesh(self, geometries, mesh):
+        """ Add a single feature with every arc used by *geometries* """
+        arcs = []
+        owners = []
+        for k, geom in enumerate(geometries):
+            refs = list(_arc_references(geom))
+            arcs.extend(refs)
+            owners.extend([k] * len(refs))
+        arcs = np.array(arcs, dtype=np.int64)
+        arcs[arcs < 0] = ~arcs[arcs < 0]
+        pairs = np.unique(np.column_stack([arcs, owners]).reshape(-1, 2),
+                          axis=0)
+        ids, nowners = np.unique(pairs[:,0], return_counts=True)
+        if mesh == "interior":
+            ids = ids[nowners > 1]
+        elif mesh == "exterior":
+            ids = ids[nowners == 1]
+        elif mesh is not True and mesh != "all":
+            raise ValueError("unknown mesh mode '{}'".format(mesh))
+
+        for arc in ids.tolist():
+            self._add_ring([arc])
+            self.part_offsets.append(len(self.ring_offsets) - 1)
+        self.geom_offsets.append(len(self.part_offsets) - 1)
+        self.geom_types.append(MULTILINESTRING)
+        self.feature_offsets.append(len(self.geom_types))
+        self.properties.append(None)
+
+    def _add_geometry(self, geom):
+        typename = geom.get("type")
+        if typename is None:        # null geometry
+            return
+        elif typename == "GeometryCollection":
+            for g in geom.get("geometries", []):
+                self._add_geometry(g)
+            return
+        elif typename not in GEOMETRY_TYPES:
+            raise NotImplementedError("'{}' not handled".format(typename))
+
+        if typename == "Point":
+            self._add_points([geom["coordinates"]])
+        elif typename == "MultiPoint":
+            self._add_points(geom["coordinates"])
+        else:
+            arcs = geom["arcs"]
+            if typename == "LineString":
+                parts = [[arcs]]
+            elif typename == "Polygon":
+                parts = [arcs]
+            elif typename == "MultiLineString":
+                parts = [[ring] for ring in arcs]
+            else:
+                parts = arcs
+            for part in parts:
+                for ring in part:
+                    self._add_ring(ring)
+                self.part_offsets.append(len(self.ring_offsets) - 1)
+        self.geom_offsets.append(len(self.part_offsets) - 1)
+        self.geom_types.append(GEOMETRY_TYPES[typename])
+
+    def _add_points(self, positions):
+        base = len(self.topology.coords)
+        for xy in positions:
+            self.gather.append(base + len(self.points))
+            self.points.append(xy[:2])
+            self.ring_offsets.append(len(self.gather))
+            self.part_offsets.append(len(self.ring_offsets) - 1)
+
+    def _add_ring(self, arcs):
+        """ Join arcs into a ring or linestring. Consecutive arcs share an
+        endpoint, which is kept once. """
+        offsets = self.arc_offsets
+        for k, arc in enumerate(arcs):
+            if arc >= 0:
+                idx = range(offsets[arc], offsets[arc+1])
+            else:
+                idx = range(offsets[~arc+1]-1, offsets[~arc]-1, -1)
+            if k != 0:
+                idx = idx[1:]
+            self.gather.extend(idx)
+        self.ring_offsets.append(len(self.gather))
+
+    def build(self):
+        if len(self.points) == 0:
+            points = np.zeros((0, 2))
+        else:
+            points = self.topology._dequantize(self.points)
+        return TopoLayer(self.topology, points,
+                         np.frombuffer(self.gather, dtype=np.int64).copy(),
+                         np.frombuffer(self.ring_offsets, dtype=np.int64).copy(),
+                         np.frombuffer(self.part_offsets, dtype=np.int64).copy(),
+                         np.frombuffer(self.geom_offsets, dtype=np.int64).copy(),
+                         np.frombuffer(self.geom_types, dtype=np.uint8).copy(),
+                         np.frombuffer(self.feature_offsets, dtype=np.int64).copy(),
+                         self.properties)
+
+
+def _arc_references(geom):
+    """ Generate the (signed) arc indices used by a TopoJSON geometry """
+    typename = geom.get("type")
+    if typename == "GeometryCollection":
+        for g in geom.get("geometries", []):
+            for arc in _arc_references(g):
+                yield arc
+    elif typename == "LineString":
+        for arc in geom["arcs"]:
+            yield arc
+    elif typename in ("Polygon", "MultiLineString"):
+        for ring in geom["arcs"]:
+            for arc in ring:
+                yield arc
+    elif typename == "MultiPolygon":
+        for polygon in geom["arcs"]:
+            for ring in polygon:
+                for arc in ring:
+                    yield arc
+
+
+def _segmented_cumsum(values, starts):
+    """ Cumulative sum along axis 0 of an (n, 2) array, restarting at each
+    index in *starts* """
+    summed = np.cumsum(values, axis=0)
+    if len(starts) > 1:
+        # subtract the running total reached before each segment
+        before = np.zeros_like(summed)
+        before[starts[1:]] = summed[starts[1:]-1] - \
+            np.vstack([np.zeros((1, 2)), summed[starts[1:-1]-1]])
+        summed -= np.cumsum(before, axis=0)
+    return summed
+
+
+def _project(projection, coords):
+    out = np.empty_like(coords)
+    if len(coords) != 0:
+        out[:,0], out[:,1] = project_array(projection, coords[:,0], coords[:,1])
+    return out
@@ -0,0 +1,18 @@
+""" Pools of worker processes that share state with their parent """
+
+import multiprocessing
+
+
+def fork_context():
+    """ Return the multiprocessing context that starts workers by forking, or
+    None where forking is unavailable.
+
+    Forked workers inherit the parent's memory, so state that the parent
+    keeps in a module global before starting a pool, such as projected
+    layers and spatial indexes, is shared with every worker without being
+    pickled. Modules use this for their job globals, which are set around
+    the lifetime of the pool.
+    """
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return None